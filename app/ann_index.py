@@ -0,0 +1,201 @@
+"""
+Approximate nearest-neighbour search over work embeddings.
+
+A small inverted-file (IVF) index in pure numpy: works in each work_type
+partition are clustered with spherical k-means, and a query only scores
+the works in its `nprobe` closest clusters. Raising nprobe trades latency
+for recall; nprobe == n_lists is an exact search.
+
+Indexes are built from the in-process WorkEmbeddingCache and persisted to
+ANN_INDEX_DIR (one .npz per work_type). An index is only used while it
+still matches the cached partition it was built from; otherwise, and for
+partitions below ANN_MIN_WORKS, search falls back to exact scoring.
+"""
+
+import os
+import threading
+
+import numpy as np
+from flask import current_app
+
+from .embedding_index import get_work_embedding_cache, normalize_rows
+from .embedding_utils import top_k_indices
+
+DEFAULT_MIN_WORKS = 5000
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK_ROWS = 4096
+
+class IVFIndex:
+    """Inverted-file index over the rows of one embedding matrix."""
+
+    def __init__(self, ids, centroids, list_offsets, list_rows):
+        self.ids = ids  # work ids, in the row order of the source matrix
+        self.centroids = centroids  # (n_lists, dim), unit length
+        self.list_offsets = list_offsets  # (n_lists + 1,) offsets into list_rows
+        self.list_rows = list_rows  # matrix row numbers grouped by cluster
+        self.generation = None  # cache generation this index matches, if any
+
+    @property
+    def n_lists(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, ids, matrix, n_lists=None, seed=0):
+        """
+        Cluster matrix rows with spherical k-means.
+
+        Args:
+            ids: work ids parallel to the matrix rows
+            matrix: (n, dim) unit-length embeddings
+            n_lists: number of clusters (defaults to ~sqrt(n))
+            seed: random seed for centroid initialisation
+        """
+        n = matrix.shape[0]
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(n, size=n_lists, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assignments = _assign(matrix, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, matrix)
+            counts = np.bincount(assignments, minlength=n_lists)
+
+            # Reseed empty clusters from random rows
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = matrix[rng.choice(n, size=len(empty), replace=False)]
+            centroids = normalize_rows(sums)
+
+        assignments = _assign(matrix, centroids)
+        list_rows = np.argsort(assignments, kind='stable').astype(np.int64)
+        counts = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(np.asarray(ids, dtype=np.int64), centroids, list_offsets, list_rows)
+
+    def candidate_rows(self, query, nprobe):
+        """Return the matrix rows in the nprobe clusters closest to query."""
+        nprobe = max(1, min(nprobe, self.n_lists))
+        centroid_scores = self.centroids @ query
+        probe = top_k_indices(centroid_scores, nprobe)
+        return np.concatenate([
+            self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe
+        ])
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, ids=self.ids, centroids=self.centroids,
+                 list_offsets=self.list_offsets, list_rows=self.list_rows)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['ids'], data['centroids'], data['list_offsets'], data['list_rows'])
+
+def _assign(matrix, centroids):
+    """Nearest centroid for each row, computed in chunks to bound memory."""
+    assignments = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], ASSIGN_CHUNK_ROWS):
+        block = matrix[start:start + ASSIGN_CHUNK_ROWS] @ centroids.T
+        assignments[start:start + ASSIGN_CHUNK_ROWS] = block.argmax(axis=1)
+    return assignments
+
+class AnnIndex:
+    """Per-work_type IVF indexes for the current app, with exact-search fallback."""
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._indexes = {}  # work_type -> IVFIndex
+        self._loaded_from_disk = set()
+
+    def _path(self, work_type):
+        return os.path.join(self.index_dir, f"{work_type}.npz")
+
+    def build(self, work_types=None, n_lists=None):
+        """Build, persist and activate indexes from the current cached embeddings."""
+        cache = get_work_embedding_cache()
+        os.makedirs(self.index_dir, exist_ok=True)
+
+        built = {}
+        for work_type in work_types or cache.work_types():
+            partition = cache.get_partition(work_type)
+            if partition is None:
+                continue
+            ids, matrix, generation = partition
+            index = IVFIndex.build(ids, matrix, n_lists=n_lists)
+            index.save(self._path(work_type))
+            index.generation = generation
+            with self._lock:
+                self._indexes[work_type] = index
+                self._loaded_from_disk.add(work_type)
+            built[work_type] = index.n_lists
+        return built
+
+    def _get(self, work_type, ids, generation):
+        """Return an index matching the cached partition, loading from disk once."""
+        with self._lock:
+            index = self._indexes.get(work_type)
+            if index is None and work_type not in self._loaded_from_disk:
+                self._loaded_from_disk.add(work_type)
+                path = self._path(work_type)
+                if os.path.exists(path):
+                    index = IVFIndex.load(path)
+                    self._indexes[work_type] = index
+
+            if index is None:
+                return None
+            if index.generation == generation:
+                return index
+
+            # Adopt a persisted index only if it covers exactly the cached rows
+            if index.generation is None and np.array_equal(index.ids, ids):
+                index.generation = generation
+                return index
+            return None
+
+    def search(self, query, work_type, nprobe=None):
+        """
+        Score query against one work_type partition.
+
+        Returns:
+            (ids, similarities) for the scored works only. Uses the IVF index
+            when one matches the partition and the partition is large enough,
+            otherwise scores every work exactly.
+        """
+        cache = get_work_embedding_cache()
+        partition = cache.get_partition(work_type)
+        if partition is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids, matrix, generation = partition
+
+        query = np.asarray(query, dtype=np.float32).ravel()
+        if matrix.shape[1] != query.shape[0]:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize_rows(query.reshape(1, -1))[0]
+
+        config = current_app.config
+        index = None
+        if config.get('ANN_ENABLED', True) and len(ids) >= config.get('ANN_MIN_WORKS', DEFAULT_MIN_WORKS):
+            index = self._get(work_type, ids, generation)
+
+        if index is None:
+            return ids, matrix @ query
+
+        if nprobe is None:
+            nprobe = config.get('ANN_NPROBE', DEFAULT_NPROBE)
+        rows = index.candidate_rows(query, nprobe)
+        return ids[rows], matrix[rows] @ query
+
+def get_ann_index():
+    """Return the ANN index manager for the current app, creating it on first use."""
+    ann_index = current_app.extensions.get('ann_index')
+    if ann_index is None:
+        index_dir = current_app.config.get('ANN_INDEX_DIR') or os.path.join(current_app.instance_path, 'ann_index')
+        ann_index = current_app.extensions.setdefault('ann_index', AnnIndex(index_dir))
+    return ann_index
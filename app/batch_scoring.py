@@ -0,0 +1,104 @@
+"""
+Batch regeneration of every user's work pool from embeddings.
+
+Instead of scoring users one at a time, user embeddings are stacked into a
+matrix and scored against each cached work_type matrix with one matrix
+product per chunk of users. Memory stays bounded by the chunk size
+(chunk_size x works per type), and each chunk's pools are written with a
+single bulk upsert. Used after a catalog or embedding model change.
+"""
+
+import time
+
+import numpy as np
+
+from .models import User, UserWorkPool, db
+from .embedding_utils import decode_embedding, top_k_indices
+from .embedding_index import get_work_embedding_cache, normalize_rows
+from .work_pool import upsert_work_pool_entries
+
+BATCH_POOL_REASON = 'Embedding similarity (batch)'  # confidence_score is the cosine similarity
+
+def regenerate_all_user_pools(top_k=30, chunk_size=256, progress=None):
+    """
+    Rebuild the available part of every user's work pool using embedding similarity.
+
+    Pool entries that were already recommended are kept (their confidence is
+    refreshed if they are still in the user's top_k); other entries are
+    replaced by the user's current top_k works per work_type.
+
+    Args:
+        top_k: Works to keep per user and work_type
+        chunk_size: Users scored per matrix product / transaction
+        progress: Optional callback(users_done, elapsed_seconds)
+
+    Returns:
+        dict with 'users' scored and 'entries' written
+    """
+    cache = get_work_embedding_cache()
+    partitions = {}
+    for work_type in cache.work_types():
+        ids, matrix, _ = cache.get_partition(work_type)
+        partitions[work_type] = (ids, matrix)
+    if not partitions:
+        return {'users': 0, 'entries': 0}
+
+    dim = next(iter(partitions.values()))[1].shape[1]
+    start = time.perf_counter()
+    users_done = 0
+    entries_written = 0
+    last_user_id = 0
+
+    while True:
+        rows = db.session.query(User.id, User.embedding_vector).filter(
+            User.embedding_vector.isnot(None),
+            User.id > last_user_id
+        ).order_by(User.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_user_id = rows[-1][0]
+
+        user_ids, vectors = [], []
+        for user_id, blob in rows:
+            try:
+                vector = decode_embedding(blob)
+            except ValueError:
+                continue
+            if vector is not None and len(vector) == dim:
+                user_ids.append(user_id)
+                vectors.append(vector)
+
+        if user_ids:
+            user_matrix = normalize_rows(np.vstack(vectors))
+            entries = []
+            for work_type, (work_ids, work_matrix) in partitions.items():
+                scores = user_matrix @ work_matrix.T  # (users in chunk, works of this type)
+                winners = top_k_indices(scores, top_k)
+                winner_scores = np.take_along_axis(scores, winners, axis=1)
+                for row, user_id in enumerate(user_ids):
+                    for idx, score in zip(winners[row], winner_scores[row]):
+                        entries.append({
+                            'user_id': user_id,
+                            'work_id': int(work_ids[idx]),
+                            'work_type': work_type,
+                            'confidence_score': float(score),
+                            'added_reason': BATCH_POOL_REASON
+                        })
+
+            try:
+                UserWorkPool.query.filter(
+                    UserWorkPool.user_id.in_(user_ids),
+                    UserWorkPool.status == 'available'
+                ).delete(synchronize_session=False)
+                upsert_work_pool_entries(entries)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            entries_written += len(entries)
+
+        users_done += len(user_ids)
+        if progress:
+            progress(users_done, time.perf_counter() - start)
+
+    return {'users': users_done, 'entries': entries_written}
@@ -0,0 +1,141 @@
+"""
+Persistent cache of text embeddings.
+
+Work and user descriptions are deterministic, so identical text embedded
+with the same model settings always yields the same vector. Entries are
+keyed by (model, task_type, dimension, sha256(text)) and stored in the
+EmbeddingCacheEntry table. The table is bounded to EMBEDDING_CACHE_MAX_ENTRIES
+rows, evicting the least recently used entries first.
+"""
+
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app
+
+from .models import EmbeddingCacheEntry, db
+from .embedding_utils import encode_embedding, decode_embedding
+
+DEFAULT_MAX_ENTRIES = 50000
+
+def text_hash(text):
+    """Return the sha256 hex digest used as the cache key for text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """Database-backed LRU embedding cache with hit/miss counters."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key_filter(self, model, task_type, dimension):
+        return db.and_(
+            EmbeddingCacheEntry.model == model,
+            EmbeddingCacheEntry.task_type == task_type,
+            EmbeddingCacheEntry.dimension == dimension,
+        )
+
+    def get_many(self, texts, model, task_type, dimension):
+        """
+        Look up cached embeddings for texts.
+
+        Returns:
+            dict of text -> embedding (numpy array) for the texts that were cached
+        """
+        if not texts:
+            return {}
+
+        hashes = {text_hash(text): text for text in texts}
+        entries = EmbeddingCacheEntry.query.filter(
+            self._key_filter(model, task_type, dimension),
+            EmbeddingCacheEntry.text_hash.in_(list(hashes))
+        ).all()
+
+        found = {}
+        for entry in entries:
+            try:
+                found[hashes[entry.text_hash]] = decode_embedding(entry.embedding_vector)
+            except ValueError:
+                continue
+
+        if found:
+            # Touch hits so they are evicted last
+            EmbeddingCacheEntry.query.filter(
+                EmbeddingCacheEntry.id.in_([entry.id for entry in entries])
+            ).update({'last_used_at': datetime.now(timezone.utc)}, synchronize_session=False)
+
+        with self._lock:
+            self.hits += sum(1 for text in texts if text in found)
+            self.misses += sum(1 for text in texts if text not in found)
+        return found
+
+    def put_many(self, embeddings, model, task_type, dimension):
+        """
+        Store embeddings and evict least recently used entries beyond max_entries.
+
+        Args:
+            embeddings: dict of text -> embedding values
+        """
+        if not embeddings:
+            return
+
+        by_hash = {text_hash(text): values for text, values in embeddings.items()}
+        existing = {
+            entry.text_hash: entry for entry in EmbeddingCacheEntry.query.filter(
+                self._key_filter(model, task_type, dimension),
+                EmbeddingCacheEntry.text_hash.in_(list(by_hash))
+            ).all()
+        }
+
+        now = datetime.now(timezone.utc)
+        for digest, values in by_hash.items():
+            blob = encode_embedding(values)
+            entry = existing.get(digest)
+            if entry is not None:
+                entry.embedding_vector = blob
+                entry.last_used_at = now
+            else:
+                db.session.add(EmbeddingCacheEntry(
+                    model=model,
+                    task_type=task_type,
+                    dimension=dimension,
+                    text_hash=digest,
+                    embedding_vector=blob,
+                    created_at=now,
+                    last_used_at=now
+                ))
+        db.session.flush()
+        self._evict()
+
+    def _evict(self):
+        excess = EmbeddingCacheEntry.query.count() - self.max_entries
+        if excess <= 0:
+            return
+        oldest = db.session.query(EmbeddingCacheEntry.id).order_by(
+            EmbeddingCacheEntry.last_used_at.asc()
+        ).limit(excess).subquery()
+        EmbeddingCacheEntry.query.filter(
+            EmbeddingCacheEntry.id.in_(db.select(oldest.c.id))
+        ).delete(synchronize_session=False)
+
+    def stats(self):
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+def get_embedding_cache():
+    """Return the embedding cache for the current app, creating it on first use."""
+    cache = current_app.extensions.get('embedding_cache')
+    if cache is None:
+        max_entries = current_app.config.get('EMBEDDING_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        cache = current_app.extensions.setdefault('embedding_cache', EmbeddingCache(max_entries))
+    return cache
@@ -0,0 +1,114 @@
+"""
+Bounded-concurrency execution of embedding API requests.
+
+Batches of texts are sent from a small thread pool. Every request first
+takes a token from a shared token bucket sized from app config, so bulk
+jobs run at the provider quota instead of waiting on network latency one
+request at a time. Rate-limit (429) and server (5xx) errors are retried
+with exponential backoff; a batch that still fails is reported as failed
+rather than silently replaced with zero vectors.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_REQUESTS_PER_MINUTE = 100
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+
+class EmbeddingError(Exception):
+    """Raised when an embedding could not be generated after retries."""
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity` banked."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def is_retryable(error):
+    """True for rate-limit, server and connection errors."""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if isinstance(code, int):
+        return code == 429 or 500 <= code < 600
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+class EmbeddingExecutor:
+    """Runs embedding requests concurrently under a shared rate limit."""
+
+    def __init__(self, max_workers, requests_per_minute, max_retries, backoff_seconds):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.limiter = TokenBucket(requests_per_minute / 60.0, capacity=max_workers)
+
+    def _call_with_retry(self, request_fn, batch):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                return request_fn(batch)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = min(MAX_BACKOFF_SECONDS, self.backoff_seconds * (2 ** attempt))
+                delay *= random.uniform(0.5, 1.0)  # jitter so workers don't retry in lockstep
+                print(f"Embedding request failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def run(self, request_fn, batches):
+        """
+        Call request_fn on every batch concurrently.
+
+        Returns:
+            list parallel to batches: the request_fn result, or the exception
+            raised by the final attempt for that batch
+        """
+        if not batches:
+            return []
+
+        def run_batch(batch):
+            try:
+                return self._call_with_retry(request_fn, batch)
+            except Exception as e:
+                return e
+
+        if len(batches) == 1 or self.max_workers <= 1:
+            return [run_batch(batch) for batch in batches]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+            return list(pool.map(run_batch, batches))
+
+def get_embedding_executor():
+    """Return the embedding executor for the current app, creating it on first use."""
+    executor = current_app.extensions.get('embedding_executor')
+    if executor is None:
+        config = current_app.config
+        executor = current_app.extensions.setdefault('embedding_executor', EmbeddingExecutor(
+            max_workers=config.get('EMBEDDING_MAX_WORKERS', DEFAULT_MAX_WORKERS),
+            requests_per_minute=config.get('EMBEDDING_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE),
+            max_retries=config.get('EMBEDDING_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+            backoff_seconds=config.get('EMBEDDING_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS),
+        ))
+    return executor
@@ -0,0 +1,546 @@
+"""
+In-process cache of work embeddings for similarity search.
+
+Holds one contiguous, L2-normalised float32 matrix per work_type with a
+parallel array of work ids, so scoring a user is a single mat-vec product
+with no database round trip for the works. The cache is built lazily,
+by memory-mapping the on-disk embedding store when one has been written
+(see embedding_store.py) or else from the Work table, and kept in sync by
+SQLAlchemy events: rows written or deleted in a transaction are applied
+incrementally once it commits. Commits made by other processes (workers,
+scripts) are picked up by polling a cheap catalog signature, the count of
+works with an embedding and their latest Work.embedding_updated_at, and
+loading only the rows changed since the last check.
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .models import Work, db
+from .embedding_utils import decode_embedding
+from .quantization import QUANTIZATION_MODES, binary_scores, pack_signs
+from .embedding_store import current_version, open_embedding_store
+
+def normalize_rows(matrix):
+    """L2-normalise each row of a 2-D array, leaving all-zero rows as zeros."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+# Rows re-read on each catalog sync start this long before the newest change
+# already seen, so writes committed slightly out of timestamp order still land
+CATALOG_SYNC_OVERLAP = timedelta(seconds=60)
+
+# Every partition state gets a unique generation so derived structures
+# (e.g. the ANN index) can tell whether they still match the matrix
+_generations = itertools.count(1)
+
+class _Partition:
+    """Embedding matrix and id array for a single work_type."""
+
+    def __init__(self, ids, matrix, quantized=False):
+        self.ids = ids
+        self.matrix = matrix
+        self.positions = {int(work_id): row for row, work_id in enumerate(ids)}
+        self.generation = next(_generations)
+        self._reduced = {}  # dimensions -> truncated, re-normalised matrix
+        self._reduced_generation = self.generation
+        # Binary codes (see quantization.py), kept in step with matrix
+        self.quantized = quantized
+        self.sign_bits = pack_signs(matrix) if quantized else None
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def reduced(self, dimensions):
+        """
+        Matrix truncated to the first dimensions columns and re-normalised.
+
+        Gemini embeddings are Matryoshka-trained, so a prefix is a usable
+        lower-dimensional embedding. Built on first use and reused until the
+        partition changes; it is an extra copy held next to the full-width
+        matrix, so it saves FLOPs per query at the cost of memory.
+        """
+        if dimensions >= self.dim:
+            return self.matrix
+        if self._reduced_generation != self.generation:
+            self._reduced = {}
+            self._reduced_generation = self.generation
+        matrix = self._reduced.get(dimensions)
+        if matrix is None:
+            matrix = np.ascontiguousarray(normalize_rows(self.matrix[:, :dimensions]))
+            self._reduced[dimensions] = matrix
+        return matrix
+
+    def upsert(self, work_id, vector):
+        self.generation = next(_generations)
+        bits = pack_signs(vector.reshape(1, -1)) if self.quantized else None
+        row = self.positions.get(work_id)
+        if row is not None:
+            self.matrix[row] = vector
+            if self.quantized:
+                self.sign_bits[row] = bits[0]
+            return
+        self.positions[work_id] = len(self.ids)
+        self.ids = np.append(self.ids, np.int64(work_id))
+        self.matrix = np.ascontiguousarray(np.vstack([self.matrix, vector]))
+        if self.quantized:
+            self.sign_bits = np.vstack([self.sign_bits, bits])
+
+    def remove(self, work_id):
+        row = self.positions.pop(work_id, None)
+        if row is None:
+            return
+        self.generation = next(_generations)
+        self.ids = np.delete(self.ids, row)
+        self.matrix = np.delete(self.matrix, row, axis=0)
+        if self.quantized:
+            self.sign_bits = np.delete(self.sign_bits, row, axis=0)
+        self.positions = {int(wid): r for r, wid in enumerate(self.ids)}
+
+class WorkEmbeddingCache:
+    """Process-wide work embedding matrices partitioned by work_type."""
+
+    def __init__(self, quantized=False, store_dir=None, store_check_seconds=30, catalog_check_seconds=30):
+        self.quantized = quantized  # Also keep binary sign codes for score_quantized
+        self.store_dir = store_dir  # Memory-mapped embedding store to load from (see embedding_store.py)
+        self.store_check_seconds = store_check_seconds
+        self.catalog_check_seconds = catalog_check_seconds  # How often to look for other processes' writes
+        self.store_version = None  # Store version the cache was loaded from, None if from the database
+        self._store_checked_at = 0.0
+        self._catalog_checked_at = 0.0
+        self._catalog_signature = None  # (count, latest embedding_updated_at) as of the last load/sync
+        self._catalog_ids = set()  # Ids of works with an embedding in the database, decodable or not
+        self._lock = threading.Lock()
+        self._partitions = None  # work_type -> _Partition, None until loaded
+        self._work_types = {}  # work_id -> work_type
+
+    def invalidate(self):
+        """Drop everything; the next lookup rebuilds from the store or database."""
+        with self._lock:
+            self._partitions = None
+            self._work_types = {}
+
+    def _load(self):
+        self._store_checked_at = self._catalog_checked_at = time.monotonic()
+        # Taken before reading the rows, so writes racing the load are re-read on the next sync
+        self._catalog_signature = self._read_catalog_signature()
+        store = open_embedding_store(self.store_dir) if self.store_dir else None
+        if store is not None and len(store.ids):
+            self._load_from_store(store)
+        else:
+            self._load_from_database()
+
+    def _load_from_store(self, store):
+        """
+        Map the store's matrix, then reconcile it with the Work table: rows of
+        works whose embedding was removed, whose type changed or whose
+        embedding was rewritten after the version was written (by
+        embedding_updated_at) are dropped, and those works plus works the
+        version doesn't have yet are decoded from the database. A partition
+        is copied out of the mapping only if it changed.
+        """
+        expected = dict(db.session.query(Work.id, Work.work_type).filter(
+            Work.embedding_vector.isnot(None)
+        ).all())
+        changed = set()
+        if store.embeddings_as_of is not None:
+            changed = {work_id for (work_id,) in db.session.query(Work.id).filter(
+                Work.embedding_updated_at >= store.embeddings_as_of - CATALOG_SYNC_OVERLAP
+            )}
+        self._catalog_ids = set(expected)
+        self.store_version = store.version
+
+        kept = {}
+        stored = set()
+        for work_type in store.partitions:
+            ids, matrix = store.partition(work_type)
+            current = np.fromiter(
+                (work_id for work_id, wt in expected.items() if wt == work_type and work_id not in changed),
+                dtype=np.int64
+            )
+            keep = np.isin(ids, current)
+            if not keep.all():
+                ids, matrix = ids[keep], matrix[keep]
+            kept[work_type] = (np.array(ids), matrix)
+            stored.update(ids.tolist())
+
+        # Decode the missing rows, grouped by type
+        missing = [work_id for work_id in expected if work_id not in stored]
+        loaded = {}
+        for start in range(0, len(missing), 500):
+            rows = db.session.query(Work.id, Work.work_type, Work.embedding_vector).filter(
+                Work.id.in_(missing[start:start + 500])
+            ).all()
+            for work_id, work_type, blob in rows:
+                try:
+                    vector = decode_embedding(blob)
+                except ValueError:
+                    continue
+                if vector is None or len(vector) != store.matrix.shape[1]:
+                    continue
+                loaded.setdefault(work_type, ([], []))
+                loaded[work_type][0].append(work_id)
+                loaded[work_type][1].append(vector)
+
+        partitions = {}
+        work_types = {}
+        for work_type in kept.keys() | loaded.keys():
+            ids, matrix = kept.get(work_type, (np.empty(0, dtype=np.int64), None))
+            if work_type in loaded:
+                new_ids, vectors = loaded[work_type]
+                rows = normalize_rows(np.vstack(vectors))
+                ids = np.concatenate([ids, np.array(new_ids, dtype=np.int64)])
+                matrix = rows if matrix is None else np.concatenate([matrix, rows])
+            partitions[work_type] = _Partition(ids, matrix, self.quantized)
+            work_types.update((int(work_id), work_type) for work_id in ids)
+        self._partitions = partitions
+        self._work_types = work_types
+
+    def _load_from_database(self):
+        self.store_version = None
+        rows = db.session.query(
+            Work.id, Work.work_type, Work.embedding_vector
+        ).filter(Work.embedding_vector.isnot(None)).all()
+        self._catalog_ids = {work_id for work_id, _, _ in rows}
+
+        decoded = []
+        for work_id, work_type, blob in rows:
+            try:
+                decoded.append((work_id, work_type, decode_embedding(blob)))
+            except ValueError:
+                continue
+
+        partitions = {}
+        work_types = {}
+        if decoded:
+            # Mixed dimensions can't share a matrix; keep the dominant one
+            dim = Counter(len(vec) for _, _, vec in decoded).most_common(1)[0][0]
+            by_type = {}
+            for work_id, work_type, vec in decoded:
+                if len(vec) != dim:
+                    print(f"Skipping work {work_id}: embedding has {len(vec)} dims, expected {dim}")
+                    continue
+                by_type.setdefault(work_type, []).append((work_id, vec))
+                work_types[work_id] = work_type
+
+            for work_type, items in by_type.items():
+                ids = np.array([work_id for work_id, _ in items], dtype=np.int64)
+                matrix = normalize_rows(np.vstack([vec for _, vec in items]))
+                partitions[work_type] = _Partition(ids, np.ascontiguousarray(matrix), self.quantized)
+
+        self._partitions = partitions
+        self._work_types = work_types
+
+    def _ensure_loaded(self):
+        # Pick up a newly written store version (cheap: reads the CURRENT pointer)
+        if (self._partitions is not None and self.store_dir
+                and time.monotonic() - self._store_checked_at >= self.store_check_seconds):
+            self._store_checked_at = time.monotonic()
+            if current_version(self.store_dir) not in (None, self.store_version):
+                self._partitions = None
+        # Pick up works written by other processes (one aggregate query)
+        if (self._partitions is not None
+                and time.monotonic() - self._catalog_checked_at >= self.catalog_check_seconds):
+            self._catalog_checked_at = time.monotonic()
+            self._sync_catalog()
+        if self._partitions is None:
+            self._load()
+
+    def _read_catalog_signature(self):
+        count, latest = db.session.query(
+            db.func.count(Work.id), db.func.max(Work.embedding_updated_at)
+        ).filter(Work.embedding_vector.isnot(None)).one()
+        return count, latest
+
+    def _sync_catalog(self):
+        """
+        Apply works whose embedding or type changed since the last check.
+
+        Deleted works leave no timestamp behind; when the count of works
+        with an embedding no longer adds up, the cache reloads instead.
+        """
+        signature = self._read_catalog_signature()
+        if signature == self._catalog_signature:
+            return
+        _, seen = self._catalog_signature
+        self._catalog_signature = signature
+
+        query = db.session.query(Work.id, Work.work_type, Work.embedding_vector)
+        if seen is not None:
+            query = query.filter(Work.embedding_updated_at >= seen - CATALOG_SYNC_OVERLAP)
+        else:
+            query = query.filter(Work.embedding_vector.isnot(None))
+        self._apply_changes({work_id: (work_type, blob) for work_id, work_type, blob in query.all()}, ())
+
+        if len(self._catalog_ids) != signature[0]:
+            self._partitions = None
+
+    def apply_changes(self, upserts, removals):
+        """
+        Apply committed work embedding changes without a full rebuild.
+
+        Args:
+            upserts: dict of work_id -> (work_type, embedding blob or None)
+            removals: iterable of deleted work ids
+        """
+        with self._lock:
+            if self._partitions is None:
+                return  # Nothing cached yet; the first lookup loads fresh data
+            self._apply_changes(upserts, removals)
+
+    def _apply_changes(self, upserts, removals):
+        for work_id in removals:
+            self._catalog_ids.discard(work_id)
+            self._remove(work_id)
+
+        for work_id, (work_type, blob) in upserts.items():
+            if blob is None:
+                self._catalog_ids.discard(work_id)
+            else:
+                self._catalog_ids.add(work_id)
+            try:
+                vector = decode_embedding(blob)
+            except ValueError:
+                vector = None
+            if vector is None:
+                self._remove(work_id)
+                continue
+
+            # A work that changed type moves to the other partition
+            if self._work_types.get(work_id) not in (None, work_type):
+                self._remove(work_id)
+
+            vector = normalize_rows(vector.reshape(1, -1))[0]
+            partition = self._partitions.get(work_type)
+            if partition is None:
+                dims = {p.dim for p in self._partitions.values()}
+                if dims and len(vector) not in dims:
+                    continue
+                self._partitions[work_type] = _Partition(
+                    np.array([work_id], dtype=np.int64), vector.reshape(1, -1).copy(), self.quantized
+                )
+            elif len(vector) != partition.dim:
+                continue
+            else:
+                partition.upsert(work_id, vector)
+            self._work_types[work_id] = work_type
+
+    def _remove(self, work_id):
+        work_type = self._work_types.pop(work_id, None)
+        if work_type is not None and work_type in self._partitions:
+            self._partitions[work_type].remove(work_id)
+
+    def get_partition(self, work_type):
+        """Return (ids, matrix, generation) for one work_type, or None if it has no works."""
+        with self._lock:
+            self._ensure_loaded()
+            partition = self._partitions.get(work_type)
+            if partition is None or not len(partition.ids):
+                return None
+            return partition.ids, partition.matrix, partition.generation
+
+    def work_types(self):
+        """Return the work types that currently have cached embeddings."""
+        with self._lock:
+            self._ensure_loaded()
+            return [wt for wt, p in self._partitions.items() if len(p.ids)]
+
+    def embeddings_as_of(self):
+        """Latest Work.embedding_updated_at the cached rows are known to include, or None."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._catalog_signature[1]
+
+    def get_matrix(self, work_type=None, dimensions=None):
+        """
+        Return (ids, matrix) for one work_type, or for every type if None.
+
+        The matrix rows are unit length, so a dot product with a normalised
+        query is its cosine similarity. With dimensions, rows are truncated
+        to that many leading components and re-normalised. The all-types
+        matrix is a fresh copy; score() works partition by partition instead.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if work_type is not None:
+                partition = self._partitions.get(work_type)
+                if partition is None:
+                    return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+                if dimensions:
+                    return partition.ids, partition.reduced(dimensions)
+                return partition.ids, partition.matrix
+
+            partitions = [p for p in self._partitions.values() if len(p.ids)]
+            if not partitions:
+                return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+            return (
+                np.concatenate([p.ids for p in partitions]),
+                np.vstack([p.reduced(dimensions) if dimensions else p.matrix for p in partitions]),
+            )
+
+    def dimension(self):
+        """Return the full embedding dimension of the cached works, or None if empty."""
+        with self._lock:
+            self._ensure_loaded()
+            for partition in self._partitions.values():
+                return partition.dim
+            return None
+
+    def get_vectors(self, work_ids):
+        """
+        Return (ids, matrix) of cached unit vectors for the given work ids.
+
+        Ids without a cached embedding are left out, so ids may be shorter
+        than work_ids.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            found, rows = [], []
+            for work_id in work_ids:
+                work_type = self._work_types.get(int(work_id))
+                if work_type is None:
+                    continue
+                partition = self._partitions[work_type]
+                found.append(int(work_id))
+                rows.append(partition.matrix[partition.positions[int(work_id)]])
+            if not rows:
+                return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+            return np.array(found, dtype=np.int64), np.vstack(rows)
+
+    def score(self, query_vector, work_type=None, dimensions=None):
+        """
+        Cosine similarity of query_vector against every cached work.
+
+        Args:
+            dimensions: Optionally score only the first dimensions components
+                of the query and works (each re-normalised); a cheaper,
+                approximate first stage for large catalogs
+
+        Returns:
+            (ids, similarities) numpy arrays; empty if nothing is cached or
+            the query dimension does not match the stored embeddings
+        """
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        with self._lock:
+            self._ensure_loaded()
+            partitions = [p for wt, p in self._partitions.items()
+                          if len(p.ids) and (work_type is None or wt == work_type)]
+            if not partitions or partitions[0].dim != query.shape[0]:
+                return empty
+            if dimensions and dimensions < query.shape[0]:
+                query = query[:dimensions]
+                pairs = [(p.ids, p.reduced(dimensions)) for p in partitions]
+            else:
+                pairs = [(p.ids, p.matrix) for p in partitions]
+
+        # One mat-vec per partition; only the score vectors are concatenated
+        query = normalize_rows(query.reshape(1, -1))[0]
+        if len(pairs) == 1:
+            ids, matrix = pairs[0]
+            return ids, matrix @ query
+        return (np.concatenate([ids for ids, _ in pairs]),
+                np.concatenate([matrix @ query for _, matrix in pairs]))
+
+    def score_quantized(self, query_vector, work_type=None):
+        """
+        Approximate similarity of query_vector against every cached work using
+        the binary sign codes, for picking a shortlist.
+
+        Returns:
+            (ids, approximate similarities); empty if the cache was created
+            without quantized codes or the query dimension does not match
+        """
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        with self._lock:
+            self._ensure_loaded()
+            partitions = [p for wt, p in self._partitions.items()
+                          if len(p.ids) and (work_type is None or wt == work_type)]
+            if not self.quantized or not partitions or partitions[0].dim != query.shape[0]:
+                return empty
+            ids = [p.ids for p in partitions]
+            codes = [p.sign_bits for p in partitions]
+
+        scores = [binary_scores(bits, query, query.shape[0]) for bits in codes]
+        return np.concatenate(ids), np.concatenate(scores)
+
+def get_work_embedding_cache():
+    """Return the work embedding cache for the current app, creating it on first use."""
+    cache = current_app.extensions.get('work_embedding_cache')
+    if cache is None:
+        config = current_app.config
+        store_dir = None
+        if config.get('EMBEDDING_STORE_ENABLED', True):
+            store_dir = config.get('EMBEDDING_STORE_DIR') or os.path.join(current_app.instance_path, 'embedding_store')
+        cache = current_app.extensions.setdefault('work_embedding_cache', WorkEmbeddingCache(
+            quantized=config.get('EMBEDDING_QUANTIZED_SEARCH') in QUANTIZATION_MODES,
+            store_dir=store_dir,
+            store_check_seconds=config.get('EMBEDDING_STORE_CHECK_SECONDS', 30),
+            catalog_check_seconds=config.get('EMBEDDING_CATALOG_CHECK_SECONDS', 30)
+        ))
+    return cache
+
+# Keep the cache in sync with committed writes to Work.embedding_vector.
+# Changes are staged per session during flush and applied only on commit.
+
+def _pending_changes(session):
+    return session.info.setdefault('work_embedding_changes', ({}, set()))
+
+@event.listens_for(Work, 'after_insert')
+@event.listens_for(Work, 'after_update')
+def _stage_work_upsert(mapper, connection, target):
+    state = inspect(target)
+    if not (state.attrs.embedding_vector.history.has_changes()
+            or state.attrs.work_type.history.has_changes()):
+        return
+    session = state.session
+    if session is None:
+        return
+    if 'embedding_vector' in state.unloaded:
+        # Type changed without the (deferred) embedding loaded; don't load it
+        # mid-flush, just rebuild the cache after commit
+        session.info['work_embedding_reload'] = True
+        return
+    upserts, removals = _pending_changes(session)
+    removals.discard(target.id)
+    upserts[target.id] = (target.work_type, target.embedding_vector)
+
+@event.listens_for(Work, 'after_delete')
+def _stage_work_removal(mapper, connection, target):
+    session = inspect(target).session
+    if session is None:
+        return
+    upserts, removals = _pending_changes(session)
+    upserts.pop(target.id, None)
+    removals.add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_work_changes(session):
+    changes = session.info.pop('work_embedding_changes', None)
+    reload = session.info.pop('work_embedding_reload', False)
+    if (changes or reload) and has_app_context():
+        cache = current_app.extensions.get('work_embedding_cache')
+        if cache is None:
+            return
+        if reload:
+            cache.invalidate()
+        else:
+            cache.apply_changes(*changes)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_work_changes(session):
+    session.info.pop('work_embedding_changes', None)
+    session.info.pop('work_embedding_reload', None)
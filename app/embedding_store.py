@@ -0,0 +1,159 @@
+"""
+Versioned on-disk work embedding store shared by worker processes.
+
+Each version is a directory holding the L2-normalised work matrix as a
+plain .npy file, the parallel array of work ids, and a manifest giving each
+work_type's row range:
+
+    <store_dir>/
+        CURRENT            name of the live version directory
+        v0003/
+            matrix.npy     float32 (works, dim), rows grouped by work_type
+            ids.npy        int64 work ids, same row order
+            manifest.json  version, dim, count, {work_type: [start, stop]},
+                           embeddings_as_of (latest Work.embedding_updated_at included)
+
+Readers open the matrix with np.load(mmap_mode='c'), so every process maps
+the same file and shares one page-cache copy instead of decoding every
+embedding from the database at startup (copy-on-write keeps in-process
+incremental updates private). Writers build a new version directory and
+then atomically replace CURRENT, so readers never see a partial version.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+
+CURRENT_FILE = 'CURRENT'
+KEEP_VERSIONS = 2  # Live version plus the previous one, which readers may still have mapped
+
+class EmbeddingStore:
+    """An opened store version: memory-mapped matrix, ids and work_type row ranges."""
+
+    def __init__(self, version, ids, matrix, partitions, embeddings_as_of=None):
+        self.version = version
+        self.ids = ids
+        self.matrix = matrix
+        self.partitions = partitions  # work_type -> (start, stop)
+        self.embeddings_as_of = embeddings_as_of  # datetime, None if unknown
+
+    def partition(self, work_type):
+        """Return (ids, matrix) rows for one work_type; matrix is a view of the mapping."""
+        start, stop = self.partitions[work_type]
+        return self.ids[start:stop], self.matrix[start:stop]
+
+def current_version(store_dir):
+    """Name of the live version in store_dir, or None if nothing has been written."""
+    try:
+        with open(os.path.join(store_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def open_embedding_store(store_dir):
+    """
+    Open the live version of the store.
+
+    Returns:
+        EmbeddingStore or None if the store is missing or unreadable
+    """
+    version = current_version(store_dir)
+    if version is None:
+        return None
+    path = os.path.join(store_dir, version)
+    try:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        matrix = np.load(os.path.join(path, 'matrix.npy'), mmap_mode='c')
+        ids = np.load(os.path.join(path, 'ids.npy'))
+    except (OSError, ValueError) as e:
+        print(f"Could not open embedding store version {version}: {e}")
+        return None
+
+    if matrix.shape != (manifest['count'], manifest['dim']) or len(ids) != manifest['count']:
+        print(f"Embedding store version {version} does not match its manifest")
+        return None
+    partitions = {work_type: tuple(bounds) for work_type, bounds in manifest['partitions'].items()}
+    as_of = manifest.get('embeddings_as_of')
+    return EmbeddingStore(version, ids, matrix, partitions, datetime.fromisoformat(as_of) if as_of else None)
+
+def write_embedding_store(store_dir, partitions, embeddings_as_of=None):
+    """
+    Write a new store version and make it live.
+
+    Args:
+        store_dir: Store directory (created if needed)
+        partitions: {work_type: (ids, normalised matrix)} with a common dimension
+        embeddings_as_of: Latest Work.embedding_updated_at the partitions
+            include; readers re-read works changed after it from the database
+
+    Returns:
+        str: the new version name
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    partitions = {wt: (ids, matrix) for wt, (ids, matrix) in partitions.items() if len(ids)}
+    dims = {matrix.shape[1] for _, matrix in partitions.values()}
+    if len(dims) > 1:
+        raise ValueError(f"Partitions have different dimensions: {sorted(dims)}")
+    dim = dims.pop() if dims else 0
+
+    existing = [name for name in os.listdir(store_dir) if name.startswith('v') and name[1:].isdigit()]
+    number = max((int(name[1:]) for name in existing), default=0) + 1
+    version = f"v{number:04d}"
+
+    # Build in a temporary directory, then rename it into place
+    staging = tempfile.mkdtemp(prefix='.staging-', dir=store_dir)
+    try:
+        count = sum(len(ids) for ids, _ in partitions.values())
+        matrix_file = np.lib.format.open_memmap(
+            os.path.join(staging, 'matrix.npy'), mode='w+', dtype=np.float32, shape=(count, dim)
+        )
+        all_ids = np.empty(count, dtype=np.int64)
+        bounds = {}
+        start = 0
+        for work_type, (ids, matrix) in partitions.items():
+            stop = start + len(ids)
+            matrix_file[start:stop] = matrix
+            all_ids[start:stop] = ids
+            bounds[work_type] = [start, stop]
+            start = stop
+        matrix_file.flush()
+        del matrix_file
+        np.save(os.path.join(staging, 'ids.npy'), all_ids)
+
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump({
+                'version': version,
+                'dim': dim,
+                'count': count,
+                'partitions': bounds,
+                'embeddings_as_of': embeddings_as_of.isoformat() if embeddings_as_of else None,
+                'created_at': datetime.now(timezone.utc).isoformat()
+            }, f)
+
+        os.rename(staging, os.path.join(store_dir, version))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    # Atomic swap: readers see either the old or the new CURRENT
+    pointer = os.path.join(store_dir, f".{CURRENT_FILE}.tmp")
+    with open(pointer, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(store_dir, CURRENT_FILE))
+
+    _prune_versions(store_dir, version)
+    return version
+
+def _prune_versions(store_dir, live_version):
+    """Delete all but the newest KEEP_VERSIONS versions (open mappings stay valid on POSIX)."""
+    versions = sorted(name for name in os.listdir(store_dir) if name.startswith('v') and name[1:].isdigit())
+    for name in versions[:-KEEP_VERSIONS]:
+        if name != live_version:
+            shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
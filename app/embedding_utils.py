@@ -0,0 +1,125 @@
+"""
+Utility functions for storing and decoding embedding vectors.
+
+Embeddings are stored as compact binary blobs instead of JSON text:
+
+    bytes 0-1   magic  b'EV'
+    byte  2     format version (currently 1)
+    byte  3     dtype code (1 = float32, 2 = float16), always little-endian
+    bytes 4-7   dimension as little-endian uint32
+    bytes 8-    raw vector values
+
+The 8-byte header keeps the payload aligned so decode_embedding can hand
+back an np.frombuffer view without copying.
+"""
+
+import struct
+import numpy as np
+
+EMBEDDING_MAGIC = b'EV'
+EMBEDDING_FORMAT_VERSION = 1
+EMBEDDING_HEADER = struct.Struct('<2sBBI')
+
+# dtype code <-> numpy dtype (explicitly little-endian)
+EMBEDDING_DTYPES = {
+    1: np.dtype('<f4'),
+    2: np.dtype('<f2'),
+}
+EMBEDDING_DTYPE_CODES = {dtype: code for code, dtype in EMBEDDING_DTYPES.items()}
+
+def encode_embedding(values, dtype='float32'):
+    """
+    Encode an embedding vector as a binary blob.
+
+    Args:
+        values: Sequence of floats or 1-D numpy array
+        dtype: 'float32' (default) or 'float16'
+
+    Returns:
+        bytes: Header + raw little-endian vector values
+    """
+    np_dtype = np.dtype(dtype).newbyteorder('<')
+    if np_dtype not in EMBEDDING_DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    array = np.asarray(values, dtype=np_dtype).ravel()
+    header = EMBEDDING_HEADER.pack(
+        EMBEDDING_MAGIC,
+        EMBEDDING_FORMAT_VERSION,
+        EMBEDDING_DTYPE_CODES[np_dtype],
+        array.shape[0]
+    )
+    return header + array.tobytes()
+
+def decode_embedding(blob):
+    """
+    Decode a binary embedding blob into a read-only numpy array (no copy).
+
+    Args:
+        blob: bytes produced by encode_embedding
+
+    Returns:
+        np.ndarray view over the blob, or None if blob is empty
+
+    Raises:
+        ValueError: if the blob is truncated, has an unknown header, or its
+            payload length doesn't match the recorded dimension
+    """
+    if not blob:
+        return None
+
+    magic, version, dtype_code, dim = _unpack_header(blob)
+    if magic != EMBEDDING_MAGIC or version != EMBEDDING_FORMAT_VERSION:
+        raise ValueError("Not a recognised embedding blob")
+    if dtype_code not in EMBEDDING_DTYPES:
+        raise ValueError(f"Unknown embedding dtype code: {dtype_code}")
+    expected = EMBEDDING_HEADER.size + dim * EMBEDDING_DTYPES[dtype_code].itemsize
+    if len(blob) != expected:
+        raise ValueError(f"Embedding blob is {len(blob)} bytes, expected {expected} for {dim} dims")
+
+    return np.frombuffer(
+        blob,
+        dtype=EMBEDDING_DTYPES[dtype_code],
+        count=dim,
+        offset=EMBEDDING_HEADER.size
+    )
+
+def embedding_dimension(blob):
+    """Return the dimension recorded in an embedding blob header without decoding it."""
+    if not blob:
+        return 0
+    return _unpack_header(blob)[3]
+
+def _unpack_header(blob):
+    if len(blob) < EMBEDDING_HEADER.size:
+        raise ValueError(f"Embedding blob is {len(blob)} bytes, shorter than its header")
+    return EMBEDDING_HEADER.unpack_from(blob)
+
+def top_k_indices(scores, k):
+    """
+    Indices of the k highest scores, best first.
+
+    Uses argpartition to select the winners in O(n) and only sorts those k,
+    instead of argsorting the whole array.
+
+    Args:
+        scores: 1-D array of scores, or 2-D array with one row per query
+        k: Number of results to return per query
+
+    Returns:
+        np.ndarray of indices, shape (k,) or (n_queries, k); k is capped at
+        the number of scores
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=-1)
@@ -1,10 +1,41 @@
 from google import genai
 from google.genai import types
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-import json
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
+from sqlalchemy.orm import undefer
 from .models import User, Work, UserWorkPool, db
+from .embedding_utils import encode_embedding, decode_embedding, top_k_indices
+from .embedding_index import get_work_embedding_cache
+from .ann_index import get_ann_index
+from .embedding_cache import get_embedding_cache
+from .llm_score_cache import get_llm_score_cache
+from .llm_scoring import parse_score_pairs
+from .quantization import QUANTIZATION_MODES
+from .embedding_executor import EmbeddingError, get_embedding_executor
+from .work_pool import upsert_work_pool_entries
+from .batch_scoring import regenerate_all_user_pools
+
+WORK_TYPES = ('poem', 'short_story', 'essay')
+
+# Hybrid confidence_score = EMBEDDING_SCORE_WEIGHT * similarity + LLM_SCORE_WEIGHT * LLM score
+EMBEDDING_SCORE_WEIGHT = 0.3
+LLM_SCORE_WEIGHT = 0.7
+HYBRID_POOL_REASON = "Embedding + LLM match"
+
+# Bump whenever the scoring prompt or its parsing changes, so cached LLM scores are not reused
+LLM_SCORING_PROMPT_VERSION = 2
+
+# Structured output for candidate scoring: [[work_id, score], ...]
+LLM_SCORES_SCHEMA = types.Schema(
+    type=types.Type.ARRAY,
+    items=types.Schema(
+        type=types.Type.ARRAY,
+        items=types.Schema(type=types.Type.NUMBER),
+        min_items=2,
+        max_items=2
+    )
+)
 
 '''
 Implementation Strategy for Embedding Recommendation Engine
@@ -24,41 +55,110 @@ class EmbeddingRecommendationEngine:
         self.embedding_model = "gemini-embedding-001"  # using gemini free tier for now
         self.embedding_dim = 3072  # Dimension of the embedding vectors. lets just use default 3096 since it is normalized
         self.num_final_recommendations = 30  # Default number of recommendations per category
+        self.embedding_task_type = "SEMANTIC_SIMILARITY"
+        self.embedding_batch_size = 100  # Max texts per embed_content request (Gemini limit)
+        self.llm_score_followups = 1  # Extra LLM calls for works missing from a scoring response
+        # Optional reduced-dimension first stage (e.g. 256/768); full-width vectors rerank the shortlist.
+        # Fewer FLOPs per query, but the truncated matrix is cached on top of the full one
+        self.search_dimensionality = current_app.config.get('EMBEDDING_SEARCH_DIM')
+        self.rerank_factor = current_app.config.get('EMBEDDING_RERANK_FACTOR', 4)
+        # Optional binary quantized first stage, also reranked at full width
+        self.quantized_search = current_app.config.get('EMBEDDING_QUANTIZED_SEARCH')
+        if self.quantized_search not in (None,) + QUANTIZATION_MODES:
+            print(f"Ignoring EMBEDDING_QUANTIZED_SEARCH={self.quantized_search!r}; supported: {QUANTIZATION_MODES}")
+            self.quantized_search = None
+        self.quantized_shortlist_factor = current_app.config.get('EMBEDDING_QUANTIZED_SHORTLIST_FACTOR', 10)
     
     def _get_embedding(self, text):
-        """Get embedding for text using Gemini API"""
-        try:
-            result = self.client.models.embed_content(
-                model=self.embedding_model,
-                contents=text.replace("\n", " "),  # Clean up text
-                config=types.EmbedContentConfig(task_type="SEMANTIC_SIMILARITY")
-            )
-            # Extract the actual embedding values from the ContentEmbedding object
-            [embedding_obj] = result.embeddings
-            return embedding_obj.values
-        except Exception as e:
-            print(f"Embedding error: {e}")
-            return [0.0] * self.embedding_dim  # Return zero vector as fallback
+        """Get embedding for text using Gemini API (or the embedding cache)"""
+        [embedding] = self._get_embeddings([text])
+        if embedding is None:
+            raise EmbeddingError("Failed to generate embedding")
+        return embedding
+    
+    def _request_embeddings(self, texts):
+        """Send one embed_content request for texts; raises on API errors"""
+        result = self.client.models.embed_content(
+            model=self.embedding_model,
+            contents=texts,
+            config=types.EmbedContentConfig(task_type=self.embedding_task_type)
+        )
+        # Extract the actual embedding values from the ContentEmbedding objects
+        if len(result.embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(result.embeddings)}")
+        return [embedding_obj.values for embedding_obj in result.embeddings]
+    
+    def _get_embeddings(self, texts):
+        """
+        Get embeddings for many texts, sending up to embedding_batch_size per request.
+        
+        Texts already in the persistent embedding cache are not sent to the API.
+        Remaining batches run concurrently under the configured rate limit and
+        are retried on 429/5xx errors.
+        
+        Returns:
+            list of embeddings (lists of floats, whether cached or fresh) in the
+            same order as texts, with None for any text whose request still
+            failed after retries
+        """
+        texts = [text.replace("\n", " ") for text in texts]  # Clean up text
+        cache = get_embedding_cache()
+        cache_key = (self.embedding_model, self.embedding_task_type, self.embedding_dim)
+        
+        # The cache decodes to numpy arrays; hand out lists like the API does
+        found = {text: vector.tolist() for text, vector in cache.get_many(texts, *cache_key).items()}
+        missing = list(dict.fromkeys(text for text in texts if text not in found))
+        batches = [missing[start:start + self.embedding_batch_size]
+                   for start in range(0, len(missing), self.embedding_batch_size)]
+        
+        results = get_embedding_executor().run(self._request_embeddings, batches)
+        
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                print(f"Embedding error for {len(batch)} texts: {result}")
+                continue
+            fresh = {text: list(values) for text, values in zip(batch, result)}
+            cache.put_many(fresh, *cache_key)
+            found.update(fresh)
+        
+        return [found.get(text) for text in texts]
         
     # STEP 1: Generate embeddings for all works (run once when adding works)
     def generate_work_embeddings(self, works=None, regenerate=False):
-        """Generate embeddings for all works in the database"""
+        """Generate embeddings for all works in the database, batched and concurrent"""
         if works is None:
-            works = Work.query.all()
+            # Filter in SQL so the (deferred) embeddings are never loaded
+            query = Work.query if regenerate else Work.query.filter(Work.embedding_vector.is_(None))
+            pending = query.all()
+        else:
+            # Only generate if not exists
+            pending = [work for work in works if regenerate or work.embedding_vector is None]
+        
+        # Enough works per chunk to keep every worker busy with a full batch
+        chunk_size = self.embedding_batch_size * get_embedding_executor().max_workers
+        generated = 0
+        
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
             
-        for work in works:
-            if work.embedding_vector is None or regenerate:  # Only generate if not exists
-                # Create rich text representation of the work
-                work_text = self._create_work_description(work)
-                
-                # Generate embedding
-                embedding = self._get_embedding(work_text)
-                
-                # Store as JSON in database
-                work.embedding_vector = json.dumps(embedding)
+            # Create rich text representation of each work and embed them together
+            embeddings = self._get_embeddings([self._create_work_description(work) for work in chunk])
+            
+            for work, embedding in zip(chunk, embeddings):
+                if embedding is None:
+                    continue  # Leave the existing value; retried on the next run
+                # Store as binary float32 blob in database
+                work.embedding_vector = encode_embedding(embedding)
+                generated += 1
+            
+            # Commit per chunk so progress survives an interrupted run
+            db.session.commit()
+            print(f"  Embedded {start + len(chunk)}/{len(pending)} works")
                 
         db.session.commit()
-        print(f"Generated embeddings for {len(works)} works")
+        print(f"Generated embeddings for {generated} works")
+        if generated < len(pending):
+            print(f"Failed to embed {len(pending) - generated} works")
     
     def _create_work_description(self, work):
         """Create rich text description for embedding generation"""
@@ -93,61 +193,86 @@ class EmbeddingRecommendationEngine:
         # Later we can enhance this with LLM refinement or additional user data
         return user.preference_summary or "No preferences specified"
     
-    # STEP 3: Find similar works using cosine similarity
+    # STEP 3: Find similar works using cosine similarity against the cached work matrix
     def find_similar_works(self, user_id, work_type=None, top_k=100):
         """Find works most similar to user's preferences"""
         
-        user = User.query.get(user_id)
+        # Embeddings are deferred columns; load this one with the user row
+        user = User.query.options(undefer(User.embedding_vector)).filter_by(id=user_id).first()
         if not user or not user.embedding_vector:
             return []
             
         try:
-            user_embedding = json.loads(user.embedding_vector)
-        except (json.JSONDecodeError, TypeError):
+            user_embedding = decode_embedding(user.embedding_vector)
+        except ValueError:
             return []
         
-        # Get all works (or filter by type)
-        query = Work.query.filter(Work.embedding_vector.isnot(None))
-        if work_type:
-            query = query.filter(Work.work_type == work_type)
-        works = query.all()
-        
-        if not works:
-            return []
-        
-        # Convert stored embeddings back to numpy arrays
-        work_embeddings = []
-        work_objects = []
-        
-        for work in works:
-            try:
-                embedding = json.loads(work.embedding_vector)
-                work_embeddings.append(embedding)
-                work_objects.append(work)
-            except (json.JSONDecodeError, TypeError):
-                continue
+        # Score against the cached, pre-normalised work matrix (no DB round trip).
+        # In quantized or reduced-dimension mode a cheap first stage picks a
+        # shortlist that is reranked at full width. Otherwise per-type searches
+        # go through the ANN index, which falls back to exact scoring for small
+        # catalogs or when no up-to-date index exists.
+        if self.quantized_search or (
+                self.search_dimensionality and self.search_dimensionality < len(user_embedding)):
+            work_ids, similarities = self._two_stage_search(user_embedding, work_type, top_k)
+        elif work_type:
+            work_ids, similarities = get_ann_index().search(user_embedding, work_type)
+        else:
+            work_ids, similarities = get_work_embedding_cache().score(user_embedding)
         
-        if not work_embeddings:
+        if not len(work_ids):
             return []
-            
-        work_embeddings = np.array(work_embeddings)
-        user_embedding = np.array(user_embedding).reshape(1, -1)
-        
-        # Calculate cosine similarities
-        similarities = cosine_similarity(user_embedding, work_embeddings)[0]
         
         # Get top K most similar works
-        top_indices = similarities.argsort()[-top_k:][::-1]
+        top_indices = top_k_indices(similarities, top_k)
+        
+        # Load only the winning works, keeping similarity order
+        top_ids = [int(work_ids[idx]) for idx in top_indices]
+        works_by_id = {work.id: work for work in Work.query.filter(Work.id.in_(top_ids)).all()}
         
         similar_works = []
-        for idx in top_indices:
+        for idx, work_id in zip(top_indices, top_ids):
+            if work_id not in works_by_id:
+                continue
             similar_works.append({
-                'work': work_objects[idx],
+                'work': works_by_id[work_id],
                 'similarity_score': float(similarities[idx])
             })
         
         return similar_works
     
+    def _two_stage_search(self, user_embedding, work_type, top_k):
+        """
+        Two-stage search: score all works cheaply, then rescore a shortlist at full width.
+        
+        The first stage uses the binary sign codes when quantized_search is
+        set (shortlist of top_k * quantized_shortlist_factor), otherwise the
+        first search_dimensionality components (top_k * rerank_factor).
+        
+        Returns:
+            (ids, similarities) for the shortlist, with full-width cosine similarities
+        """
+        cache = get_work_embedding_cache()
+        if self.quantized_search:
+            work_ids, similarities = cache.score_quantized(user_embedding, work_type)
+            shortlist_size = top_k * self.quantized_shortlist_factor
+            if not len(work_ids):
+                # Cache built without quantized codes (mode enabled later); score exactly
+                return cache.score(user_embedding, work_type)
+        else:
+            work_ids, similarities = cache.score(
+                user_embedding, work_type, dimensions=self.search_dimensionality
+            )
+            shortlist_size = top_k * self.rerank_factor
+        if not len(work_ids):
+            return work_ids, similarities
+        
+        shortlist = work_ids[top_k_indices(similarities, shortlist_size)]
+        shortlist_ids, matrix = cache.get_vectors(shortlist)
+        query = np.asarray(user_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        return shortlist_ids, matrix @ query
+    
     # STEP 3.5: Embedding-only recommendations (simpler, faster)
     def generate_embedding_recommendations(self, user_id, work_type, num_final_recommendations=None):
         """Generate recommendations using only embedding similarity (no LLM)"""
@@ -190,7 +315,10 @@ class EmbeddingRecommendationEngine:
         
         llm_scores = self._llm_score_candidates(user, candidate_works)
         
-        # Combine embedding and LLM scores
+        return self._combine_scores(similar_works, llm_scores, num_final_recommendations)
+    
+    def _combine_scores(self, similar_works, llm_scores, num_final_recommendations):
+        """Combine embedding and LLM scores and return the top recommendations"""
         final_recommendations = []
         for item in similar_works:
             work_id = item['work'].id
@@ -198,7 +326,7 @@ class EmbeddingRecommendationEngine:
             llm_score = llm_scores.get(str(work_id), 0.5)  # Default to neutral if missing
             
             # Weighted combination (you can tune these weights)
-            combined_score = (0.3 * embedding_score) + (0.7 * llm_score)
+            combined_score = (EMBEDDING_SCORE_WEIGHT * embedding_score) + (LLM_SCORE_WEIGHT * llm_score)
             
             final_recommendations.append({
                 'work': item['work'],
@@ -211,9 +339,141 @@ class EmbeddingRecommendationEngine:
         final_recommendations.sort(key=lambda x: x['confidence_score'], reverse=True)
         return final_recommendations[:num_final_recommendations]
     
+    def generate_hybrid_recommendations_all_types(self, user_id, work_types=WORK_TYPES, num_final_recommendations=None):
+        """
+        Hybrid recommendations for several work types with concurrent LLM scoring.
+        
+        Candidate retrieval runs first (it needs the database session); the
+        independent per-type LLM scoring calls then run in parallel, so the
+        total time is roughly that of the slowest call.
+        
+        Returns:
+            dict of work_type -> list of recommendations
+        """
+        if num_final_recommendations is None:
+            num_final_recommendations = self.num_final_recommendations
+        
+        # Phase 1: Embedding candidates per type (fast, cheap)
+        candidates = {
+            work_type: self.find_similar_works(user_id, work_type=work_type, top_k=50)
+            for work_type in work_types
+        }
+        
+        # Phase 2: One LLM scoring call per type for works without a cached
+        # score, concurrently. Cache reads and writes stay on this thread (they
+        # need the session); touch the attributes the prompt needs first so
+        # worker threads never lazy-load.
+        user = User.query.get(user_id)
+        _ = user.preference_summary
+        cached, uncached = {}, {}
+        for work_type, items in candidates.items():
+            cached[work_type], uncached[work_type] = self._cached_llm_scores(user, [item['work'] for item in items])
+        
+        with ThreadPoolExecutor(max_workers=len(work_types)) as pool:
+            futures = {
+                work_type: pool.submit(self._request_llm_scores, user, works)
+                for work_type, works in uncached.items() if works
+            }
+            llm_scores = {}
+            for work_type in work_types:
+                fresh = {}
+                if work_type in futures:
+                    fresh = futures[work_type].result()
+                    self._store_llm_scores(user, fresh, uncached[work_type])
+                neutral = {str(work.id): 0.5 for work in uncached[work_type]}
+                llm_scores[work_type] = {**neutral, **fresh, **cached[work_type]}
+        
+        return {
+            work_type: self._combine_scores(candidates[work_type], llm_scores[work_type], num_final_recommendations)
+            for work_type in work_types
+        }
+    
     def _llm_score_candidates(self, user, candidate_works):
-        """Use LLM to score a smaller set of candidate works"""
+        """
+        Use LLM to score a smaller set of candidate works.
+        
+        Scores already persisted for the user's preference summary (same LLM
+        model and prompt version) are reused; only the remaining works are
+        sent to the LLM, and its scores are saved for next time.
+        
+        Returns:
+            dict of str(work_id) -> score, 0.5 for works the LLM failed to score
+        """
+        cached, uncached = self._cached_llm_scores(user, candidate_works)
+        if not uncached:
+            return cached
         
+        fresh = self._request_llm_scores(user, uncached)
+        self._store_llm_scores(user, fresh, uncached)
+        # Fallback to neutral scores for works the LLM couldn't score
+        neutral = {str(work.id): 0.5 for work in uncached}
+        return {**neutral, **fresh, **cached}
+    
+    def _cached_llm_scores(self, user, works):
+        """Split works into ({str(work_id): cached score}, works still to score)"""
+        if not user.preference_summary or not works:
+            return {}, list(works)
+        found = get_llm_score_cache().get_many(
+            user.preference_summary, [work.id for work in works],
+            self.llm_model, LLM_SCORING_PROMPT_VERSION
+        )
+        cached = {str(work_id): score for work_id, score in found.items()}
+        return cached, [work for work in works if work.id not in found]
+    
+    def _store_llm_scores(self, user, scores, works):
+        """Persist valid LLM scores of works for the user's preference summary"""
+        if not user.preference_summary:
+            return
+        valid = {}
+        for work in works:
+            score = scores.get(str(work.id))
+            if isinstance(score, (int, float)) and not isinstance(score, bool) and 0.0 <= score <= 1.0:
+                valid[work.id] = float(score)
+        get_llm_score_cache().put_many(
+            user.preference_summary, valid, self.llm_model, LLM_SCORING_PROMPT_VERSION
+        )
+    
+    def _request_llm_scores(self, user, candidate_works):
+        """
+        Score candidate_works with the LLM (no database access, safe in threads).
+        
+        The response is schema-constrained JSON and is parsed tolerantly, so a
+        truncated or malformed answer still yields every complete score. Works
+        missing from a response are asked for again in a smaller follow-up
+        call, up to llm_score_followups times.
+        
+        Returns:
+            dict of str(work_id) -> score for the works the LLM actually
+            scored; works it failed on are left out
+        """
+        scores = {}
+        pending = list(candidate_works)
+        for attempt in range(1 + self.llm_score_followups):
+            try:
+                response = self.client.models.generate_content(
+                    model=self.llm_model,
+                    contents=self._llm_scoring_prompt(user, pending),
+                    config=types.GenerateContentConfig(
+                        response_mime_type='application/json',
+                        response_schema=LLM_SCORES_SCHEMA
+                    )
+                )
+            except Exception as e:
+                print(f"LLM scoring error: {e}")
+                break
+            
+            requested = {str(work.id) for work in pending}
+            parsed = parse_score_pairs(response.text)
+            scores.update({work_id: score for work_id, score in parsed.items() if work_id in requested})
+            pending = [work for work in pending if str(work.id) not in scores]
+            if not pending:
+                break
+            print(f"LLM scoring: {len(pending)} of {len(requested)} works missing from response "
+                  f"(attempt {attempt + 1})")
+        return scores
+    
+    def _llm_scoring_prompt(self, user, candidate_works):
+        """Build the scoring prompt; the answer format is enforced by LLM_SCORES_SCHEMA"""
         works_text = ""
         for i, work in enumerate(candidate_works):
             works_text += f"{i+1}. ID: {work.id} | {work.title} by {work.author} | {work.work_type}\n"
@@ -221,8 +481,7 @@ class EmbeddingRecommendationEngine:
                 works_text += f"   Summary: {work.summary[:200]}...\n"
             works_text += "\n"
         
-        prompt = f"""
-        Only respond with JSON. Do not add any extra text.
+        return f"""
         You are an expert literary recommendation engine.
 
         User's Reading Preferences:
@@ -236,67 +495,29 @@ class EmbeddingRecommendationEngine:
         Works to evaluate:
         {works_text}
         
-        Respond with JSON format: {{"work_id": confidence_score}}
-        Example: {{"123": 0.85, "124": 0.62, "125": 0.91}}
+        Respond with a JSON array of [work_id, confidence_score] pairs, one per work.
+        Example: [[123, 0.85], [124, 0.62], [125, 0.91]]
         """
-        
-        try:
-            response = self.client.models.generate_content(
-                model=self.llm_model,
-                contents=prompt
-            )
-
-            # Handle markdown-wrapped JSON responses
-            response_text = response.text
-
-            #print(response_text)
-
-            # Extract JSON from markdown code block
-            start = response_text.find('{')
-            end = response_text.rfind('}') + 1
-            if start != -1 and end > start:
-                response_text = response_text[start:end]
-
-            return json.loads(response_text)
-        except Exception as e:
-            print(f"LLM scoring error: {e}")
-            # Fallback to neutral scores
-            return {str(work.id): 0.5 for work in candidate_works}
     
     # STEP 5: Update work pool with embedding scores
     def populate_user_work_pool(self, user_id):
         """Populate UserWorkPool with embedding-based recommendation scores"""
         
-        for work_type in ['poem', 'short_story', 'essay']:
-            # recommendations = self.generate_embedding_recommendations(
-            #     user_id, 
-            #     work_type
-            # )
-            recommendations = self.generate_hybrid_recommendations(
-                user_id, 
-                work_type
-            )
-            
-            for rec in recommendations:
-                # Check if already in pool
-                existing = UserWorkPool.query.filter_by(
-                    user_id=user_id,
-                    work_id=rec['work'].id
-                ).first()
-                
-                if existing:
-                    # Update existing confidence score
-                    existing.confidence_score = rec['confidence_score']
-                else:
-                    # Create new pool entry
-                    pool_entry = UserWorkPool(
-                        user_id=user_id,
-                        work_id=rec['work'].id,
-                        work_type=work_type,
-                        confidence_score=rec['confidence_score'],
-                        status='available'
-                    )
-                    db.session.add(pool_entry)
+        # Score all three types with their LLM calls running concurrently,
+        # then write the merged results in a single commit
+        recommendations_by_type = self.generate_hybrid_recommendations_all_types(user_id)
+        
+        upsert_work_pool_entries([
+            {
+                'user_id': user_id,
+                'work_id': rec['work'].id,
+                'work_type': work_type,
+                'confidence_score': rec['confidence_score'],
+                'added_reason': HYBRID_POOL_REASON
+            }
+            for work_type, recommendations in recommendations_by_type.items()
+            for rec in recommendations
+        ])
         
         db.session.commit()
         print(f"Populated work pool for user {user_id}")
@@ -309,13 +530,12 @@ def setup_embedding_system():
     # Step 1: Generate embeddings for all works (run once)
     engine.generate_work_embeddings()
     
-    # Step 2: For each user, populate their work pool
-    users = User.query.all()
-    for user in users:
-        if user.preference_summary:  # Only if they've completed onboarding
-            engine.populate_user_work_pool(user.id)
+    # Step 2: Populate every user's work pool in one batched pass
+    # (users get embeddings once they've completed onboarding)
+    result = regenerate_all_user_pools(top_k=engine.num_final_recommendations)
+    print(f"Populated work pools for {result['users']} users")
 
 # Database schema addition needed:
 """
-ALTER TABLE works ADD COLUMN embedding_vector TEXT;
+ALTER TABLE works ADD COLUMN embedding_vector BLOB;
 """
\ No newline at end of file
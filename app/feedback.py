@@ -0,0 +1,116 @@
+"""
+Rating feedback for user embeddings.
+
+When a user rates a recommendation, their embedding is nudged toward the
+rated work's embedding (ratings above neutral) or away from it (below
+neutral) with a Rocchio-style update computed locally in numpy, so
+personalisation improves without an embedding API call. The user's
+available pool entries are then adjusted by how much their similarity to
+the user moved, scaled by the weight similarity has in each entry's
+confidence_score (see _embedding_weight), leaving any LLM contribution
+intact.
+"""
+
+import numpy as np
+from flask import current_app
+
+from .models import User, UserWorkPool, db
+from .embedding_utils import decode_embedding, encode_embedding
+from .embedding_index import get_work_embedding_cache, normalize_rows
+from .embeddings_engine import EMBEDDING_SCORE_WEIGHT
+from .batch_scoring import BATCH_POOL_REASON
+from .recommendations import BASIC_POOL_REASON
+
+NEUTRAL_RATING = 3
+DEFAULT_LEARNING_RATE = 0.1
+MIN_SCORE_CHANGE = 1e-3  # Pool entries whose score moves less than this are not rewritten
+
+def rating_weight(rating, old_rating=None):
+    """
+    Signed feedback weight in [-1, 1] for a 1-5 rating.
+
+    A changed rating only applies the difference from the previous one, so
+    re-rating a work doesn't count it twice.
+    """
+    weight = (rating - NEUTRAL_RATING) / 2.0
+    if old_rating is not None:
+        weight -= (old_rating - NEUTRAL_RATING) / 2.0
+    return weight
+
+def apply_rating_feedback(user_id, work_id, rating, old_rating=None):
+    """
+    Move a user's embedding toward/away from a rated work and rescore their pool.
+
+    Changes are made in the current transaction; the caller commits.
+
+    Returns:
+        int: number of pool entries whose confidence_score was updated
+    """
+    weight = rating_weight(rating, old_rating)
+    if weight == 0:
+        return 0
+
+    blob = db.session.query(User.embedding_vector).filter(User.id == user_id).scalar()
+    try:
+        user_vector = decode_embedding(blob)
+    except ValueError:
+        return 0
+    if user_vector is None:
+        return 0
+
+    cache = get_work_embedding_cache()
+    found, work_vectors = cache.get_vectors([work_id])
+    if not len(found) or work_vectors.shape[1] != len(user_vector):
+        return 0
+
+    learning_rate = current_app.config.get('FEEDBACK_LEARNING_RATE', DEFAULT_LEARNING_RATE)
+    old_query = normalize_rows(user_vector.reshape(1, -1))[0]
+    new_query = normalize_rows((old_query + learning_rate * weight * work_vectors[0]).reshape(1, -1))[0]
+
+    User.query.filter_by(id=user_id).update(
+        {'embedding_vector': encode_embedding(new_query)}, synchronize_session=False
+    )
+
+    return _rescore_pool(user_id, cache, new_query - old_query)
+
+def _embedding_weight(added_reason):
+    """Weight of the embedding similarity in a pool entry's confidence_score."""
+    if added_reason == BASIC_POOL_REASON:
+        return 0.0  # Scored without embeddings
+    if added_reason == BATCH_POOL_REASON:
+        return 1.0  # Pure cosine similarity
+    return EMBEDDING_SCORE_WEIGHT  # Hybrid embedding + LLM score (older rows have no reason)
+
+def _rescore_pool(user_id, cache, query_change):
+    """Shift available pool scores by each work's weighted change in cosine similarity."""
+    entries = [entry for entry in db.session.query(
+        UserWorkPool.id, UserWorkPool.work_id, UserWorkPool.confidence_score, UserWorkPool.added_reason
+    ).filter(
+        UserWorkPool.user_id == user_id,
+        UserWorkPool.status == 'available',
+        UserWorkPool.active == True
+    ).all() if _embedding_weight(entry.added_reason)]
+    if not entries:
+        return 0
+
+    ids, matrix = cache.get_vectors([entry.work_id for entry in entries])
+    if not len(ids):
+        return 0
+    deltas = dict(zip(ids.tolist(), (matrix @ query_change).tolist()))
+
+    updates = []
+    for entry in entries:
+        delta = deltas.get(entry.work_id)
+        if delta is None:
+            continue
+        delta *= _embedding_weight(entry.added_reason)
+        if abs(delta) < MIN_SCORE_CHANGE:
+            continue
+        updates.append({
+            'id': entry.id,
+            'confidence_score': float(np.clip(entry.confidence_score + delta, 0.0, 1.0))
+        })
+
+    if updates:
+        db.session.bulk_update_mappings(UserWorkPool, updates)
+    return len(updates)
@@ -0,0 +1,198 @@
+"""
+Background job queue backed by the application database.
+
+Routes enqueue slow work (e.g. populating a user's work pool, which runs
+three hybrid recommendation passes with LLM calls) instead of doing it in
+the request thread. A separate worker process (scripts/run_worker.py)
+claims pending jobs, runs them, and retries failures with backoff.
+
+A user has at most one pending job per type (enforced by a partial unique
+index) and their jobs of one type never run concurrently. Jobs left
+'running' by a worker that died are reclaimed after CLAIM_TIMEOUT_SECONDS.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from .models import Job, db
+
+POPULATE_WORK_POOL = 'populate_work_pool'
+
+RETRY_BACKOFF_SECONDS = 30  # doubled after each failed attempt
+CLAIM_TIMEOUT_SECONDS = 30 * 60  # running jobs older than this are assumed abandoned
+SUPERSEDED_ERROR = 'Superseded by a newer pending job'
+
+def _populate_work_pool(job):
+    from .recommendations import populate_user_work_pool
+    if not populate_user_work_pool(job.user_id):
+        raise RuntimeError(f"Could not populate work pool for user {job.user_id}")
+
+JOB_HANDLERS = {
+    POPULATE_WORK_POOL: _populate_work_pool,
+}
+
+def enqueue_job(job_type, user_id=None, max_attempts=3):
+    """
+    Queue a job, reusing an existing pending job of the same type for the user.
+
+    Returns:
+        Job: the new or already-pending job
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    existing = _pending_job(job_type, user_id)
+    if existing:
+        return existing
+
+    job = Job(job_type=job_type, user_id=user_id, max_attempts=max_attempts)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request queued the same job first
+        db.session.rollback()
+        return _pending_job(job_type, user_id)
+    return job
+
+def _pending_job(job_type, user_id):
+    return Job.query.filter_by(job_type=job_type, user_id=user_id, status='pending').first()
+
+def enqueue_pool_population(user_id):
+    """Queue (or reuse a pending) work pool population job for a user."""
+    return enqueue_job(POPULATE_WORK_POOL, user_id=user_id)
+
+def reclaim_abandoned_jobs(claim_timeout=CLAIM_TIMEOUT_SECONDS):
+    """
+    Return jobs stuck in 'running' past claim_timeout to the queue.
+
+    Reclaimed jobs are retried like failures (or failed once out of
+    attempts); one that has since been queued again is marked superseded.
+
+    Returns:
+        int: number of jobs reclaimed
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=claim_timeout)
+    abandoned = Job.query.filter(Job.status == 'running', Job.started_at < cutoff).all()
+    for job in abandoned:
+        print(f"Reclaiming job {job.id}: running since {job.started_at}")
+        _finish_failed_attempt(job, f"Worker stopped responding (claimed {job.started_at})")
+    return len(abandoned)
+
+def claim_next_job(claim_timeout=CLAIM_TIMEOUT_SECONDS):
+    """
+    Atomically move the oldest runnable pending job to 'running'.
+
+    Jobs whose user already has a job of the same type running wait for it.
+
+    Returns:
+        Job or None if nothing is due
+    """
+    reclaim_abandoned_jobs(claim_timeout)
+
+    now = datetime.now(timezone.utc)
+    running = aliased(Job)
+    busy = db.session.query(running.id).filter(
+        running.status == 'running',
+        running.job_type == Job.job_type,
+        running.user_id == Job.user_id
+    ).exists()
+    candidates = db.session.query(Job.id).filter(
+        Job.status == 'pending',
+        Job.run_after <= now,
+        ~busy
+    ).order_by(Job.run_after.asc(), Job.id.asc()).limit(5).all()
+
+    for (job_id,) in candidates:
+        # Conditional update so two workers can't claim the same job
+        claimed = Job.query.filter_by(id=job_id, status='pending').update({
+            'status': 'running',
+            'started_at': now,
+            'attempts': Job.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+def run_job(job):
+    """Run a claimed job and record success, a scheduled retry, or final failure."""
+    handler = JOB_HANDLERS.get(job.job_type)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job type: {job.job_type}")
+        handler(job)
+        job.status = 'succeeded'
+        job.last_error = None
+        job.finished_at = datetime.now(timezone.utc)
+        db.session.commit()
+        return True
+
+    except Exception as e:
+        db.session.rollback()
+        _finish_failed_attempt(db.session.get(Job, job.id), str(e))
+        return False
+
+def _finish_failed_attempt(job, error):
+    """Schedule a retry of a failed or abandoned job, or fail it for good, and commit."""
+    job.last_error = error
+    if _pending_job(job.job_type, job.user_id) is not None:
+        # Queued again while this attempt ran; the pending job covers it
+        job.status = 'failed'
+        job.last_error = f"{error} ({SUPERSEDED_ERROR})"
+        job.finished_at = datetime.now(timezone.utc)
+    elif job.attempts < job.max_attempts:
+        delay = RETRY_BACKOFF_SECONDS * (2 ** (job.attempts - 1))
+        job.status = 'pending'
+        job.run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        print(f"Job {job.id} failed (attempt {job.attempts}/{job.max_attempts}), retrying in {delay}s: {error}")
+    else:
+        job.status = 'failed'
+        job.finished_at = datetime.now(timezone.utc)
+        print(f"Job {job.id} failed permanently: {error}")
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A pending job was queued between the check and the commit
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.status = 'failed'
+        job.last_error = f"{error} ({SUPERSEDED_ERROR})"
+        job.finished_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+def run_worker(poll_interval=2.0, once=False):
+    """
+    Process jobs until interrupted.
+
+    Args:
+        poll_interval: Seconds to sleep when the queue is empty
+        once: Return as soon as the queue is empty (useful for cron and tests)
+    """
+    while True:
+        job = claim_next_job()
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        print(f"Running job {job.id} ({job.job_type}, user {job.user_id})")
+        run_job(job)
+        db.session.remove()  # Fresh session per job so no state leaks between jobs
+
+def job_status(job):
+    """Serialise a job for the status endpoint."""
+    return {
+        'id': job.id,
+        'type': job.job_type,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'error': job.last_error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
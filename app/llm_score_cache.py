@@ -0,0 +1,102 @@
+"""
+Persistent cache of LLM candidate scores.
+
+The LLM's match score for a work depends only on the user's preference
+summary, the work, the model and the scoring prompt, so pool regenerations
+with unchanged preferences (e.g. repeated /generate-pool clicks) can reuse
+earlier scores instead of asking Gemini again. Entries are keyed by
+(sha256(preference_summary), work_id, llm_model, prompt_version) and stored
+in the LlmScoreCacheEntry table; bumping the prompt version retires old
+scores. Only real LLM scores are stored, never the neutral fallback.
+"""
+
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app
+
+from .models import LlmScoreCacheEntry, db
+from .embedding_cache import text_hash
+
+class LlmScoreCache:
+    """Database-backed LLM score cache with hit/miss counters."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key_filter(self, summary, llm_model, prompt_version):
+        return db.and_(
+            LlmScoreCacheEntry.summary_hash == text_hash(summary),
+            LlmScoreCacheEntry.llm_model == llm_model,
+            LlmScoreCacheEntry.prompt_version == prompt_version,
+        )
+
+    def get_many(self, summary, work_ids, llm_model, prompt_version):
+        """
+        Look up cached scores of works for a preference summary.
+
+        Returns:
+            dict of work_id -> score for the works that were cached
+        """
+        if not work_ids:
+            return {}
+
+        found = dict(db.session.query(LlmScoreCacheEntry.work_id, LlmScoreCacheEntry.score).filter(
+            self._key_filter(summary, llm_model, prompt_version),
+            LlmScoreCacheEntry.work_id.in_(list(work_ids))
+        ).all())
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(work_ids) - len(found)
+        return found
+
+    def put_many(self, summary, scores, llm_model, prompt_version):
+        """
+        Store scores for a preference summary; the caller commits.
+
+        Args:
+            scores: dict of work_id -> score
+        """
+        if not scores:
+            return
+
+        existing = {
+            entry.work_id: entry for entry in LlmScoreCacheEntry.query.filter(
+                self._key_filter(summary, llm_model, prompt_version),
+                LlmScoreCacheEntry.work_id.in_(list(scores))
+            ).all()
+        }
+
+        digest = text_hash(summary)
+        now = datetime.now(timezone.utc)
+        for work_id, score in scores.items():
+            entry = existing.get(work_id)
+            if entry is not None:
+                entry.score = score
+            else:
+                db.session.add(LlmScoreCacheEntry(
+                    summary_hash=digest,
+                    work_id=work_id,
+                    llm_model=llm_model,
+                    prompt_version=prompt_version,
+                    score=score,
+                    created_at=now
+                ))
+        db.session.flush()
+
+    def stats(self):
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+def get_llm_score_cache():
+    """Return the LLM score cache for the current app, creating it on first use."""
+    return current_app.extensions.setdefault('llm_score_cache', LlmScoreCache())
@@ -0,0 +1,59 @@
+"""
+Parsing of LLM candidate-scoring responses.
+
+The scoring call asks for a JSON array of [work_id, score] pairs under a
+response schema. Output can still arrive truncated (token limit) or, from
+older prompts and models, as a {"work_id": score} object or wrapped in a
+markdown code block. parse_score_pairs recovers every complete pair it can
+find instead of discarding the whole response, so only the works that are
+really missing need to be asked for again.
+"""
+
+import json
+import re
+
+_NUMBER = r'-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?'
+# [123, 0.85] / ["123", 0.85]
+_PAIR = re.compile(r'\[\s*"?(\d+)"?\s*,\s*(' + _NUMBER + r')\s*\]')
+# "123": 0.85
+_ENTRY = re.compile(r'"(\d+)"\s*:\s*(' + _NUMBER + r')')
+
+def _clamp(score):
+    return min(max(float(score), 0.0), 1.0)
+
+def parse_score_pairs(text):
+    """
+    Extract work scores from an LLM response.
+
+    Returns:
+        dict of str(work_id) -> score clamped to [0, 1]; empty if nothing
+        usable was found
+    """
+    if not text:
+        return {}
+
+    # Well-formed output: parse it exactly
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    scores = {}
+    if isinstance(data, list):
+        for item in data:
+            if (isinstance(item, list) and len(item) == 2
+                    and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in item)):
+                scores[str(int(item[0]))] = _clamp(item[1])
+        if scores:
+            return scores
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            if key.isdigit() and isinstance(value, (int, float)) and not isinstance(value, bool):
+                scores[key] = _clamp(value)
+        if scores:
+            return scores
+
+    # Truncated or wrapped output: keep every complete pair/entry
+    for pattern in (_PAIR, _ENTRY):
+        for work_id, score in pattern.findall(text):
+            scores.setdefault(work_id, _clamp(score))
+    return scores
@@ -1,5 +1,6 @@
 from . import db, login_manager
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
 from datetime import datetime, timezone
 
 # Database Models
@@ -14,7 +15,8 @@ class User(UserMixin, db.Model):
     difficulty_preference = db.Column(db.String(20), default='intermediate')  # beginner/intermediate/advanced
     preferred_length = db.Column(db.String(20), default='medium')  # short/medium/long
     preference_summary = db.Column(db.Text)  # LLM-friendly summary of all preferences
-    embedding_vector = db.Column(db.Text)  # JSON-encoded embedding vector for user preferences
+    embedding_vector = db.deferred(db.Column(db.LargeBinary))  # Binary float32 embedding (see embedding_utils) for user preferences; deferred, loaded only by the similarity path
+    embedding_summary_hash = db.Column(db.String(64))  # text_hash of the preference_summary embedding_vector was built from
     active = db.Column(db.Boolean, default=True)
     
     # Relationships
@@ -45,7 +47,8 @@ class Work(db.Model):
     publication_year = db.Column(db.Integer)
     public_domain = db.Column(db.Boolean, default=True)
     word_count = db.Column(db.Integer)
-    embedding_vector = db.Column(db.Text)  # JSON-encoded embedding vector
+    embedding_vector = db.deferred(db.Column(db.LargeBinary))  # Binary float32 embedding (see embedding_utils); deferred, loaded only by the similarity path
+    embedding_updated_at = db.Column(db.DateTime, index=True)  # Last embedding_vector/work_type change; lets other processes' caches catch up
     created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
     active = db.Column(db.Boolean, default=True)
     
@@ -53,6 +56,14 @@ class Work(db.Model):
     work_pools = db.relationship('UserWorkPool', backref='work', lazy=True)
     work_recommendations = db.relationship('WorkRecommendation', backref='work', lazy=True)
 
+@event.listens_for(Work, 'before_insert')
+@event.listens_for(Work, 'before_update')
+def _stamp_embedding_change(mapper, connection, target):
+    state = inspect(target)
+    if (state.attrs.embedding_vector.history.has_changes()
+            or state.attrs.work_type.history.has_changes()):
+        target.embedding_updated_at = datetime.now(timezone.utc)
+
 class UserWorkPool(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -66,6 +77,13 @@ class UserWorkPool(db.Model):
     times_recommended = db.Column(db.Integer, default=0)
     active = db.Column(db.Boolean, default=True)
 
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'work_id', name='uq_user_work_pool_user_work'),
+        # Covers the available-pool lookups: equality filters, then the ORDER BY columns
+        db.Index('ix_user_work_pool_available', 'user_id', 'work_type', 'status', 'active',
+                 'confidence_score', 'last_recommended_at'),
+    )
+
 class WorkRecommendation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -81,8 +99,76 @@ class WorkRecommendation(db.Model):
     completed_at = db.Column(db.DateTime)
     updated_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
 
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'work_type', 'date', name='uq_work_recommendation_user_type_date'),
+        db.Index('ix_work_recommendation_user_date', 'user_id', 'date'),
+    )
+
+class UserReadingStats(db.Model):
+    """Per-user profile statistics, built from one aggregate query and kept current incrementally (see reading_stats.py)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_recommendations = db.Column(db.Integer, nullable=False, default=0)
+    completed_recommendations = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    first_recommended_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class EmbeddingCacheEntry(db.Model):
+    """Embedding of a description text, keyed by model settings and text hash (see embedding_cache)"""
+    id = db.Column(db.Integer, primary_key=True)
+    model = db.Column(db.String(100), nullable=False)
+    task_type = db.Column(db.String(50), nullable=False)
+    dimension = db.Column(db.Integer, nullable=False)
+    text_hash = db.Column(db.String(64), nullable=False)  # sha256 hex digest of the embedded text
+    embedding_vector = db.Column(db.LargeBinary, nullable=False)  # Binary embedding (see embedding_utils)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    last_used_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)  # LRU eviction order
+
+    __table_args__ = (
+        db.UniqueConstraint('model', 'task_type', 'dimension', 'text_hash', name='uq_embedding_cache_key'),
+    )
+
+class LlmScoreCacheEntry(db.Model):
+    """LLM match score of a work for a preference summary, keyed by model and prompt version (see llm_score_cache)"""
+    id = db.Column(db.Integer, primary_key=True)
+    summary_hash = db.Column(db.String(64), nullable=False)  # sha256 hex digest of User.preference_summary
+    work_id = db.Column(db.Integer, db.ForeignKey('work.id'), nullable=False)
+    llm_model = db.Column(db.String(100), nullable=False)
+    prompt_version = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)  # 0-1 scale
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        db.UniqueConstraint('summary_hash', 'llm_model', 'prompt_version', 'work_id', name='uq_llm_score_cache_key'),
+    )
+
+class Job(db.Model):
+    """Background job queued for the worker process (see jobs.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)  # populate_work_pool
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending/running/succeeded/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    last_error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))  # earliest time to (re)try
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime)  # claim time; running jobs older than the claim timeout are reclaimed
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+        db.Index('ix_job_user_type_status', 'user_id', 'job_type', 'status'),
+        # At most one pending job per user and type, even with concurrent enqueues
+        db.Index('uq_job_pending_user_type', 'user_id', 'job_type', unique=True,
+                 sqlite_where=db.text("status = 'pending'"), postgresql_where=db.text("status = 'pending'")),
+    )
+
 
 # Flask-Login user loader
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    # Returns a lightweight SessionPrincipal rather than the full User row
+    from .principal import load_principal
+    return load_principal(user_id)
@@ -4,8 +4,9 @@ Utility functions for processing and summarizing user preferences.
 
 from .models import User, UserPreference
 from .embeddings_engine import EmbeddingRecommendationEngine
+from .embedding_utils import encode_embedding
+from .embedding_cache import text_hash
 from . import db
-import json
 
 def generate_preference_summary(user_id):
     """
@@ -151,15 +152,55 @@ def get_user_preference_summary(user_id):
     
     return summary
 
+# Form field -> (preference_type, weight)
+PREFERENCE_FIELDS = (
+    # TODO: Parse book titles for genre, author style, themes and publication period
+    ('favoriteBooks', 'book', 1.0),
+    # TODO: Map authors to writing style, common themes, similar authors and genres
+    ('favoriteAuthors', 'author', 1.0),
+    # TODO: Cross-media mapping (e.g., Wes Anderson -> quirky, detailed prose;
+    # visual art styles to literary themes; music to rhythm/mood in writing)
+    ('otherInterests', 'interest', 0.8),
+    # TODO: Expand topics to related themes and handle nuanced preferences
+    # (e.g., "some violence ok, but not graphic")
+    ('avoidTopics', 'avoid', -1.0),
+)
+
+def parse_preferences(data):
+    """
+    Parse form data into {(preference_type, preference_value): weight}, one entry per line.
+    
+    Args:
+        data: Form data containing preferences
+    """
+    parsed = {}
+    for field, preference_type, weight in PREFERENCE_FIELDS:
+        for value in (data.get(field) or '').split('\n'):
+            value = value.strip()
+            if value:
+                parsed.setdefault((preference_type, value), weight)
+    return parsed
+
 def save_user_preferences(user_id, data):
     """
-    Parse and save user preferences from onboarding form, generate preference summary,
-    and create embedding vector for recommendation matching.
+    Save user preferences from the onboarding/profile form, update the preference
+    summary, and refresh the embedding vector used for recommendation matching.
+    
+    Only preferences that were added, removed or changed are written, and the
+    embedding API is called only when the user's embedding was not built from
+    the resulting preference summary. Preferences, summary and embedding are
+    committed together; if embedding fails they are saved without it and the
+    stale embedding is rebuilt by the next save or pool population.
     
     Args:
         user_id: The ID of the user
         data: Form data containing preferences
     
+    Returns:
+        dict: counts of 'added', 'removed' and 'changed' preferences, and
+        'summary_changed' (False means the user's recommendation inputs, including
+        the embedding, are unchanged)
+    
     TODO: Enhanced parsing for better preference extraction:
     - Use NLP to extract genres/themes from book titles
     - Identify author writing styles and periods
@@ -167,95 +208,76 @@ def save_user_preferences(user_id, data):
     - Extract keywords and themes from interests
     - Parse complex preference descriptions
     """
+    desired = parse_preferences(data)
+    existing = {}
+    duplicates = []
+    for pref in UserPreference.query.filter_by(user_id=user_id).order_by(UserPreference.id).all():
+        key = (pref.preference_type, pref.preference_value)
+        if key in existing:
+            duplicates.append(pref)
+        else:
+            existing[key] = pref
     
-    # Save favorite books
-    favorite_books = data.get('favoriteBooks', '').strip()
-    if favorite_books:
-        for book in favorite_books.split('\n'):
-            book = book.strip()
-            if book:
-                # TODO: Parse book title to extract:
-                # - Genre inference
-                # - Author style matching
-                # - Theme extraction
-                # - Publication period preferences
-                pref = UserPreference(
-                    user_id=user_id,
-                    preference_type='book',
-                    preference_value=book,
-                    weight=1.0
-                )
-                db.session.add(pref)
+    added = removed = changed = 0
+    for key, pref in existing.items():
+        if key not in desired:
+            db.session.delete(pref)
+            removed += 1
+        elif pref.weight != desired[key] or not pref.active:
+            pref.weight = desired[key]
+            pref.active = True
+            changed += 1
+    for pref in duplicates:
+        db.session.delete(pref)
+        removed += 1
+    for (preference_type, value), weight in desired.items():
+        if (preference_type, value) not in existing:
+            db.session.add(UserPreference(
+                user_id=user_id,
+                preference_type=preference_type,
+                preference_value=value,
+                weight=weight
+            ))
+            added += 1
     
-    # Save favorite authors
-    favorite_authors = data.get('favoriteAuthors', '').strip()
-    if favorite_authors:
-        for author in favorite_authors.split('\n'):
-            author = author.strip()
-            if author:
-                # TODO: Author analysis:
-                # - Map to writing style characteristics
-                # - Identify common themes in their work
-                # - Find similar contemporary/classic authors
-                # - Extract genre preferences from author catalog
-                pref = UserPreference(
-                    user_id=user_id,
-                    preference_type='author',
-                    preference_value=author,
-                    weight=1.0
-                )
-                db.session.add(pref)
+    # Generate preference summary for LLM integration (autoflush includes the changes above)
+    user = db.session.get(User, user_id)
+    summary = generate_preference_summary(user_id)
+    summary_changed = summary != user.preference_summary or user_embedding_is_stale(user, summary)
+    user.preference_summary = summary
     
-    # Save other interests (movies, directors, artists)
-    other_interests = data.get('otherInterests', '').strip()
-    if other_interests:
-        for interest in other_interests.split('\n'):
-            interest = interest.strip()
-            if interest:
-                # TODO: Cross-media preference mapping:
-                # - Map film directors to literary equivalents (e.g., Wes Anderson -> quirky, detailed prose)
-                # - Extract visual artist styles to literary themes
-                # - Music preferences to rhythm/mood in writing
-                # - Identify aesthetic preferences that cross mediums
-                pref = UserPreference(
-                    user_id=user_id,
-                    preference_type='interest',
-                    preference_value=interest,
-                    weight=0.8
-                )
-                db.session.add(pref)
+    # Re-embed only when the embedding's input text changed
+    try:
+        refresh_user_embedding(user)
+    except Exception as e:
+        print(f"Error generating user embedding: {e}")
+        # Saved without it; embedding_summary_hash still marks the embedding stale
+    db.session.commit()
     
-    # Save topics to avoid
-    avoid_topics = data.get('avoidTopics', '').strip()
-    if avoid_topics:
-        for topic in avoid_topics.split('\n'):
-            topic = topic.strip()
-            if topic:
-                # TODO: Topic avoidance parsing:
-                # - Expand single topics to related themes
-                # - Handle nuanced preferences (e.g., "some violence ok, but not graphic")
-                # - Map broad categories to specific literary elements
-                pref = UserPreference(
-                    user_id=user_id,
-                    preference_type='avoid',
-                    preference_value=topic,
-                    weight=-1.0
-                )
-                db.session.add(pref)
+    return {
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'summary_changed': summary_changed
+    }
+
+def user_embedding_is_stale(user, summary=None):
+    """True if the user has a preference summary their embedding was not built from."""
+    summary = user.preference_summary if summary is None else summary
+    return bool(summary) and user.embedding_summary_hash != text_hash(summary)
+
+def refresh_user_embedding(user):
+    """
+    Rebuild the user's embedding from their preference summary if it is stale.
     
-    # Generate preference summary for LLM integration
-    update_user_preference_summary(user_id)
+    The caller commits. Raises EmbeddingError if the embedding API fails.
     
-    # Generate and save user embedding vector
-    user = User.query.get(user_id)
-    if user and user.preference_summary:
-        try:
-            engine = EmbeddingRecommendationEngine()
-            embedding = engine.generate_user_embedding(user)
-            
-            user.embedding_vector = json.dumps(embedding)
-            db.session.commit()
-            
-        except Exception as e:
-            print(f"Error generating user embedding: {e}")
-            # Continue without embedding - will fall back to basic recommendations
\ No newline at end of file
+    Returns:
+        bool: True if a new embedding was generated
+    """
+    if not user_embedding_is_stale(user):
+        return False
+    embedding = EmbeddingRecommendationEngine().generate_user_embedding(user)
+    user.embedding_vector = encode_embedding(embedding)
+    user.embedding_summary_hash = text_hash(user.preference_summary)
+    return True
@@ -0,0 +1,90 @@
+"""
+Lightweight logged-in user for Flask-Login.
+
+Loading the full User row on every authenticated request is wasted work:
+routes only need a handful of fields. The loader instead returns a
+SessionPrincipal built from a small dict kept in the signed session cookie,
+refreshed from the database at most every PRINCIPAL_TTL_SECONDS and
+immediately whenever the user's settings change (remember_principal).
+Any other attribute falls back to loading the full row once per request;
+if that row has since been deleted the session is logged out.
+"""
+
+import time
+
+from flask import abort, current_app, session
+from flask_login import UserMixin, logout_user
+from sqlalchemy.orm import load_only
+
+from .models import User, db
+
+PRINCIPAL_SESSION_KEY = 'principal'
+PRINCIPAL_FIELDS = (
+    'id', 'username', 'onboarding_completed',
+    'difficulty_preference', 'preferred_length', 'adventurousness_level',
+)
+DEFAULT_TTL_SECONDS = 300
+
+class SessionPrincipal(UserMixin):
+    """current_user backed by cached session fields, loading the User row only when needed."""
+
+    def __init__(self, data):
+        self.__dict__['_data'] = data
+        self.__dict__['_user'] = None
+
+    def __getattr__(self, name):
+        data = self.__dict__['_data']
+        if name in data:
+            return data[name]
+        if name.startswith('_'):
+            raise AttributeError(name)
+        # Anything else (e.g. preference_summary on the profile page) comes from the full row
+        return getattr(self.load_user_row(), name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            "SessionPrincipal is read-only; update the User row and call remember_principal()"
+        )
+
+    def load_user_row(self):
+        """
+        Return the full User row for this principal, loading it once.
+
+        If the user was deleted while the cached principal was still fresh,
+        the session is logged out and the request ends as unauthorized.
+        """
+        if self.__dict__['_user'] is None:
+            user = db.session.get(User, self.__dict__['_data']['id'])
+            if user is None:
+                forget_principal()
+                logout_user()
+                abort(current_app.login_manager.unauthorized())
+            self.__dict__['_user'] = user
+        return self.__dict__['_user']
+
+def remember_principal(user):
+    """Cache the principal fields of user in the session and return a SessionPrincipal."""
+    data = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+    data['loaded_at'] = time.time()
+    session[PRINCIPAL_SESSION_KEY] = data
+    return SessionPrincipal(data)
+
+def forget_principal():
+    """Drop the cached principal (e.g. on logout)."""
+    session.pop(PRINCIPAL_SESSION_KEY, None)
+
+def load_principal(user_id):
+    """Flask-Login user loader: cached principal if fresh, else a narrow reload."""
+    user_id = int(user_id)
+    data = session.get(PRINCIPAL_SESSION_KEY)
+    ttl = current_app.config.get('PRINCIPAL_TTL_SECONDS', DEFAULT_TTL_SECONDS)
+    if data and data.get('id') == user_id and time.time() - data.get('loaded_at', 0) < ttl:
+        return SessionPrincipal(data)
+
+    user = User.query.options(
+        load_only(*(getattr(User, field) for field in PRINCIPAL_FIELDS))
+    ).filter_by(id=user_id).first()
+    if user is None:
+        forget_principal()
+        return None
+    return remember_principal(user)
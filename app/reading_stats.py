@@ -0,0 +1,112 @@
+"""
+Reading statistics shown on the profile page.
+
+The figures come from a per-user UserReadingStats summary row. The row is
+built on first use from a single aggregate query over the user's
+WorkRecommendation rows, then kept current with in-place SQL increments
+when recommendations are created (recommendations.py) and rated
+(rate_recommendation), so the profile page does not rescan a heavy user's
+history on every view.
+"""
+
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import IntegrityError
+
+from .models import UserReadingStats, WorkRecommendation, db
+
+def aggregate_reading_stats(user_id):
+    """Compute a user's statistics from WorkRecommendation in one aggregate query."""
+    completed = db.case((WorkRecommendation.status == 'completed', 1), else_=0)
+    total, completed_count, rating_count, rating_sum, first_recommended_at = db.session.query(
+        db.func.count(WorkRecommendation.id),
+        db.func.coalesce(db.func.sum(completed), 0),
+        db.func.count(WorkRecommendation.rating),
+        db.func.coalesce(db.func.sum(WorkRecommendation.rating), 0),
+        db.func.min(WorkRecommendation.recommended_at)
+    ).filter(WorkRecommendation.user_id == user_id).one()
+
+    return {
+        'total_recommendations': total,
+        'completed_recommendations': int(completed_count),
+        'rating_count': rating_count,
+        'rating_sum': int(rating_sum),
+        'first_recommended_at': first_recommended_at
+    }
+
+def get_reading_stats(user_id):
+    """
+    Profile statistics for a user, building their summary row if it doesn't exist yet.
+
+    Returns:
+        dict with total_recommendations, completed_recommendations,
+        average_rating (None if nothing rated) and days_active
+    """
+    stats = db.session.get(UserReadingStats, user_id)
+    if stats is None:
+        stats = UserReadingStats(user_id=user_id, **aggregate_reading_stats(user_id))
+        db.session.add(stats)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another request built the row first
+            db.session.rollback()
+            stats = db.session.get(UserReadingStats, user_id)
+
+    average_rating = None
+    if stats.rating_count:
+        average_rating = stats.rating_sum / stats.rating_count
+
+    days_active = 0
+    if stats.first_recommended_at:
+        # Ensure both datetimes are timezone-aware for comparison
+        first_recommended_at = stats.first_recommended_at
+        if first_recommended_at.tzinfo is None:
+            # If stored naive, assume it's UTC
+            first_recommended_at = first_recommended_at.replace(tzinfo=timezone.utc)
+        days_active = (datetime.now(timezone.utc) - first_recommended_at).days + 1
+
+    return {
+        'total_recommendations': stats.total_recommendations,
+        'completed_recommendations': stats.completed_recommendations,
+        'average_rating': average_rating,
+        'days_active': days_active
+    }
+
+def record_rating(user_id, old_rating, new_rating, newly_completed):
+    """
+    Apply a rating change to the user's summary row in the current transaction.
+
+    Users without a summary row are skipped; their row is built from the
+    aggregate (which then includes this rating) on the next profile view.
+    """
+    changes = {'updated_at': datetime.now(timezone.utc)}
+    if old_rating is None:
+        changes['rating_count'] = UserReadingStats.rating_count + 1
+        changes['rating_sum'] = UserReadingStats.rating_sum + new_rating
+    else:
+        changes['rating_sum'] = UserReadingStats.rating_sum + (new_rating - old_rating)
+    if newly_completed:
+        changes['completed_recommendations'] = UserReadingStats.completed_recommendations + 1
+
+    UserReadingStats.query.filter_by(user_id=user_id).update(changes, synchronize_session=False)
+
+def record_new_recommendations(user_counts, recommended_at):
+    """
+    Count newly created recommendations in the summary rows, in the current transaction.
+
+    Args:
+        user_counts: {user_id: number of recommendations created}
+        recommended_at: Creation time, used for users with no earlier recommendation
+    """
+    # One UPDATE per distinct count (in practice 1-3 statements per batch)
+    by_count = {}
+    for user_id, count in user_counts.items():
+        by_count.setdefault(count, []).append(user_id)
+
+    for count, user_ids in by_count.items():
+        UserReadingStats.query.filter(UserReadingStats.user_id.in_(user_ids)).update({
+            'total_recommendations': UserReadingStats.total_recommendations + count,
+            'first_recommended_at': db.func.coalesce(UserReadingStats.first_recommended_at, recommended_at),
+            'updated_at': datetime.now(timezone.utc)
+        }, synchronize_session=False)
@@ -1,123 +1,251 @@
 from datetime import date, datetime, timezone
-from sqlalchemy import and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from .models import (
     User, Work, UserWorkPool, WorkRecommendation, db
 )
-from .embeddings_engine import EmbeddingRecommendationEngine
+from .embeddings_engine import EmbeddingRecommendationEngine, WORK_TYPES
+from .embedding_executor import EmbeddingError
+from .preference_utils import refresh_user_embedding, user_embedding_is_stale
+from .reading_stats import record_new_recommendations
+from .work_pool import upsert_work_pool_entries
 
-def generate_daily_recommendation(user_id, work_type, target_date=None):
+BASIC_POOL_REASON = "Basic algorithm match"
+CANDIDATES_PER_SLOT = 10  # Available pool entries _select_best_work chooses from
+INSERT_CHUNK_ROWS = 500  # keeps bound parameters well under SQLite's limit
+
+def get_daily_recommendations(user_id, target_date=None):
     """
-    Generate a single daily recommendation for a specific work type.
+    Get or generate all three daily recommendations (poem, story, essay) for a user.
+    
+    Recommendations are unique per user, type and date, so existing ones are
+    always returned and only missing types are generated.
     
     Args:
         user_id: The ID of the user
-        work_type: The type of work ('poem', 'short_story', 'essay')
-        target_date: The date to generate recommendation for (defaults to today)
+        target_date: The date to get recommendations for (defaults to today)
     
     Returns:
-        WorkRecommendation or None if generation fails
+        dict with keys 'poem', 'short_story', 'essay' containing WorkRecommendation objects
+        (None for a type with no available works)
     """
     if target_date is None:
         target_date = date.today()
     
-    # 1. Check if recommendation already exists for this date and type
-    existing_rec = WorkRecommendation.query.filter_by(
-        user_id=user_id,
-        work_type=work_type,
-        date=target_date
-    ).first()
+    # One query for all of the day's rows, with their works eager-loaded
+    existing = _fetch_daily_recommendations(user_id, target_date)
+    missing = [work_type for work_type in WORK_TYPES if work_type not in existing]
     
-    if existing_rec:
-        return existing_rec
+    if missing:
+        # Generate only the missing types, in bulk, then re-read the day's rows
+        # (a concurrent request may have filled some of them instead)
+        filled = {(user_id, work_type) for work_type in existing}
+        _fill_daily_recommendations([user_id], target_date, filled, work_types=missing)
+        existing = _fetch_daily_recommendations(user_id, target_date)
     
-    # 2. Get user's available work pool for this category
-    candidates = _get_available_works(user_id, work_type)
+    return {work_type: existing.get(work_type) for work_type in WORK_TYPES}
+
+# Work columns rendered by daily.html; everything else (notably the
+# embedding blob) stays unloaded on page views
+DAILY_CARD_WORK_COLUMNS = (
+    Work.id, Work.title, Work.author, Work.work_type,
+    Work.summary, Work.content_url, Work.estimated_reading_time
+)
+
+def _fetch_daily_recommendations(user_id, target_date):
+    """Return {work_type: WorkRecommendation} for a user's day, loading each work in the same query."""
+    return {rec.work_type: rec for rec in _daily_recommendations_query(user_id, target_date).all()}
+
+def _daily_recommendations_query(user_id, target_date):
+    """A user's recommendations for one day with their works joined (uses ix_work_recommendation_user_date)."""
+    return WorkRecommendation.query.options(
+        joinedload(WorkRecommendation.work).load_only(*DAILY_CARD_WORK_COLUMNS)
+    ).filter(
+        WorkRecommendation.user_id == user_id,
+        WorkRecommendation.date == target_date
+    )
+
+def precompute_daily_recommendations(target_date=None, chunk_size=500, progress=None):
+    """
+    Create the day's WorkRecommendation rows for every active, onboarded user.
     
-    if not candidates:
-        return None
+    Users are processed in id order, chunk_size at a time: one query finds the
+    (user, work_type) slots already filled, one window query picks the best
+    available pool entry for every missing slot, and the new recommendations
+    and pool status changes are written in bulk and committed per chunk. A
+    rerun after an interruption skips slots that already exist, and slots
+    filled concurrently (a user loading /daily mid-run) are skipped by the
+    conflict-tolerant insert instead of aborting the rest of the run.
     
-    # 3. Select the best work
-    selected_work = _select_best_work(candidates)
+    Args:
+        target_date: The date to generate recommendations for (defaults to today)
+        chunk_size: Number of users per transaction
+        progress: Optional callback(users_done, recommendations_created)
     
-    if not selected_work:
-        return None
+    Returns:
+        dict with 'users' processed and 'created' recommendation counts
+    """
+    if target_date is None:
+        target_date = date.today()
     
-    try:
-        # 4. Create WorkRecommendation record
-        recommendation = WorkRecommendation(
-            user_id=user_id,
-            work_id=selected_work.work_id,
-            work_type=work_type,
-            date=target_date,
-            reasoning=f"Selected based on confidence score {selected_work.confidence_score:.2f}"
-        )
-        
-        db.session.add(recommendation)
-        
-        # 5. Update UserWorkPool status to 'recommended'
-        _mark_works_as_recommended([selected_work])
+    users_done = 0
+    created = 0
+    last_user_id = 0
+    
+    while True:
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(
+            User.active == True,
+            User.onboarding_completed == True,
+            User.id > last_user_id
+        ).order_by(User.id).limit(chunk_size).all()]
         
-        db.session.commit()
-        return recommendation
+        if not user_ids:
+            break
+        last_user_id = user_ids[-1]
         
-    except Exception as e:
-        db.session.rollback()
-        raise e
+        created += _precompute_chunk(user_ids, target_date)
+        users_done += len(user_ids)
+        if progress:
+            progress(users_done, created)
+    
+    return {'users': users_done, 'created': created}
+
+def _precompute_chunk(user_ids, target_date):
+    """Fill missing daily recommendation slots for a chunk of users; returns rows created."""
+    filled = set(_filled_slots_query(user_ids, target_date).all())
+    return _fill_daily_recommendations(user_ids, target_date, filled)
 
-def get_daily_recommendations(user_id, target_date=None, regenerate=False):
+def _filled_slots_query(user_ids, target_date):
+    """(user_id, work_type) slots that already have a recommendation on target_date."""
+    return db.session.query(
+        WorkRecommendation.user_id, WorkRecommendation.work_type
+    ).filter(
+        WorkRecommendation.user_id.in_(user_ids),
+        WorkRecommendation.date == target_date
+    )
+
+def _fill_daily_recommendations(user_ids, target_date, filled, work_types=WORK_TYPES):
     """
-    Get or generate all three daily recommendations (poem, story, essay) for a user.
+    Create recommendations for every (user, work_type) slot not in filled.
     
-    Args:
-        user_id: The ID of the user
-        target_date: The date to get recommendations for (defaults to today)
-        regenerate: If True, always generate new recommendations. If False, use existing ones if available.
+    One window query (_slot_candidates_query) fetches the best
+    CANDIDATES_PER_SLOT available pool entries per slot and
+    _select_best_work picks from them. The new rows are inserted with ON
+    CONFLICT DO NOTHING on (user_id, work_type, date), so a slot filled
+    concurrently (another /daily request, or the nightly precompute) is
+    skipped rather than failing; only pool entries whose recommendation was
+    actually inserted are marked recommended. Everything is committed.
     
     Returns:
-        dict with keys 'poem', 'short_story', 'essay' containing WorkRecommendation objects
+        int: number of recommendations created
     """
-    if target_date is None:
-        target_date = date.today()
+    candidates = {}
+    for row in _slot_candidates_query(user_ids, work_types).all():
+        if (row.user_id, row.work_type) not in filled:
+            candidates.setdefault((row.user_id, row.work_type), []).append(row)
     
-    recommendations = {}
+    now = datetime.now(timezone.utc)
+    new_recommendations = []
+    pool_entry_ids = {}
+    for (user_id, work_type), slot_candidates in candidates.items():
+        selected = _select_best_work(slot_candidates)
+        if selected is None:
+            continue
+        new_recommendations.append({
+            'user_id': user_id,
+            'work_id': selected.work_id,
+            'work_type': work_type,
+            'date': target_date,
+            'reasoning': f"Selected based on confidence score {selected.confidence_score:.2f}",
+            'recommended_at': now,
+            'updated_at': now
+        })
+        pool_entry_ids[(user_id, work_type)] = selected.id
     
-    for work_type in ['poem', 'short_story', 'essay']:
-        existing_rec = None
-        
-        if not regenerate:
-            # Check for existing recommendation
-            existing_rec = WorkRecommendation.query.filter_by(
-                user_id=user_id,
-                work_type=work_type,
-                date=target_date
-            ).first()
-        
-        if existing_rec:
-            recommendations[work_type] = existing_rec
-        else:
-            # Generate new recommendation
-            rec = generate_daily_recommendation(user_id, work_type, target_date)
-            recommendations[work_type] = rec
+    if not new_recommendations:
+        return 0
     
-    return recommendations
+    try:
+        inserted = _insert_recommendations_ignoring_conflicts(new_recommendations)
+        if inserted:
+            UserWorkPool.query.filter(
+                UserWorkPool.id.in_([pool_entry_ids[slot] for slot in inserted])
+            ).update({
+                'status': 'recommended',
+                'last_recommended_at': now,
+                'times_recommended': UserWorkPool.times_recommended + 1
+            }, synchronize_session=False)
+            user_counts = {}
+            for user_id, _ in inserted:
+                user_counts[user_id] = user_counts.get(user_id, 0) + 1
+            record_new_recommendations(user_counts, now)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    return len(inserted)
+
+def _insert_recommendations_ignoring_conflicts(rows):
+    """
+    Insert recommendation rows, skipping (user_id, work_type, date) slots that already exist.
+    
+    Returns:
+        list of (user_id, work_type) slots that were inserted
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        inserted = []
+        for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+            stmt = insert(WorkRecommendation).values(rows[start:start + INSERT_CHUNK_ROWS])
+            stmt = stmt.on_conflict_do_nothing(
+                index_elements=['user_id', 'work_type', 'date']
+            ).returning(WorkRecommendation.user_id, WorkRecommendation.work_type)
+            inserted.extend(tuple(row) for row in db.session.execute(stmt))
+        return inserted
+    
+    # Other databases: one savepoint per row so a conflict only skips that row
+    inserted = []
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(WorkRecommendation), [row])
+            inserted.append((row['user_id'], row['work_type']))
+        except IntegrityError:
+            continue
+    return inserted
 
-def _get_available_works(user_id, work_type):
-    """Get available works from user's pool for a specific type."""
-    return UserWorkPool.query.filter(
-        and_(
-            UserWorkPool.user_id == user_id,
-            UserWorkPool.work_type == work_type,
-            UserWorkPool.status == 'available',
-            UserWorkPool.active == True
+def _slot_candidates_query(user_ids, work_types):
+    """
+    The best CANDIDATES_PER_SLOT available pool entries per (user, work_type),
+    ordered by slot then rank (the filter uses ix_user_work_pool_available).
+    """
+    rank = db.func.row_number().over(
+        partition_by=(UserWorkPool.user_id, UserWorkPool.work_type),
+        order_by=(
+            UserWorkPool.confidence_score.desc(),
+            UserWorkPool.last_recommended_at.asc().nullsfirst()
         )
-    ).order_by(
-        UserWorkPool.confidence_score.desc(),
-        UserWorkPool.last_recommended_at.asc().nullsfirst()
-    ).limit(10).all()  # Get top 10 candidates
+    ).label('rank')
+    ranked = db.session.query(
+        UserWorkPool.id, UserWorkPool.user_id, UserWorkPool.work_id,
+        UserWorkPool.work_type, UserWorkPool.confidence_score, rank
+    ).filter(
+        UserWorkPool.user_id.in_(user_ids),
+        UserWorkPool.work_type.in_(list(work_types)),
+        UserWorkPool.status == 'available',
+        UserWorkPool.active == True
+    ).subquery()
+    return db.session.query(ranked).filter(
+        ranked.c.rank <= CANDIDATES_PER_SLOT
+    ).order_by(ranked.c.user_id, ranked.c.work_type, ranked.c.rank)
 
 def _select_best_work(candidates):
     """
     Select the best work from candidates, considering variety.
+    candidates are one slot's available pool entries, best first.
     For now, just picks the highest confidence score.
     Future: Consider author diversity, themes, etc.
     """
@@ -127,24 +255,32 @@ def _select_best_work(candidates):
     # For basic implementation, just return highest confidence
     return candidates[0]
 
-def _mark_works_as_recommended(work_pool_entries):
-    """Mark work pool entries as recommended and update timestamps."""
-    current_time = datetime.now(timezone.utc)
-    
-    for entry in work_pool_entries:
-        entry.status = 'recommended'
-        entry.last_recommended_at = current_time
-        entry.times_recommended += 1
-
 def populate_user_work_pool(user_id):
     """
     Populate a user's work pool using the embedding-based recommendation engine.
     """
-    user = User.query.get(user_id)
-    if not user:
+    # Check for an embedding in SQL rather than loading the deferred blob
+    row = db.session.query(
+        User.id, User.embedding_vector.isnot(None)
+    ).filter(User.id == user_id).first()
+    if not row:
         return False
+    has_embedding = row[1]
+    
+    user = db.session.get(User, user_id)
+    if user_embedding_is_stale(user):
+        # Embedding failed when the preferences were saved; rebuild it rather
+        # than scoring the pool from the old preferences
+        try:
+            refresh_user_embedding(user)
+            db.session.commit()
+            has_embedding = True
+        except EmbeddingError:
+            db.session.rollback()
+            if has_embedding:
+                raise  # Let the job retry
     
-    if not user.embedding_vector:
+    if not has_embedding:
         # Fallback to basic algorithm if no embedding vector for user exists
         return _populate_user_work_pool_basic(user_id)
     
@@ -177,49 +313,27 @@ def _populate_user_work_pool_basic(user_id):
     if not user:
         return False
     
-    # Get all available works
-    poems = Work.query.filter_by(work_type='poem', active=True).all()
-    stories = Work.query.filter_by(work_type='short_story', active=True).all()
-    essays = Work.query.filter_by(work_type='essay', active=True).all()
-    
-    # Add works with basic confidence scoring
-    for work in poems:
+    # Score all available works with basic confidence scoring, keeping those
+    # above the threshold; upsert so rerunning (or running after a failed
+    # embedding pass rolled back its pool delete) doesn't hit the unique constraint
+    entries = []
+    for work in Work.query.filter(Work.work_type.in_(WORK_TYPES), Work.active == True).all():
         confidence = _calculate_basic_confidence(user, work)
         if confidence > 0.3:  # Only add if confidence is above threshold
-            pool_entry = UserWorkPool(
-                user_id=user_id,
-                work_id=work.id,
-                work_type='poem',
-                confidence_score=confidence,
-                added_reason="Basic algorithm match"
-            )
-            db.session.add(pool_entry)
-    
-    for work in stories:
-        confidence = _calculate_basic_confidence(user, work)
-        if confidence > 0.3:
-            pool_entry = UserWorkPool(
-                user_id=user_id,
-                work_id=work.id,
-                work_type='short_story',
-                confidence_score=confidence,
-                added_reason="Basic algorithm match"
-            )
-            db.session.add(pool_entry)
-    
-    for work in essays:
-        confidence = _calculate_basic_confidence(user, work)
-        if confidence > 0.3:
-            pool_entry = UserWorkPool(
-                user_id=user_id,
-                work_id=work.id,
-                work_type='essay',
-                confidence_score=confidence,
-                added_reason="Basic algorithm match"
-            )
-            db.session.add(pool_entry)
+            entries.append({
+                'user_id': user_id,
+                'work_id': work.id,
+                'work_type': work.work_type,
+                'confidence_score': confidence,
+                'added_reason': BASIC_POOL_REASON
+            })
     
-    db.session.commit()
+    try:
+        upsert_work_pool_entries(entries)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
     return True
 
 def _calculate_basic_confidence(user, work):
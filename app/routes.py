@@ -2,9 +2,13 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy import or_
-from .models import User, UserPreference, WorkRecommendation
-from .recommendations import get_daily_recommendations, populate_user_work_pool
+from .models import User, UserPreference, WorkRecommendation, Job
+from .recommendations import get_daily_recommendations
+from .jobs import enqueue_pool_population, job_status
 from .preference_utils import save_user_preferences
+from .principal import remember_principal, forget_principal
+from .reading_stats import get_reading_stats, record_rating
+from .feedback import apply_rating_feedback
 from . import db
 from datetime import date, datetime, timezone
 
@@ -42,6 +46,7 @@ def register():
         db.session.commit()
         
         login_user(user)
+        remember_principal(user)
         return redirect(url_for('routes.onboarding'))
     
     return render_template('register.html')
@@ -58,6 +63,7 @@ def login():
         
         if user and check_password_hash(user.password_hash, password):
             login_user(user)
+            remember_principal(user)
             if not user.onboarding_completed:
                 return redirect(url_for('routes.onboarding'))
             return redirect(url_for('routes.daily_view'))
@@ -70,6 +76,7 @@ def login():
 @login_required
 def logout():
     logout_user()
+    forget_principal()
     return redirect(url_for('routes.index'))
 
 @bp.route('/onboarding', methods=['GET', 'POST'])
@@ -80,35 +87,36 @@ def onboarding():
     
     if request.method == 'POST':
         try:
-            # Clear existing preferences
-            UserPreference.query.filter_by(user_id=current_user.id).delete()
-            
             # Get form data
             data = request.get_json() if request.is_json else request.form
             
+            # current_user is a cached principal; update the full row
+            user = current_user.load_user_row()
+            
             # Update user settings first
-            current_user.difficulty_preference = data.get('difficulty', 'intermediate')
-            current_user.preferred_length = data.get('length', 'medium')
+            user.difficulty_preference = data.get('difficulty', 'intermediate')
+            user.preferred_length = data.get('length', 'medium')
             
             # Convert adventurousness from 0-100 to 0-1
             adventurousness = float(data.get('adventurousness', 50)) / 100.0
-            current_user.adventurousness_level = adventurousness
+            user.adventurousness_level = adventurousness
             
             # Parse and save user preferences (with complete user data)
-            save_user_preferences(current_user.id, data)
+            save_user_preferences(user.id, data)
             
             # Mark onboarding as completed
-            current_user.onboarding_completed = True
+            user.onboarding_completed = True
             
             db.session.commit()
+            remember_principal(user)
             
-            # Generate initial work pool (preferences + summary + embedding created by save_user_preferences)
-            populate_user_work_pool(current_user.id)
+            # Queue initial work pool generation (preferences + summary + embedding created by save_user_preferences)
+            job = enqueue_pool_population(current_user.id)
             
             flash('Welcome! Your preferences have been saved.')
             
             if request.is_json:
-                return {'success': True, 'redirect': url_for('routes.daily_view')}
+                return {'success': True, 'redirect': url_for('routes.daily_view'), 'job_id': job.id}
             else:
                 return redirect(url_for('routes.daily_view'))
                 
@@ -142,18 +150,25 @@ def daily_view_test():
 @bp.route('/generate-pool')
 @login_required
 def generate_pool():
-    """Route to populate user's work pool with recommendations"""
+    """Route to queue population of user's work pool with recommendations"""
     try:
-        success = populate_user_work_pool(current_user.id)
-        if success:
-            flash('Work pool generated successfully!')
-        else:
-            flash('Failed to generate work pool')
+        enqueue_pool_population(current_user.id)
+        flash('Your work pool is being generated. New recommendations will appear shortly.')
     except Exception as e:
         flash(f'Error generating work pool: {str(e)}')
     
     return redirect(url_for('routes.daily_view'))
 
+@bp.route('/jobs/<int:job_id>')
+@login_required
+def job_status_view(job_id):
+    """Status of a background job owned by the current user"""
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return {'success': False, 'error': 'Job not found'}, 404
+    
+    return {'success': True, 'job': job_status(job)}
+
 @bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
@@ -162,30 +177,35 @@ def profile():
             # Get form data
             data = request.get_json() if request.is_json else request.form
             
-            # Clear existing preferences
-            UserPreference.query.filter_by(user_id=current_user.id).delete()
+            # current_user is a cached principal; update the full row
+            user = current_user.load_user_row()
             
             # Update user settings first
-            current_user.difficulty_preference = data.get('difficulty', current_user.difficulty_preference)
-            current_user.preferred_length = data.get('length', current_user.preferred_length)
+            user.difficulty_preference = data.get('difficulty', user.difficulty_preference)
+            user.preferred_length = data.get('length', user.preferred_length)
             
             # Convert adventurousness from 0-100 to 0-1
-            adventurousness = float(data.get('adventurousness', current_user.adventurousness_level * 100)) / 100.0
-            current_user.adventurousness_level = adventurousness
+            adventurousness = float(data.get('adventurousness', user.adventurousness_level * 100)) / 100.0
+            user.adventurousness_level = adventurousness
             
-            # Save updated preferences (with complete user data)
-            save_user_preferences(current_user.id, data)
+            # Save only the changed preferences (with complete user data)
+            result = save_user_preferences(user.id, data)
             
             db.session.commit()
+            remember_principal(user)
             
-            # Regenerate work pool with new embedding-based recommendations 
-            # (preference summary + embedding already updated by save_user_preferences)
-            populate_user_work_pool(current_user.id)
+            # Queue work pool regeneration with new embedding-based recommendations 
+            # (preference summary + embedding updated by save_user_preferences; if the
+            # embedding call failed, the job rebuilds it before scoring);
+            # nothing to regenerate if the summary the pool is scored from is unchanged
+            job = None
+            if result['summary_changed']:
+                job = enqueue_pool_population(current_user.id)
             
             flash('Preferences updated successfully!')
             
             if request.is_json:
-                return {'success': True}
+                return {'success': True, 'job_id': job.id if job else None}
             else:
                 return redirect(url_for('routes.profile'))
                 
@@ -204,48 +224,18 @@ def profile():
     interest_preferences = [p for p in preferences if p.preference_type == 'interest']
     avoid_preferences = [p for p in preferences if p.preference_type == 'avoid']
     
-    # Get reading statistics
-    total_recommendations = WorkRecommendation.query.filter_by(user_id=current_user.id).count()
-    completed_recommendations = WorkRecommendation.query.filter_by(
-        user_id=current_user.id, 
-        status='completed'
-    ).count()
-    
-    # Calculate average rating
-    rated_recommendations = WorkRecommendation.query.filter(
-        WorkRecommendation.user_id == current_user.id,
-        WorkRecommendation.rating.isnot(None)
-    ).all()
-    
-    average_rating = None
-    if rated_recommendations:
-        total_rating = sum(r.rating for r in rated_recommendations)
-        average_rating = total_rating / len(rated_recommendations)
-    
-    # Calculate days active (days since first recommendation)
-    first_recommendation = WorkRecommendation.query.filter_by(
-        user_id=current_user.id
-    ).order_by(WorkRecommendation.recommended_at.asc()).first()
-    
-    days_active = 0
-    if first_recommendation:
-        # Ensure both datetimes are timezone-aware for comparison
-        now = datetime.now(timezone.utc)
-        recommended_at = first_recommendation.recommended_at
-        if recommended_at.tzinfo is None:
-            # If recommended_at is naive, assume it's UTC
-            recommended_at = recommended_at.replace(tzinfo=timezone.utc)
-        days_active = (now - recommended_at).days + 1
+    # Reading statistics from the per-user summary row
+    stats = get_reading_stats(current_user.id)
     
     return render_template('profile.html',
                          book_preferences=book_preferences,
                          author_preferences=author_preferences, 
                          interest_preferences=interest_preferences,
                          avoid_preferences=avoid_preferences,
-                         total_recommendations=total_recommendations,
-                         completed_recommendations=completed_recommendations,
-                         average_rating=average_rating,
-                         days_active=days_active)
+                         total_recommendations=stats['total_recommendations'],
+                         completed_recommendations=stats['completed_recommendations'],
+                         average_rating=stats['average_rating'],
+                         days_active=stats['days_active'])
 
 @bp.route('/rate-recommendation', methods=['POST'])
 @login_required
@@ -268,15 +258,24 @@ def rate_recommendation():
         if not recommendation:
             return {'success': False, 'error': 'Recommendation not found'}, 404
         
+        old_rating = recommendation.rating
+        newly_completed = recommendation.status == 'unread'
+        
         # Update the rating
         recommendation.rating = rating
         recommendation.updated_at = datetime.now(timezone.utc)
         
         # Mark as completed if not already
-        if recommendation.status == 'unread':
+        if newly_completed:
             recommendation.status = 'completed'
             recommendation.completed_at = datetime.now(timezone.utc)
         
+        # Keep the profile statistics summary in step
+        record_rating(current_user.id, old_rating, rating, newly_completed)
+        
+        # Refine the user's embedding from the rating and rescore their pool (no API call)
+        apply_rating_feedback(current_user.id, recommendation.work_id, rating, old_rating)
+        
         db.session.commit()
         
         return {'success': True, 'rating': rating}
@@ -0,0 +1,90 @@
+"""
+Bulk writes to UserWorkPool.
+
+Pool population used to look up each (user, work) pair individually before
+inserting or updating it. These helpers write a whole batch at once: a
+single INSERT ... ON CONFLICT statement on SQLite and PostgreSQL, or one
+prefetch query plus a single flush on other databases. Both rely on the
+unique (user_id, work_id) constraint on UserWorkPool.
+"""
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .models import UserWorkPool, db
+
+UPSERT_CHUNK_ROWS = 500  # keeps bound parameters well under SQLite's limit
+
+def upsert_work_pool_entries(entries):
+    """
+    Insert pool entries, updating the confidence score of existing (user, work) pairs.
+
+    Existing entries keep their status and recommendation history; only
+    confidence_score (and added_reason, when given) is refreshed. The caller
+    is responsible for committing.
+
+    Args:
+        entries: list of dicts with user_id, work_id, work_type,
+            confidence_score and optionally added_reason
+    """
+    if not entries:
+        return
+
+    # Last write wins for duplicate pairs within the batch
+    rows = list({(e['user_id'], e['work_id']): e for e in entries}.values())
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        _upsert_on_conflict(rows, sqlite.insert if dialect == 'sqlite' else postgresql.insert)
+    else:
+        _upsert_prefetched(rows)
+
+def _upsert_on_conflict(rows, insert):
+    for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+        chunk = [{
+            'user_id': row['user_id'],
+            'work_id': row['work_id'],
+            'work_type': row['work_type'],
+            'confidence_score': row['confidence_score'],
+            'added_reason': row.get('added_reason'),
+            'status': 'available',
+        } for row in rows[start:start + UPSERT_CHUNK_ROWS]]
+
+        stmt = insert(UserWorkPool).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'work_id'],
+            set_={
+                'confidence_score': stmt.excluded.confidence_score,
+                'added_reason': db.func.coalesce(stmt.excluded.added_reason, UserWorkPool.added_reason),
+            }
+        )
+        db.session.execute(stmt)
+
+def _upsert_prefetched(rows):
+    pairs_by_user = {}
+    for row in rows:
+        pairs_by_user.setdefault(row['user_id'], []).append(row['work_id'])
+
+    existing = {}
+    for user_id, work_ids in pairs_by_user.items():
+        for entry in UserWorkPool.query.filter(
+            UserWorkPool.user_id == user_id,
+            UserWorkPool.work_id.in_(work_ids)
+        ).all():
+            existing[(entry.user_id, entry.work_id)] = entry
+
+    for row in rows:
+        entry = existing.get((row['user_id'], row['work_id']))
+        if entry:
+            entry.confidence_score = row['confidence_score']
+            if row.get('added_reason'):
+                entry.added_reason = row['added_reason']
+        else:
+            db.session.add(UserWorkPool(
+                user_id=row['user_id'],
+                work_id=row['work_id'],
+                work_type=row['work_type'],
+                confidence_score=row['confidence_score'],
+                added_reason=row.get('added_reason'),
+                status='available'
+            ))
+    db.session.flush()
@@ -10,6 +10,51 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 
+    # Approximate nearest-neighbour search (see app/ann_index.py)
+    ANN_ENABLED = True
+    ANN_INDEX_DIR = None  # defaults to <instance>/ann_index
+    ANN_MIN_WORKS = 5000  # partitions smaller than this are searched exactly
+    ANN_NPROBE = 8  # clusters scanned per query; higher = better recall, slower
+
+    # Reduced-dimension first stage for find_similar_works (None = full width).
+    # Works are scored on the first N (re-normalised) components, then the best
+    # top_k * EMBEDDING_RERANK_FACTOR are reranked with the full vectors. This
+    # trades memory for FLOPs: the truncated matrix (N/dim of the full one) is
+    # cached in addition to the full-width matrix, which stays resident.
+    EMBEDDING_SEARCH_DIM = int(os.environ['EMBEDDING_SEARCH_DIM']) if os.environ.get('EMBEDDING_SEARCH_DIM') else None
+    EMBEDDING_RERANK_FACTOR = 4
+
+    # Quantized first stage for find_similar_works: None or 'binary' (see
+    # app/quantization.py). Sign-bit codes are kept next to the cached work
+    # matrix (+1/32 resident memory); each query scans them (1/32 of the bytes
+    # of the exact scan), then rescores the best
+    # top_k * EMBEDDING_QUANTIZED_SHORTLIST_FACTOR works exactly.
+    EMBEDDING_QUANTIZED_SEARCH = os.environ.get('EMBEDDING_QUANTIZED_SEARCH') or None
+    EMBEDDING_QUANTIZED_SHORTLIST_FACTOR = 10
+
+    # Memory-mapped work embedding store shared by worker processes (see app/embedding_store.py);
+    # written by scripts/build_embedding_store.py, the database is used until then
+    EMBEDDING_STORE_ENABLED = True
+    EMBEDDING_STORE_DIR = None  # defaults to <instance>/embedding_store
+    EMBEDDING_STORE_CHECK_SECONDS = 30  # how often workers look for a newer version
+    # How often the in-process work embedding cache polls for works changed by other processes
+    EMBEDDING_CATALOG_CHECK_SECONDS = 30
+
+    # Persistent embedding cache (see app/embedding_cache.py)
+    EMBEDDING_CACHE_MAX_ENTRIES = 50000
+
+    # Embedding API concurrency and rate limiting (see app/embedding_executor.py)
+    EMBEDDING_MAX_WORKERS = 4
+    EMBEDDING_REQUESTS_PER_MINUTE = 100
+    EMBEDDING_MAX_RETRIES = 5
+    EMBEDDING_BACKOFF_SECONDS = 1.0  # doubled on each retry
+
+    # Step size for nudging user embeddings toward/away from rated works (see app/feedback.py)
+    FEEDBACK_LEARNING_RATE = 0.1
+
+    # Seconds the cached logged-in user in the session is trusted (see app/principal.py)
+    PRINCIPAL_TTL_SECONDS = 300
+
 class ProductionConfig(Config):
     """Production configuration."""
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
@@ -0,0 +1,90 @@
+"""Store embedding vectors as binary float32 blobs instead of JSON text
+
+Revision ID: 7a3c1e9d4b21
+Revises: 2f654fc76c04
+Create Date: 2025-09-02 10:12:44.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import numpy as np
+import struct
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3c1e9d4b21'
+down_revision = '2f654fc76c04'
+branch_labels = None
+depends_on = None
+
+# Mirrors app/embedding_utils.py at the time of this migration
+# (magic, format version, dtype code, dimension). Kept inline so the
+# migration does not change if the application module does.
+EMBEDDING_HEADER = struct.Struct('<2sBBI')
+FLOAT32_CODE = 1
+
+
+def _encode(values):
+    array = np.asarray(values, dtype='<f4').ravel()
+    return EMBEDDING_HEADER.pack(b'EV', 1, FLOAT32_CODE, array.shape[0]) + array.tobytes()
+
+
+def _decode(blob):
+    _, _, dtype_code, dim = EMBEDDING_HEADER.unpack_from(blob)
+    dtype = '<f4' if dtype_code == FLOAT32_CODE else '<f2'
+    return np.frombuffer(blob, dtype=dtype, count=dim, offset=EMBEDDING_HEADER.size)
+
+
+def _convert_table(table_name, new_type, convert):
+    """Copy embedding_vector into a column of new_type, converting each row."""
+    connection = op.get_bind()
+
+    with op.batch_alter_table(table_name) as batch_op:
+        batch_op.add_column(sa.Column('embedding_vector_new', new_type, nullable=True))
+
+    table = sa.table(
+        table_name,
+        sa.column('id', sa.Integer),
+        sa.column('embedding_vector'),
+        sa.column('embedding_vector_new', new_type),
+    )
+    rows = connection.execute(
+        sa.select(table.c.id, table.c.embedding_vector)
+        .where(table.c.embedding_vector.isnot(None))
+    ).fetchall()
+
+    for row_id, value in rows:
+        try:
+            converted = convert(value)
+        except (ValueError, TypeError, struct.error):
+            # Unparseable rows are dropped; they get regenerated by
+            # generate_work_embeddings / the next preference save
+            converted = None
+        connection.execute(
+            table.update()
+            .where(table.c.id == row_id)
+            .values(embedding_vector_new=converted)
+        )
+
+    with op.batch_alter_table(table_name) as batch_op:
+        batch_op.drop_column('embedding_vector')
+        batch_op.alter_column('embedding_vector_new', new_column_name='embedding_vector')
+
+
+def upgrade():
+    def json_to_blob(value):
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return _encode(json.loads(value))
+
+    _convert_table('work', sa.LargeBinary(), json_to_blob)
+    _convert_table('user', sa.LargeBinary(), json_to_blob)
+
+
+def downgrade():
+    def blob_to_json(value):
+        return json.dumps(_decode(bytes(value)).astype(float).tolist())
+
+    _convert_table('work', sa.Text(), blob_to_json)
+    _convert_table('user', sa.Text(), blob_to_json)
@@ -0,0 +1,35 @@
+"""Add persisted LLM score cache table
+
+Revision ID: a3c6e8f15b92
+Revises: f7b2d4e91a38
+Create Date: 2025-09-15 09:12:44.871302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c6e8f15b92'
+down_revision = 'f7b2d4e91a38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('llm_score_cache_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('summary_hash', sa.String(length=64), nullable=False),
+    sa.Column('work_id', sa.Integer(), nullable=False),
+    sa.Column('llm_model', sa.String(length=100), nullable=False),
+    sa.Column('prompt_version', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['work_id'], ['work.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('summary_hash', 'llm_model', 'prompt_version', 'work_id', name='uq_llm_score_cache_key')
+    )
+
+
+def downgrade():
+    op.drop_table('llm_score_cache_entry')
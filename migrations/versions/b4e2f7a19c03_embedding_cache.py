@@ -0,0 +1,40 @@
+"""Add persistent embedding cache table
+
+Revision ID: b4e2f7a19c03
+Revises: 7a3c1e9d4b21
+Create Date: 2025-09-04 09:31:07.512846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e2f7a19c03'
+down_revision = '7a3c1e9d4b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('embedding_cache_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=False),
+    sa.Column('task_type', sa.String(length=50), nullable=False),
+    sa.Column('dimension', sa.Integer(), nullable=False),
+    sa.Column('text_hash', sa.String(length=64), nullable=False),
+    sa.Column('embedding_vector', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('model', 'task_type', 'dimension', 'text_hash', name='uq_embedding_cache_key')
+    )
+    with op.batch_alter_table('embedding_cache_entry', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_embedding_cache_entry_last_used_at'), ['last_used_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('embedding_cache_entry', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_embedding_cache_entry_last_used_at'))
+
+    op.drop_table('embedding_cache_entry')
@@ -0,0 +1,38 @@
+"""Track when each work's embedding last changed
+
+Revision ID: b8d1f4a7c269
+Revises: a3c6e8f15b92
+Create Date: 2025-09-18 14:03:27.519866
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d1f4a7c269'
+down_revision = 'a3c6e8f15b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('work', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('embedding_updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_work_embedding_updated_at'), ['embedding_updated_at'], unique=False)
+
+    # Existing embeddings count as written now
+    work = sa.table('work', sa.column('embedding_vector'), sa.column('embedding_updated_at', sa.DateTime))
+    op.get_bind().execute(
+        work.update()
+        .where(work.c.embedding_vector.isnot(None))
+        .values(embedding_updated_at=datetime.now(timezone.utc))
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('work', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_work_embedding_updated_at'))
+        batch_op.drop_column('embedding_updated_at')
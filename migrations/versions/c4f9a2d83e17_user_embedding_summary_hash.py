@@ -0,0 +1,49 @@
+"""Record which preference summary each user embedding was built from
+
+Revision ID: c4f9a2d83e17
+Revises: b8d1f4a7c269
+Create Date: 2025-09-18 16:41:09.204517
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f9a2d83e17'
+down_revision = 'b8d1f4a7c269'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('embedding_summary_hash', sa.String(length=64), nullable=True))
+
+    # Existing embeddings were built from the current summary (sha256, as
+    # app.embedding_cache.text_hash)
+    connection = op.get_bind()
+    user = sa.table(
+        'user',
+        sa.column('id', sa.Integer),
+        sa.column('preference_summary', sa.Text),
+        sa.column('embedding_vector'),
+        sa.column('embedding_summary_hash', sa.String),
+    )
+    rows = connection.execute(
+        sa.select(user.c.id, user.c.preference_summary)
+        .where(user.c.embedding_vector.isnot(None), user.c.preference_summary.isnot(None))
+    ).fetchall()
+    for user_id, summary in rows:
+        connection.execute(
+            user.update()
+            .where(user.c.id == user_id)
+            .values(embedding_summary_hash=hashlib.sha256(summary.encode('utf-8')).hexdigest())
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('embedding_summary_hash')
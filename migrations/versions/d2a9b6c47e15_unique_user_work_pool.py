@@ -0,0 +1,34 @@
+"""Add unique constraint on user_work_pool (user_id, work_id)
+
+Revision ID: d2a9b6c47e15
+Revises: c81d5e3a6f42
+Create Date: 2025-09-08 11:45:19.873102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a9b6c47e15'
+down_revision = 'c81d5e3a6f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep only the newest pool entry per (user, work) so the constraint can be added
+    op.execute("""
+        DELETE FROM user_work_pool
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM user_work_pool GROUP BY user_id, work_id
+        )
+    """)
+
+    with op.batch_alter_table('user_work_pool', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_user_work_pool_user_work', ['user_id', 'work_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('user_work_pool', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_work_pool_user_work', type_='unique')
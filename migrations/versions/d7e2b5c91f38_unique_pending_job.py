@@ -0,0 +1,48 @@
+"""Allow at most one pending job per user and job type
+
+Revision ID: d7e2b5c91f38
+Revises: c4f9a2d83e17
+Create Date: 2025-09-19 10:26:53.730148
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e2b5c91f38'
+down_revision = 'c4f9a2d83e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the oldest of any duplicate pending jobs; the rest are superseded
+    op.execute(
+        """
+        UPDATE job
+        SET status = 'failed', last_error = 'Superseded by a newer pending job'
+        WHERE status = 'pending'
+          AND user_id IS NOT NULL
+          AND id NOT IN (
+              SELECT keep_id FROM (
+                  SELECT MIN(id) AS keep_id
+                  FROM job
+                  WHERE status = 'pending' AND user_id IS NOT NULL
+                  GROUP BY user_id, job_type
+              ) AS survivors
+          )
+        """
+    )
+
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.create_index(
+            'uq_job_pending_user_type', ['user_id', 'job_type'], unique=True,
+            sqlite_where=sa.text("status = 'pending'"),
+            postgresql_where=sa.text("status = 'pending'")
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_index('uq_job_pending_user_type')
@@ -0,0 +1,54 @@
+"""Add indexes for recommendation hot queries
+
+Revision ID: e5f3c8a21d67
+Revises: d2a9b6c47e15
+Create Date: 2025-09-10 16:20:33.104958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f3c8a21d67'
+down_revision = 'd2a9b6c47e15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_work_pool', schema=None) as batch_op:
+        batch_op.create_index('ix_user_work_pool_available',
+                              ['user_id', 'work_type', 'status', 'active', 'confidence_score', 'last_recommended_at'],
+                              unique=False)
+
+    # Keep one recommendation per (user, type, date) so the constraint can be
+    # added: a rated one first, then a completed one, then the oldest
+    op.execute("""
+        DELETE FROM work_recommendation
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, work_type, date
+                    ORDER BY CASE WHEN rating IS NOT NULL THEN 0 ELSE 1 END,
+                             CASE WHEN status = 'completed' THEN 0 ELSE 1 END,
+                             id
+                ) AS position
+                FROM work_recommendation
+            ) AS ranked
+            WHERE position > 1
+        )
+    """)
+
+    with op.batch_alter_table('work_recommendation', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_work_recommendation_user_type_date', ['user_id', 'work_type', 'date'])
+        batch_op.create_index('ix_work_recommendation_user_date', ['user_id', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('work_recommendation', schema=None) as batch_op:
+        batch_op.drop_index('ix_work_recommendation_user_date')
+        batch_op.drop_constraint('uq_work_recommendation_user_type_date', type_='unique')
+
+    with op.batch_alter_table('user_work_pool', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_work_pool_available')
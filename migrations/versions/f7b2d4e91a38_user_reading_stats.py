@@ -0,0 +1,34 @@
+"""Add per-user reading statistics summary table
+
+Revision ID: f7b2d4e91a38
+Revises: e5f3c8a21d67
+Create Date: 2025-09-12 10:41:07.563219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7b2d4e91a38'
+down_revision = 'e5f3c8a21d67'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_reading_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_recommendations', sa.Integer(), nullable=False),
+    sa.Column('completed_recommendations', sa.Integer(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('first_recommended_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('user_reading_stats')
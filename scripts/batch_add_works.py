@@ -3,7 +3,7 @@
 Batch Add Works Script
 
 This script reads works from a JSON file and adds them to the database.
-Generates embeddings for each work using the Google Gemini API.
+Generates embeddings for the works in batched Google Gemini API requests.
 
 Usage:
     python scripts/batch_add_works.py <json_file_path> [--dry-run]
@@ -24,6 +24,8 @@ sys.path.insert(0, '.')
 from app import create_app, db
 from app.models import Work
 from app.embeddings_engine import EmbeddingRecommendationEngine
+from app.embedding_utils import encode_embedding
+from app.embedding_executor import get_embedding_executor
 
 def load_works_from_json(file_path):
     """Load works from JSON file and validate structure."""
@@ -109,24 +111,31 @@ def create_work_from_data(work_data):
     
     return work
 
-def generate_work_embedding(work, embedding_engine):
-    """Generate and set embedding for a work using the embedding engine."""
-    try:
-        print(f"  Generating embedding for '{work.title}'...")
-        
-        # Use the existing _create_work_description method
-        work_text = embedding_engine._create_work_description(work)
-        
-        # Get embedding using the engine's method
-        embedding = embedding_engine._get_embedding(work_text)
-        work.embedding_vector = json.dumps(embedding)
-        
-        print(f"  ✓ Generated {len(embedding)}-dimensional embedding")
-        return True
-        
-    except Exception as e:
-        print(f"  ✗ Failed to generate embedding for '{work.title}': {e}")
-        return False
+def generate_work_embeddings(works, embedding_engine):
+    """
+    Generate and set embeddings for a list of works in batched API requests.
+    
+    Returns:
+        list of works that received an embedding
+    """
+    print(f"  Generating embeddings for {len(works)} works...")
+    
+    # Use the existing _create_work_description method
+    work_texts = [embedding_engine._create_work_description(work) for work in works]
+    
+    # Batched, concurrent requests; None marks a work whose request failed
+    embeddings = embedding_engine._get_embeddings(work_texts)
+    
+    embedded_works = []
+    for work, embedding in zip(works, embeddings):
+        if embedding is None:
+            print(f"  ✗ Failed to generate embedding for '{work.title}'")
+            continue
+        work.embedding_vector = encode_embedding(embedding)
+        embedded_works.append(work)
+    
+    print(f"  ✓ Generated {len(embedded_works)}/{len(works)} embeddings")
+    return embedded_works
 
 def main():
     parser = argparse.ArgumentParser(description='Batch add works from JSON file to database')
@@ -195,35 +204,44 @@ def main():
         print(f"\nInitializing embedding engine...")
         embedding_engine = EmbeddingRecommendationEngine()
         
-        # Add works to database
+        # Add works to database in chunks: one embedding request and one commit per chunk
         print(f"Adding {len(new_works)} works to database...")
         added_count = 0
         failed_count = 0
+        chunk_size = embedding_engine.embedding_batch_size * get_embedding_executor().max_workers
         
-        for i, work_data in enumerate(new_works, 1):
-            print(f"\n[{i}/{len(new_works)}] Processing '{work_data['title']}' by {work_data['author']}")
+        for start in range(0, len(new_works), chunk_size):
+            chunk_data = new_works[start:start + chunk_size]
+            print(f"\n[{start + 1}-{start + len(chunk_data)}/{len(new_works)}] Processing chunk")
             
-            try:
-                # Create work object
-                work = create_work_from_data(work_data)
-                
-                # Generate embedding
-                if not generate_work_embedding(work, embedding_engine):
-                    print(f"  ✗ Failed to generate embedding, skipping work")
+            # Create work objects
+            works = []
+            for work_data in chunk_data:
+                try:
+                    works.append(create_work_from_data(work_data))
+                except Exception as e:
+                    print(f"  ✗ Error creating '{work_data['title']}': {e}")
                     failed_count += 1
-                    continue
-                
+            
+            # Generate embeddings
+            embedded_works = generate_work_embeddings(works, embedding_engine)
+            failed_count += len(works) - len(embedded_works)
+            if not embedded_works:
+                continue
+            
+            try:
                 # Add to database
-                db.session.add(work)
+                db.session.add_all(embedded_works)
                 db.session.commit()
                 
-                print(f"  ✓ Successfully added to database (ID: {work.id})")
-                added_count += 1
+                for work in embedded_works:
+                    print(f"  ✓ Added '{work.title}' by {work.author} (ID: {work.id})")
+                added_count += len(embedded_works)
                 
             except Exception as e:
-                print(f"  ✗ Error adding work: {e}")
+                print(f"  ✗ Error adding chunk: {e}")
                 db.session.rollback()
-                failed_count += 1
+                failed_count += len(embedded_works)
         
         # Final summary
         print(f"\n--- BATCH ADD COMPLETE ---")
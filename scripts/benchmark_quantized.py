@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Memory/latency/recall report for binary first-stage work scoring.
+
+Compares the exact float32 scan used by find_similar_works with the binary
+(sign bit + Hamming distance) first stage followed by an exact rescore of
+the shortlist, on synthetic embeddings or the app's own catalog. Reports
+what each method keeps resident (the two-stage search holds the float
+matrix for the rescore plus the codes), the bytes each query reads, and
+latency relative to the exact scan.
+
+Usage:
+    python scripts/benchmark_quantized.py [--k 30] [--factor 10] [--queries 50]
+    python scripts/benchmark_quantized.py --from-db   # use cached Work embeddings
+"""
+
+import sys
+import os
+import time
+import argparse
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.embedding_utils import top_k_indices
+from app.embedding_index import normalize_rows
+from app.quantization import pack_signs, binary_scores
+
+CATALOG_SIZES = [1_000, 10_000, 50_000, 200_000]
+
+def synthetic_embeddings(n, dim, rng):
+    """Clustered unit vectors with a shared offset, roughly like real text embeddings."""
+    centers = rng.standard_normal((64, dim)).astype(np.float32)
+    offset = rng.standard_normal(dim).astype(np.float32) * 2
+    points = centers[rng.integers(0, len(centers), n)] + rng.standard_normal((n, dim)).astype(np.float32) * 0.8
+    return normalize_rows(points + offset)
+
+def sample_queries(matrix, count, rng):
+    """Perturbed catalog vectors, standing in for user embeddings."""
+    picks = matrix[rng.integers(0, len(matrix), count)]
+    return normalize_rows(picks + rng.standard_normal(picks.shape).astype(np.float32) * 0.02)
+
+def run_queries(search, queries):
+    """Average milliseconds per query and the results of each query."""
+    start = time.perf_counter()
+    results = [search(query) for query in queries]
+    return (time.perf_counter() - start) * 1000 / len(queries), results
+
+def recall(results, truth):
+    """Mean fraction of the exact top-k found by the approximate search."""
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)]))
+
+def report(matrix, queries, k, factor):
+    bits = pack_signs(matrix)
+    dim = matrix.shape[1]
+    shortlist_size = min(k * factor, len(matrix))
+
+    def exact(query):
+        return top_k_indices(matrix @ query, k)
+
+    def binary(query):
+        shortlist = top_k_indices(binary_scores(bits, query, dim), shortlist_size)
+        return shortlist[top_k_indices(matrix[shortlist] @ query, k)]
+
+    exact_ms, truth = run_queries(exact, queries)
+    binary_ms, results = run_queries(binary, queries)
+    rows = [
+        ('exact float32', matrix.nbytes, matrix.nbytes, exact_ms, 1.0),
+        ('binary + rerank', matrix.nbytes + bits.nbytes,
+         bits.nbytes + shortlist_size * dim * matrix.itemsize, binary_ms, recall(results, truth)),
+    ]
+
+    print(f"{len(matrix)} works x {dim} dims, k={k}, shortlist={shortlist_size}")
+    print(f"  {'method':<16} | {'resident MB':>11} | {'read MB/query':>13} | {'ms/query':>8} | {'vs exact':>8} | {'recall@k':>8}")
+    for name, resident, read, ms, rec in rows:
+        print(f"  {name:<16} | {resident / 1e6:>11.1f} | {read / 1e6:>13.2f} | {ms:>8.3f} | "
+              f"{exact_ms / ms:>7.2f}x | {rec:>8.3f}")
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark binary first-stage scoring')
+    parser.add_argument('--k', type=int, default=30, help='Results per query')
+    parser.add_argument('--factor', type=int, default=10, help='Shortlist size as a multiple of k')
+    parser.add_argument('--queries', type=int, default=50, help='Queries per catalog')
+    parser.add_argument('--dim', type=int, default=3072, help='Dimension of synthetic embeddings')
+    parser.add_argument('--from-db', action='store_true', help='Use the cached Work embeddings instead')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    if args.from_db:
+        from app import create_app
+        from app.embedding_index import get_work_embedding_cache
+
+        app = create_app()
+        with app.app_context():
+            ids, matrix = get_work_embedding_cache().get_matrix()
+        if not len(ids):
+            print("No work embeddings cached")
+            return
+        report(matrix, sample_queries(matrix, args.queries, rng), args.k, args.factor)
+        return
+
+    for n in CATALOG_SIZES:
+        matrix = synthetic_embeddings(n, args.dim, rng)
+        report(matrix, sample_queries(matrix, args.queries, rng), args.k, args.factor)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark full argsort vs argpartition top-k selection for similarity ranking.
+
+Shows where top_k_indices starts beating argsort as the catalog grows, for a
+single user and for a batch of users scored at once.
+
+Usage:
+    python scripts/benchmark_topk.py [--k 50] [--users 64] [--repeats 20]
+"""
+
+import sys
+import os
+import time
+import argparse
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.embedding_utils import top_k_indices
+
+CATALOG_SIZES = [100, 300, 1_000, 3_000, 10_000, 30_000, 100_000, 300_000]
+
+def best_time(fn, repeats):
+    """Best wall-clock time of repeats calls, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark top-k selection')
+    parser.add_argument('--k', type=int, default=50, help='Results per query')
+    parser.add_argument('--users', type=int, default=64, help='Queries in the batched benchmark')
+    parser.add_argument('--repeats', type=int, default=20, help='Timing repeats per size')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"k={args.k}, batch of {args.users} users, best of {args.repeats}\n")
+    print(f"{'works':>8} | {'argsort ms':>10} | {'top-k ms':>9} | {'speedup':>7} | "
+          f"{'batch argsort ms':>16} | {'batch top-k ms':>14} | {'speedup':>7}")
+    print("-" * 90)
+
+    crossover = None
+    for n in CATALOG_SIZES:
+        scores = rng.random(n, dtype=np.float32)
+        batch = rng.random((args.users, n), dtype=np.float32)
+
+        full = best_time(lambda: scores.argsort()[-args.k:][::-1], args.repeats)
+        partial = best_time(lambda: top_k_indices(scores, args.k), args.repeats)
+        batch_full = best_time(lambda: np.argsort(-batch, axis=1)[:, :args.k], args.repeats)
+        batch_partial = best_time(lambda: top_k_indices(batch, args.k), args.repeats)
+
+        # Sanity check: same winners as the full sort
+        expected = scores.argsort()[-args.k:][::-1]
+        assert np.array_equal(np.sort(top_k_indices(scores, args.k)), np.sort(expected))
+
+        if crossover is None and partial < full:
+            crossover = n
+
+        print(f"{n:>8} | {full:>10.3f} | {partial:>9.3f} | {full / partial:>6.1f}x | "
+              f"{batch_full:>16.3f} | {batch_partial:>14.3f} | {batch_full / batch_partial:>6.1f}x")
+
+    if crossover is not None:
+        print(f"\nSingle-query top-k is faster from ~{crossover} works upward")
+    else:
+        print("\nFull argsort was faster at every size tested")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Build the approximate nearest-neighbour index for work embeddings.
+
+Run after adding or re-embedding works in bulk. Until the index is rebuilt,
+find_similar_works uses exact search for any work_type whose works changed.
+
+Usage:
+    python scripts/build_ann_index.py [--lists N] [--work-type poem]
+"""
+
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.ann_index import get_ann_index
+
+def main():
+    parser = argparse.ArgumentParser(description='Build IVF index for work embeddings')
+    parser.add_argument('--lists', type=int, default=None, help='Number of clusters per work type (default: sqrt(n))')
+    parser.add_argument('--work-type', action='append', dest='work_types', help='Only build for this work type (repeatable)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        ann_index = get_ann_index()
+        start = time.perf_counter()
+        built = ann_index.build(work_types=args.work_types, n_lists=args.lists)
+        elapsed = time.perf_counter() - start
+
+        if not built:
+            print("No work embeddings found; nothing to index.")
+            return
+
+        for work_type, n_lists in built.items():
+            print(f"  {work_type}: {n_lists} clusters")
+        print(f"✓ Built {len(built)} indexes in {elapsed:.2f}s -> {ann_index.index_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Write a new version of the memory-mapped work embedding store.
+
+Decodes every work embedding from the database into one normalised matrix,
+writes it as a new store version and atomically makes it live. Running
+workers switch to it within EMBEDDING_STORE_CHECK_SECONDS. Works added or
+re-embedded after a version was written are read from the database on top
+of it (by Work.embedding_updated_at), so a rebuild is never needed for
+correctness; run it after large catalog changes to keep startup cheap.
+
+Usage:
+    python scripts/build_embedding_store.py
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.embedding_index import WorkEmbeddingCache, get_work_embedding_cache
+from app.embedding_store import write_embedding_store
+
+def main():
+    app = create_app()
+    with app.app_context():
+        store_dir = get_work_embedding_cache().store_dir
+        if not store_dir:
+            print("EMBEDDING_STORE_ENABLED is off; nothing to write.")
+            return
+
+        start = time.perf_counter()
+        # A cache without a store_dir always loads from the database
+        source = WorkEmbeddingCache()
+        partitions = {}
+        for work_type in source.work_types():
+            ids, matrix, _ = source.get_partition(work_type)
+            partitions[work_type] = (ids, matrix)
+
+        if not partitions:
+            print("No work embeddings found; nothing to write.")
+            return
+
+        version = write_embedding_store(store_dir, partitions, source.embeddings_as_of())
+        elapsed = time.perf_counter() - start
+
+        for work_type, (ids, matrix) in partitions.items():
+            print(f"  {work_type}: {len(ids)} works x {matrix.shape[1]} dims")
+        print(f"✓ Wrote embedding store {version} in {elapsed:.2f}s -> {store_dir}")
+
+if __name__ == "__main__":
+    main()
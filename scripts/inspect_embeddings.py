@@ -9,7 +9,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app
 from app.models import User, Work
-import json
+from app.embedding_utils import decode_embedding
 # import numpy as np
 
 def inspect_embeddings():
@@ -24,7 +24,7 @@ def inspect_embeddings():
         work = Work.query.filter(Work.embedding_vector.isnot(None)).first()
         
         if work:
-            embedding = json.loads(work.embedding_vector)
+            embedding = decode_embedding(work.embedding_vector).tolist()
             
             print(f"Work: '{work.title}'")
             print(f"Dimensions: {len(embedding)}")
@@ -47,7 +47,7 @@ def inspect_embeddings():
         user = User.query.filter(User.embedding_vector.isnot(None)).first()
         
         if user:
-            embedding = json.loads(user.embedding_vector)
+            embedding = decode_embedding(user.embedding_vector).tolist()
             
             print(f"User: '{user.username}'")
             print(f"Dimensions: {len(embedding)}")
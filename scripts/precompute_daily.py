@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Precompute daily recommendations for all active users.
+
+Run nightly (e.g. from cron) so morning /daily traffic only reads existing
+WorkRecommendation rows. Safe to rerun: users and work types that already
+have a recommendation for the date are skipped, so an interrupted run can
+simply be restarted.
+
+Usage:
+    python scripts/precompute_daily.py [--date YYYY-MM-DD] [--chunk-size 500]
+"""
+
+import sys
+import os
+import time
+import argparse
+from datetime import date, datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.recommendations import precompute_daily_recommendations
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute daily recommendations for all users')
+    parser.add_argument('--date', help='Target date (YYYY-MM-DD, default: today)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Users per transaction')
+    args = parser.parse_args()
+
+    target_date = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else date.today()
+
+    app = create_app()
+    with app.app_context():
+        print(f"Precomputing recommendations for {target_date}...")
+        start = time.perf_counter()
+
+        def report(users_done, created):
+            elapsed = time.perf_counter() - start
+            print(f"  {users_done} users, {created} recommendations created "
+                  f"({users_done / elapsed:.0f} users/sec)")
+
+        result = precompute_daily_recommendations(target_date, chunk_size=args.chunk_size, progress=report)
+        elapsed = time.perf_counter() - start
+
+        rate = result['users'] / elapsed if elapsed > 0 else 0
+        print(f"\n✓ Processed {result['users']} users in {elapsed:.1f}s ({rate:.0f} users/sec)")
+        print(f"✓ Created {result['created']} recommendations")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Regenerate every user's work pool from embedding similarity in one pass.
+
+Run after adding many works or switching embedding models. Users are scored
+in chunks with one matrix product per work type, so this does not call the
+LLM; per-user hybrid scoring still happens on /generate-pool and profile
+updates.
+
+Usage:
+    python scripts/regenerate_pools.py [--top-k 30] [--chunk-size 256]
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.batch_scoring import regenerate_all_user_pools
+
+def main():
+    parser = argparse.ArgumentParser(description='Regenerate all user work pools')
+    parser.add_argument('--top-k', type=int, default=30, help='Works per user and work type')
+    parser.add_argument('--chunk-size', type=int, default=256, help='Users scored per batch')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        def report(users_done, elapsed):
+            rate = users_done / elapsed if elapsed > 0 else 0
+            print(f"  {users_done} users scored ({rate:.0f} users/sec)")
+
+        result = regenerate_all_user_pools(top_k=args.top_k, chunk_size=args.chunk_size, progress=report)
+        print(f"\n✓ Regenerated pools for {result['users']} users ({result['entries']} entries)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Background job worker.
+
+Processes queued jobs (e.g. work pool population enqueued by /onboarding,
+/profile and /generate-pool). Run one or more alongside the web server.
+
+Usage:
+    python scripts/run_worker.py [--poll-interval 2] [--once]
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.jobs import run_worker
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the background job worker')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+    parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print("Worker started, waiting for jobs...")
+        try:
+            run_worker(poll_interval=args.poll_interval, once=args.once)
+        except KeyboardInterrupt:
+            print("\nWorker stopped")
+
+if __name__ == "__main__":
+    main()
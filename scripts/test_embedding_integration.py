@@ -85,7 +85,7 @@ def test_embedding_integration():
         # Test daily recommendation generation
         print(f"\n📅 Testing daily recommendations for {date.today()}...")
         try:
-            daily_recs = get_daily_recommendations(user.id,regenerate=True)
+            daily_recs = get_daily_recommendations(user.id)
             
             print("Daily recommendations:")
             for work_type, rec in daily_recs.items():
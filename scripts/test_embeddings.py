@@ -10,7 +10,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import create_app, db
 from app.models import User, Work
 from app.embeddings_engine import EmbeddingRecommendationEngine
-import json
+from app.embedding_utils import encode_embedding
+from app.embedding_cache import text_hash
 
 def test_embedding_system():
     """Test the complete embedding system"""
@@ -56,7 +57,8 @@ def test_embedding_system():
                 # Force regenerate to ensure consistent dimensions
                 print(f"  Regenerating for: {user.username}")
                 embedding = engine.generate_user_embedding(user)
-                user.embedding_vector = json.dumps(embedding)
+                user.embedding_vector = encode_embedding(embedding)
+                user.embedding_summary_hash = text_hash(user.preference_summary)
                 print(f"    New embedding dimension: {len(embedding)}")
             
             db.session.commit()
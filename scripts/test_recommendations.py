@@ -97,7 +97,7 @@ def main():
         else:
             print(f"   No recommendations for {today}. Generating...")
             try:
-                daily_set = get_daily_recommendations(user.id, today, regenerate=True)
+                daily_set = get_daily_recommendations(user.id, today)
                 if daily_set:
                     print(f"   ✓ Generated recommendations for {today}")
                     print(f"   Poem: {daily_set.poem_rec.work.title} by {daily_set.poem_rec.work.author}")
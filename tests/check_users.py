@@ -4,12 +4,12 @@ Check all users in the database and their preference/embedding status
 """
 import os
 import sys
-import json
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from app import create_app, db
 from app.models import User
+from app.embedding_utils import decode_embedding
 
 def check_all_users():
     """Check all users in the database"""
@@ -33,10 +33,10 @@ def check_all_users():
             print(f"   Has embedding_vector: {'Yes' if user.embedding_vector else 'No'}")
             if user.embedding_vector:
                 try:
-                    embedding = json.loads(user.embedding_vector)
+                    embedding = decode_embedding(user.embedding_vector)
                     print(f"   Embedding vector length: {len(embedding)}")
                 except:
-                    print(f"   Embedding vector: Invalid JSON")
+                    print(f"   Embedding vector: Invalid blob")
 
             print(f"   Active: {user.active}")
             print(f"   Created: {user.created_at}")
@@ -10,7 +10,9 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from app import create_app, db
 from app.models import User, Work
-from app.embeddings_engine import EmbeddingRecommendationEngine
+from app.embeddings_engine import EmbeddingRecommendationEngine, LLM_SCORES_SCHEMA
+from app.llm_scoring import parse_score_pairs
+from google.genai import types
 
 def debug_llm_response():
     """Debug what the LLM is actually returning"""
@@ -43,29 +45,8 @@ def debug_llm_response():
         # Test the LLM directly and see raw response
         engine = EmbeddingRecommendationEngine()
 
-        # Build the same prompt that _llm_score_candidates uses
-        works_text = ""
-        for i, work in enumerate(works):
-            works_text += f"{i+1}. ID: {work.id} | {work.title} by {work.author} | {work.work_type}\n"
-            if work.summary:
-                works_text += f"   Summary: {work.summary[:200]}...\n"
-            works_text += "\n"
-
-        prompt = f"""
-        User's Reading Preferences:
-        {user.preference_summary}
-
-        Based on these preferences, rate how well each work would match this user's taste.
-        Consider genre preferences, themes, writing style, difficulty level, and personal interests.
-
-        Rate each work from 0.0 (terrible match) to 1.0 (perfect match).
-
-        Works to evaluate:
-        {works_text}
-
-        Respond with JSON format: {{"work_id": confidence_score}}
-        Example: {{"123": 0.85, "124": 0.62, "125": 0.91}}
-        """
+        # Build the same prompt and request config that _llm_score_candidates uses
+        prompt = engine._llm_scoring_prompt(user, works)
 
         print("\n" + "="*50)
         print("PROMPT SENT TO LLM:")
@@ -76,7 +57,11 @@ def debug_llm_response():
             # Make the API call directly
             response = engine.client.models.generate_content(
                 model=engine.llm_model,
-                contents=prompt
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type='application/json',
+                    response_schema=LLM_SCORES_SCHEMA
+                )
             )
 
             print("\nRAW LLM RESPONSE:")
@@ -89,28 +74,16 @@ def debug_llm_response():
                 for i, candidate in enumerate(response.candidates):
                     print(f"  Candidate {i}: {candidate}")
 
-            # Try to parse as JSON
+            # Parse it the way the engine does
             if response.text:
-                try:
-                    import json
-                    parsed = json.loads(response.text)
-                    print(f"\n✅ Successfully parsed JSON: {parsed}")
-                except json.JSONDecodeError as e:
-                    print(f"\n❌ JSON parse error: {e}")
-                    print(f"Attempting to extract JSON from response...")
-
-                    # Try to find JSON in the response
-                    text = response.text
-                    start = text.find('{')
-                    end = text.rfind('}') + 1
-                    if start != -1 and end > start:
-                        json_part = text[start:end]
-                        print(f"Extracted JSON candidate: '{json_part}'")
-                        try:
-                            parsed = json.loads(json_part)
-                            print(f"✅ Successfully parsed extracted JSON: {parsed}")
-                        except json.JSONDecodeError as e2:
-                            print(f"❌ Still couldn't parse extracted JSON: {e2}")
+                scores = parse_score_pairs(response.text)
+                if scores:
+                    print(f"\n✅ Parsed scores: {scores}")
+                else:
+                    print("\n❌ No usable [work_id, score] pairs in the response")
+                missing = [work.id for work in works if str(work.id) not in scores]
+                if missing:
+                    print(f"Works without a score (would be asked for again): {missing}")
             else:
                 print("\n❌ Response text is empty")
 
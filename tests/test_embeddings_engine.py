@@ -11,15 +11,17 @@ from unittest.mock import Mock, patch, MagicMock
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 import tempfile
+from app import db as test_db
 from app.models import User, Work, UserWorkPool
 from app.embeddings_engine import EmbeddingRecommendationEngine
+from app.embedding_executor import EmbeddingError
+from app.embedding_utils import encode_embedding
+from app.embedding_cache import text_hash
 
-# Create separate test database instance to avoid affecting main app
-'''THIS DOESNT WORK BECAUSE MODELS STILL POINT TO app.db. fix later??? fuck this'''
-test_db = SQLAlchemy()
+# Models are bound to app.db, so bind that instance to an isolated test app
+# (temporary database file) instead of creating a separate SQLAlchemy()
 test_login_manager = LoginManager()
 
 def create_test_app():
@@ -55,9 +57,10 @@ def create_test_data(app):
             email='test@example.com',
             password_hash='dummy_hash',
             preference_summary='I love classic literature, especially romantic poetry and philosophical essays. I enjoy works by Shakespeare, Dickinson, and Thoreau. I prefer medium-length works that are intellectually stimulating.',
-            embedding_vector=json.dumps([0.1] * 3072),  # Mock embedding
+            embedding_vector=encode_embedding([0.1] * 3072),  # Mock embedding
             onboarding_completed=True
         )
+        user.embedding_summary_hash = text_hash(user.preference_summary)
         test_db.session.add(user)
 
         # Create test works
@@ -69,7 +72,7 @@ def create_test_data(app):
                 'summary': 'A beautiful sonnet comparing the beloved to a summer day',
                 'themes': 'love, beauty, immortality',
                 'genres': 'romantic, classical',
-                'embedding_vector': json.dumps([0.8] + [0.1] * 3071)  # High similarity
+                'embedding_vector': encode_embedding([0.8] + [0.1] * 3071)  # High similarity
             },
             {
                 'title': 'Because I could not stop for Death',
@@ -78,7 +81,7 @@ def create_test_data(app):
                 'summary': 'A contemplation on death and eternity',
                 'themes': 'death, eternity, journey',
                 'genres': 'philosophical, classical',
-                'embedding_vector': json.dumps([0.7] + [0.1] * 3071)  # Medium-high similarity
+                'embedding_vector': encode_embedding([0.7] + [0.1] * 3071)  # Medium-high similarity
             },
             {
                 'title': 'Civil Disobedience',
@@ -87,7 +90,7 @@ def create_test_data(app):
                 'summary': 'An essay on resistance to civil government',
                 'themes': 'government, resistance, conscience',
                 'genres': 'philosophical, political',
-                'embedding_vector': json.dumps([0.6] + [0.1] * 3071)  # Medium similarity
+                'embedding_vector': encode_embedding([0.6] + [0.1] * 3071)  # Medium similarity
             },
             {
                 'title': 'The Lottery',
@@ -96,7 +99,7 @@ def create_test_data(app):
                 'summary': 'A disturbing tale of a small town tradition',
                 'themes': 'tradition, violence, conformity',
                 'genres': 'horror, social commentary',
-                'embedding_vector': json.dumps([0.2] + [0.1] * 3071)  # Low similarity
+                'embedding_vector': encode_embedding([0.2] + [0.1] * 3071)  # Low similarity
             }
         ]
 
@@ -313,6 +316,1093 @@ def test_hybrid_recommendations_no_embedding():
 
         print("✓ No embedding test passed!")
 
+def test_work_embedding_cache_updates_on_commit():
+    """Test that the work embedding cache picks up committed works incrementally"""
+    print("Testing work embedding cache incremental updates...")
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+
+        with patch('app.embeddings_engine.genai.Client'):
+            engine = EmbeddingRecommendationEngine()
+            before = engine.find_similar_works(user_id, work_type='essay')
+            assert len(before) == 1, "Should find the only essay"
+
+            # Add a new essay after the cache has been built
+            new_essay = Work(
+                title='Self-Reliance',
+                author='Ralph Waldo Emerson',
+                work_type='essay',
+                embedding_vector=encode_embedding([0.1] * 3072)
+            )
+            test_db.session.add(new_essay)
+            test_db.session.commit()
+
+            after = engine.find_similar_works(user_id, work_type='essay')
+            print(f"✓ Essays found after insert: {[item['work'].title for item in after]}")
+            assert len(after) == 2, "Cache should include the newly committed essay"
+            assert after[0]['work'].id == new_essay.id, "Identical embedding should rank first"
+            assert abs(after[0]['similarity_score'] - 1.0) < 1e-5
+
+            print("✓ Work embedding cache test passed!")
+
+def test_work_embedding_cache_sees_other_process_writes():
+    """Test that the cache picks up works written outside its own sessions"""
+    print("Testing work embedding cache cross-process sync...")
+
+    import numpy as np
+    from datetime import datetime, timedelta, timezone
+    from app.embedding_index import get_work_embedding_cache
+
+    app = create_test_app()
+    app.config['EMBEDDING_CATALOG_CHECK_SECONDS'] = 0
+
+    with app.app_context():
+        create_test_data(app)
+        cache = get_work_embedding_cache()
+        essay = Work.query.filter_by(work_type='essay').first()
+        assert essay.id in cache.get_partition('essay')[0]
+
+        # Core statements skip the ORM events, like a write from another process
+        work_table = Work.__table__
+        changed_at = datetime.now(timezone.utc) + timedelta(seconds=1)
+        test_db.session.execute(work_table.update().where(work_table.c.id == essay.id).values(
+            embedding_vector=encode_embedding([0.0, 1.0] + [0.0] * 3070), embedding_updated_at=changed_at
+        ))
+        new_id = test_db.session.execute(work_table.insert().values(
+            title='Walking', author='Henry David Thoreau', work_type='essay',
+            embedding_vector=encode_embedding([1.0] * 3072), embedding_updated_at=changed_at
+        )).inserted_primary_key[0]
+        test_db.session.commit()
+
+        ids, vectors = cache.get_vectors([essay.id, new_id])
+        assert ids.tolist() == [essay.id, new_id]
+        assert np.allclose(vectors[0][:2], [0.0, 1.0]), "Rewritten embedding should be synced"
+        print(f"✓ Synced rewritten work {essay.id} and new work {new_id}")
+
+        # Deletions leave no timestamp; the count mismatch forces a reload
+        test_db.session.execute(work_table.delete().where(work_table.c.id == new_id))
+        test_db.session.commit()
+        assert new_id not in cache.get_partition('essay')[0]
+
+        # Scoring all types concatenates per-partition scores
+        ids, scores = cache.score(np.array([0.5] + [0.1] * 3071))
+        assert sorted(ids.tolist()) == sorted(w.id for w in Work.query.all())
+        assert len(scores) == len(ids)
+
+        print("✓ Cross-process sync test passed!")
+
+def test_decode_embedding_rejects_malformed_blobs():
+    """Test that truncated or padded blobs raise ValueError instead of struct.error"""
+    print("Testing embedding blob validation...")
+
+    from app.embedding_utils import decode_embedding, embedding_dimension
+
+    blob = encode_embedding([0.5, 0.25, 0.125])
+    assert decode_embedding(blob).tolist() == [0.5, 0.25, 0.125]
+    assert embedding_dimension(blob) == 3
+
+    for bad in (blob[:5], blob[:-1], blob + b'\x00\x00\x00\x00', b'XX' + blob[2:]):
+        try:
+            decode_embedding(bad)
+            assert False, f"Should reject {bad!r}"
+        except ValueError as e:
+            print(f"✓ Rejected {len(bad)}-byte blob: {e}")
+
+    print("✓ Embedding blob validation test passed!")
+
+def test_top_k_indices():
+    """Test that partial top-k selection matches a full sort, for one and many queries"""
+    print("Testing top_k_indices...")
+
+    import numpy as np
+    from app.embedding_utils import top_k_indices
+
+    rng = np.random.default_rng(0)
+    scores = rng.random(1000)
+    expected = scores.argsort()[-10:][::-1]
+    assert list(top_k_indices(scores, 10)) == list(expected), "Should return best-first indices"
+    assert len(top_k_indices(scores[:3], 10)) == 3, "k should be capped at the number of scores"
+
+    batch = rng.random((4, 1000))
+    result = top_k_indices(batch, 5)
+    assert result.shape == (4, 5)
+    for row, indices in zip(batch, result):
+        assert list(indices) == list(row.argsort()[-5:][::-1])
+
+    print("✓ top_k_indices test passed!")
+
+class FakeEmbeddingClient:
+    """Local stand-in for genai.Client that embeds each text deterministically"""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.requests = []
+        self.models = self
+
+    def embed_content(self, model, contents, config=None):
+        texts = contents if isinstance(contents, list) else [contents]
+        self.requests.append(texts)
+        embeddings = []
+        for text in texts:
+            # First component identifies the text so results can be matched back
+            embeddings.append(Mock(values=[float(len(text))] + [1.0] * (self.dim - 1)))
+        return Mock(embeddings=embeddings)
+
+def test_generate_work_embeddings_batched():
+    """Test that work embeddings are generated in batched requests and mapped back to works"""
+    print("Testing batched generate_work_embeddings...")
+
+    app = create_test_app()
+
+    with app.app_context():
+        create_test_data(app)
+        works = Work.query.order_by(Work.id).all()
+
+        fake_client = FakeEmbeddingClient()
+        with patch('app.embeddings_engine.genai.Client', return_value=fake_client):
+            engine = EmbeddingRecommendationEngine()
+            engine.embedding_batch_size = 3
+            engine.generate_work_embeddings(works, regenerate=True)
+
+        print(f"✓ Sent {len(fake_client.requests)} requests for {len(works)} works")
+        assert [len(batch) for batch in fake_client.requests] == [3, 1], "Should batch 3 + 1 works"
+
+        from app.embedding_utils import decode_embedding
+        for work in Work.query.order_by(Work.id).all():
+            expected_length = len(engine._create_work_description(work))
+            assert decode_embedding(work.embedding_vector)[0] == expected_length, \
+                f"Embedding for '{work.title}' should come from its own description"
+
+        print("✓ Batched embedding test passed!")
+
+def test_embedding_cache_skips_repeat_requests():
+    """Test that re-embedding unchanged descriptions is served from the embedding cache"""
+    print("Testing embedding cache...")
+
+    app = create_test_app()
+
+    with app.app_context():
+        create_test_data(app)
+        works = Work.query.all()
+
+        fake_client = FakeEmbeddingClient()
+        with patch('app.embeddings_engine.genai.Client', return_value=fake_client):
+            engine = EmbeddingRecommendationEngine()
+            engine.generate_work_embeddings(works, regenerate=True)
+            assert len(fake_client.requests) == 1, "First run should call the API"
+
+            engine.generate_work_embeddings(works, regenerate=True)
+            assert len(fake_client.requests) == 1, "Second run should be fully cached"
+
+            # Fresh and cached embeddings come back as the same type
+            fresh = engine._get_embedding('Walden')
+            cached = engine._get_embedding('Walden')
+            assert type(fresh) is list and type(cached) is list and fresh == cached
+
+        from app.embedding_cache import get_embedding_cache
+        stats = get_embedding_cache().stats()
+        print(f"✓ Cache stats: {stats}")
+        assert stats['hits'] == len(works) + 1
+        assert stats['misses'] == len(works) + 1
+
+        print("✓ Embedding cache test passed!")
+
+class FlakyEmbeddingClient(FakeEmbeddingClient):
+    """Fake client that fails with the given status codes before succeeding"""
+
+    def __init__(self, failure_codes, dim=8):
+        super().__init__(dim)
+        self.failure_codes = list(failure_codes)
+
+    def embed_content(self, model, contents, config=None):
+        if self.failure_codes:
+            error = Exception(f"API error {self.failure_codes[0]}")
+            error.code = self.failure_codes.pop(0)
+            raise error
+        return super().embed_content(model, contents, config)
+
+def test_embedding_retry_and_explicit_failure():
+    """Test that 429s are retried and permanent failures are reported instead of zero vectors"""
+    print("Testing embedding retries and failures...")
+
+    app = create_test_app()
+    app.config['EMBEDDING_BACKOFF_SECONDS'] = 0
+
+    with app.app_context():
+        create_test_data(app)
+        works = Work.query.order_by(Work.id).all()
+        originals = [work.embedding_vector for work in works]
+
+        # Two rate-limit errors, then success
+        flaky_client = FlakyEmbeddingClient([429, 429])
+        with patch('app.embeddings_engine.genai.Client', return_value=flaky_client):
+            engine = EmbeddingRecommendationEngine()
+            embeddings = engine._get_embeddings(['retry me'])
+        assert embeddings[0] is not None, "Should succeed after retrying 429s"
+        assert len(flaky_client.requests) == 1
+
+        # A 400 is not retryable: works keep their previous embeddings
+        broken_client = FlakyEmbeddingClient([400])
+        with patch('app.embeddings_engine.genai.Client', return_value=broken_client):
+            engine = EmbeddingRecommendationEngine()
+            engine.generate_work_embeddings(works, regenerate=True)
+            try:
+                engine._get_embedding('another text')
+                assert False, "Should raise after the request fails"
+            except EmbeddingError:
+                pass
+
+        assert [work.embedding_vector for work in works] == originals, \
+            "Failed embeddings must not overwrite stored vectors"
+
+        print("✓ Embedding retry test passed!")
+
+def test_job_queue_dedup_and_retry():
+    """Test that pool population jobs are deduplicated per user and retried on failure"""
+    print("Testing background job queue...")
+
+    from datetime import datetime, timezone
+    from app.jobs import enqueue_pool_population, claim_next_job, run_job
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+
+        first = enqueue_pool_population(user_id)
+        second = enqueue_pool_population(user_id)
+        assert first.id == second.id, "Pending job should be reused for the same user"
+
+        job = claim_next_job()
+        assert job.id == first.id and job.status == 'running' and job.attempts == 1
+        assert claim_next_job() is None, "A running job can't be claimed twice"
+
+        with patch('app.recommendations.populate_user_work_pool', side_effect=Exception("LLM down")):
+            assert run_job(job) is False
+
+        job = test_db.session.get(type(job), job.id)
+        print(f"✓ Job after failure: status={job.status}, attempts={job.attempts}, error={job.last_error}")
+        assert job.status == 'pending', "Failed job should be scheduled for retry"
+        assert job.last_error == "LLM down"
+        assert claim_next_job() is None, "Retry should wait for its backoff"
+
+        # The database rejects a second pending job even if the lookup missed the first
+        from sqlalchemy.exc import IntegrityError
+        from app.models import Job
+        test_db.session.add(Job(job_type=job.job_type, user_id=user_id))
+        try:
+            test_db.session.commit()
+            assert False, "Duplicate pending job should violate the partial unique index"
+        except IntegrityError:
+            test_db.session.rollback()
+
+        # A worker died mid-job: the claim times out and the job is queued again
+        job.run_after = datetime.now(timezone.utc)
+        test_db.session.commit()
+        job = claim_next_job()
+        newer = enqueue_pool_population(user_id)
+        assert newer.id != job.id and newer.status == 'pending'
+        assert claim_next_job() is None, "A user's jobs of one type don't run concurrently"
+        reclaimed = claim_next_job(claim_timeout=0)
+        test_db.session.expire_all()
+        print(f"✓ Abandoned job {job.id}: {test_db.session.get(Job, job.id).last_error}")
+        assert test_db.session.get(Job, job.id).status == 'failed', "Superseded by the newer pending job"
+        assert reclaimed.id == newer.id
+
+        print("✓ Job queue test passed!")
+
+def test_populate_pool_scores_types_concurrently():
+    """Test that populate_user_work_pool runs the per-type LLM calls in parallel"""
+    print("Testing concurrent LLM scoring in populate_user_work_pool...")
+
+    import threading
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        works = Work.query.all()
+
+        # Each call waits until all three are in flight; serial calls would time out
+        barrier = threading.Barrier(3, timeout=5)
+
+        def generate_content(model, contents, config=None):
+            barrier.wait()
+            return Mock(text=json.dumps({str(work.id): 0.9 for work in works}))
+
+        with patch('app.embeddings_engine.genai.Client') as mock_client_class:
+            mock_client = Mock()
+            mock_client_class.return_value = mock_client
+            mock_client.models.generate_content.side_effect = generate_content
+
+            engine = EmbeddingRecommendationEngine()
+            engine.populate_user_work_pool(user_id)
+
+        assert mock_client.models.generate_content.call_count == 3, "One LLM call per work type"
+        pool = UserWorkPool.query.filter_by(user_id=user_id).all()
+        print(f"✓ Pool entries: {len(pool)}")
+        assert len(pool) == len(works), "Every work should be pooled"
+        for entry in pool:
+            assert entry.confidence_score > 0.6, "LLM scores should not be the 0.5 fallback"
+
+        print("✓ Concurrent pool population test passed!")
+
+def test_precompute_daily_recommendations_is_resumable():
+    """Test batch precomputation of daily recommendations and that reruns skip filled slots"""
+    print("Testing precompute_daily_recommendations...")
+
+    from datetime import date
+    from app.models import WorkRecommendation
+    from app.recommendations import precompute_daily_recommendations
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        for work in Work.query.all():
+            test_db.session.add(UserWorkPool(
+                user_id=user_id,
+                work_id=work.id,
+                work_type=work.work_type,
+                confidence_score=0.9 if 'Shakespeare' in work.author else 0.5
+            ))
+        test_db.session.commit()
+
+        result = precompute_daily_recommendations(date(2025, 1, 1), chunk_size=10)
+        print(f"✓ First run: {result}")
+        assert result == {'users': 1, 'created': 3}, "One recommendation per work type"
+
+        poem_rec = WorkRecommendation.query.filter_by(user_id=user_id, work_type='poem').one()
+        assert poem_rec.work.author == 'William Shakespeare', "Highest confidence poem should be picked"
+        assert UserWorkPool.query.filter_by(work_id=poem_rec.work_id).one().status == 'recommended'
+
+        result = precompute_daily_recommendations(date(2025, 1, 1), chunk_size=10)
+        assert result['created'] == 0, "Rerun should skip already filled slots"
+
+        print("✓ Precompute daily recommendations test passed!")
+
+def test_regenerate_all_user_pools():
+    """Test the batch scorer ranks works per type and writes pools for every user"""
+    print("Testing regenerate_all_user_pools...")
+
+    from app.batch_scoring import regenerate_all_user_pools
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        second_user = User(
+            username='second',
+            email='second@example.com',
+            password_hash='dummy_hash',
+            embedding_vector=encode_embedding([0.8] + [0.1] * 3071),
+            onboarding_completed=True
+        )
+        test_db.session.add(second_user)
+        test_db.session.commit()
+
+        result = regenerate_all_user_pools(top_k=1, chunk_size=1)
+        print(f"✓ Batch result: {result}")
+        assert result['users'] == 2
+        assert result['entries'] == 6, "One work per type for each user"
+
+        poem_entry = UserWorkPool.query.filter_by(user_id=second_user.id, work_type='poem').one()
+        assert poem_entry.work.title == 'Sonnet 18', "Identical embedding should win"
+        assert abs(poem_entry.confidence_score - 1.0) < 1e-5
+
+        # Rerunning replaces available entries instead of duplicating them
+        regenerate_all_user_pools(top_k=1)
+        assert UserWorkPool.query.filter_by(user_id=user_id).count() == 3
+
+        print("✓ Batch pool regeneration test passed!")
+
+def _explain(query):
+    """Return SQLite's EXPLAIN QUERY PLAN output for an ORM query as one string"""
+    compiled = query.statement.compile(
+        dialect=test_db.engine.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = test_db.session.connection().exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {compiled}", params
+    ).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+def _scans_table(plan, table):
+    """True if the plan reads every row of table instead of searching an index"""
+    return any(step.strip() == f"SCAN {table}" for step in plan.split(" | "))
+
+def test_recommendation_queries_use_indexes():
+    """Test that the hot recommendation queries are served by indexes, not table scans"""
+    print("Testing query plans for recommendation queries...")
+
+    from datetime import date
+    from app.recommendations import (
+        _slot_candidates_query, _filled_slots_query, _daily_recommendations_query
+    )
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        day = date(2025, 1, 1)
+
+        plan = _explain(_slot_candidates_query([user_id], ['poem', 'short_story']))
+        print(f"✓ Slot candidates plan: {plan}")
+        assert 'ix_user_work_pool_available' in plan, "Candidate lookup should use ix_user_work_pool_available"
+        assert not _scans_table(plan, 'user_work_pool'), "Candidate lookup should not scan user_work_pool"
+
+        plan = _explain(_filled_slots_query([user_id], day))
+        print(f"✓ Filled slots plan: {plan}")
+        assert not _scans_table(plan, 'work_recommendation'), "Filled slot lookup should not scan work_recommendation"
+
+        plan = _explain(_daily_recommendations_query(user_id, day))
+        print(f"✓ Daily recommendation plan: {plan}")
+        assert 'ix_work_recommendation_user_date' in plan, \
+            "Daily fetch should use ix_work_recommendation_user_date"
+        assert not _scans_table(plan, 'work_recommendation'), "Daily fetch should not scan work_recommendation"
+
+        print("✓ Query plan test passed!")
+
+class QueryCounter:
+    """Context manager counting SQL statements executed on the test database"""
+
+    def __enter__(self):
+        from sqlalchemy import event
+        self.count = 0
+        self._engine = test_db.engine
+        event.listen(self._engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self._engine, 'before_cursor_execute', self._on_execute)
+
+def test_daily_recommendations_constant_queries():
+    """Test that /daily's recommendation fetch is one query once the day is filled"""
+    print("Testing get_daily_recommendations query count...")
+
+    from datetime import date
+    from app.recommendations import get_daily_recommendations
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        for work in Work.query.all():
+            test_db.session.add(UserWorkPool(
+                user_id=user_id, work_id=work.id, work_type=work.work_type, confidence_score=0.7
+            ))
+        test_db.session.commit()
+        target = date(2025, 1, 1)
+
+        with QueryCounter() as first:
+            recs = get_daily_recommendations(user_id, target)
+        assert all(recs[work_type] for work_type in ('poem', 'short_story', 'essay'))
+        print(f"✓ First view (generating 3 recommendations): {first.count} statements")
+        assert first.count <= 6
+
+        test_db.session.expire_all()
+        with QueryCounter() as second:
+            recs = get_daily_recommendations(user_id, target)
+            titles = [rec.work.title for rec in recs.values()]
+        print(f"✓ Repeat view: {second.count} statements for {titles}")
+        assert second.count == 1, "Existing recommendations and their works should load in one query"
+
+        from sqlalchemy import inspect
+        unloaded = inspect(recs['poem'].work).unloaded
+        assert 'embedding_vector' in unloaded, "Page views should not load work embeddings"
+
+        print("✓ Daily recommendations query count test passed!")
+
+def test_embedding_columns_are_deferred():
+    """Test that ordinary Work/User loads skip the embedding columns"""
+    print("Testing deferred embedding columns...")
+
+    from sqlalchemy import inspect
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        test_db.session.expunge_all()
+
+        works = Work.query.all()
+        user = test_db.session.get(User, user_id)
+        assert all('embedding_vector' in inspect(work).unloaded for work in works)
+        assert 'embedding_vector' in inspect(user).unloaded
+
+        # Still available on access
+        assert user.embedding_vector is not None
+
+        print("✓ Deferred embedding columns test passed!")
+
+def test_session_principal_skips_user_query():
+    """Test that the Flask-Login loader serves current_user from the session cache"""
+    print("Testing session principal loader...")
+
+    from flask import session
+    from werkzeug.exceptions import HTTPException
+    from app.principal import (
+        PRINCIPAL_SESSION_KEY, SessionPrincipal, load_principal, remember_principal
+    )
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+
+        with app.test_request_context():
+            with QueryCounter() as cold:
+                principal = load_principal(str(user_id))
+            assert isinstance(principal, SessionPrincipal)
+            assert cold.count == 1
+            print(f"✓ First request loads the principal with {cold.count} query")
+
+            with QueryCounter() as warm:
+                principal = load_principal(str(user_id))
+                assert principal.onboarding_completed and principal.get_id() == str(user_id)
+            assert warm.count == 0, "Fresh session principal should not touch the database"
+            print("✓ Later requests: 0 queries")
+
+            # Settings changes go through the User row and refresh the cache
+            user = principal.load_user_row()
+            user.preferred_length = 'long'
+            test_db.session.commit()
+            remember_principal(user)
+            assert load_principal(str(user_id)).preferred_length == 'long'
+
+            try:
+                principal.preferred_length = 'short'
+                assert False, "SessionPrincipal should be read-only"
+            except AttributeError:
+                pass
+
+        # A user deleted within the TTL is logged out instead of crashing on the missing row
+        with app.test_request_context():
+            doomed = User(username='doomed', email='doomed@example.com', password_hash='x')
+            test_db.session.add(doomed)
+            test_db.session.commit()
+            principal = remember_principal(doomed)
+            test_db.session.delete(doomed)
+            test_db.session.commit()
+
+            try:
+                principal.preference_summary
+                assert False, "Missing user row should end the request"
+            except HTTPException:
+                pass
+            assert PRINCIPAL_SESSION_KEY not in session, "Cached principal should be dropped"
+            print("✓ Deleted user is logged out")
+
+        print("✓ Session principal test passed!")
+
+def test_reading_stats_summary_tracks_ratings():
+    """Test that the profile statistics summary matches the aggregate as recommendations are created and rated"""
+    print("Testing reading statistics summary...")
+
+    from datetime import date
+    from app.models import WorkRecommendation
+    from app.reading_stats import aggregate_reading_stats, get_reading_stats, record_rating
+    from app.recommendations import precompute_daily_recommendations
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        for work in Work.query.all():
+            test_db.session.add(UserWorkPool(
+                user_id=user_id, work_id=work.id, work_type=work.work_type, confidence_score=0.7
+            ))
+        test_db.session.commit()
+
+        stats = get_reading_stats(user_id)
+        assert stats['total_recommendations'] == 0 and stats['average_rating'] is None
+
+        # Created after the summary row exists: counted incrementally
+        precompute_daily_recommendations(date(2025, 1, 1), chunk_size=10)
+        stats = get_reading_stats(user_id)
+        assert stats['total_recommendations'] == 3 and stats['days_active'] >= 1
+
+        rec = WorkRecommendation.query.filter_by(user_id=user_id, work_type='poem').one()
+        for old_rating, new_rating, newly_completed in ((None, 4, True), (4, 2, False)):
+            rec.rating = new_rating
+            if newly_completed:
+                rec.status = 'completed'
+            record_rating(user_id, old_rating, new_rating, newly_completed)
+            test_db.session.commit()
+
+        stats = get_reading_stats(user_id)
+        print(f"✓ Summary stats: {stats}")
+        assert stats['completed_recommendations'] == 1
+        assert stats['average_rating'] == 2
+
+        aggregate = aggregate_reading_stats(user_id)
+        assert aggregate['rating_count'] == 1 and aggregate['rating_sum'] == 2
+        assert aggregate['total_recommendations'] == 3 and aggregate['completed_recommendations'] == 1
+
+        print("✓ Reading statistics summary test passed!")
+
+def test_preference_edits_are_incremental():
+    """Test that profile saves write only changed preferences and skip unchanged embeddings"""
+    print("Testing incremental preference saves...")
+
+    from app.models import UserPreference
+    from app.preference_utils import save_user_preferences
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        form = {'favoriteBooks': 'Walden\nMiddlemarch', 'favoriteAuthors': 'George Eliot'}
+
+        fake_client = FakeEmbeddingClient()
+        with patch('app.embeddings_engine.genai.Client', return_value=fake_client):
+            result = save_user_preferences(user_id, form)
+            assert result['added'] == 3 and result['summary_changed']
+            assert len(fake_client.requests) == 1
+            walden_id = UserPreference.query.filter_by(preference_value='Walden').one().id
+
+            # Same form again: nothing written, no embedding call
+            result = save_user_preferences(user_id, form)
+            print(f"✓ Unchanged save: {result}")
+            assert result == {'added': 0, 'removed': 0, 'changed': 0, 'summary_changed': False}
+            assert len(fake_client.requests) == 1, "Unchanged summary should not be re-embedded"
+
+            # Drop one book: only that row is deleted, the rest keep their ids
+            result = save_user_preferences(user_id, {'favoriteBooks': 'Walden', 'favoriteAuthors': 'George Eliot'})
+            print(f"✓ Edited save: {result}")
+            assert result['removed'] == 1 and result['added'] == 0 and result['summary_changed']
+            assert UserPreference.query.filter_by(preference_value='Walden').one().id == walden_id
+            assert len(fake_client.requests) == 2
+
+        # Embedding API down: the new summary is saved but the old embedding is marked stale
+        from app.preference_utils import user_embedding_is_stale
+        from app.recommendations import populate_user_work_pool
+        failing_client = Mock()
+        failing_client.models.embed_content.side_effect = ValueError("invalid request")
+        edited = {'favoriteBooks': 'Walden\nEmma', 'favoriteAuthors': 'George Eliot'}
+        with patch('app.embeddings_engine.genai.Client', return_value=failing_client):
+            result = save_user_preferences(user_id, edited)
+            assert result['added'] == 1 and result['summary_changed']
+            user = test_db.session.get(User, user_id)
+            assert 'Emma' in user.preference_summary and user_embedding_is_stale(user)
+            try:
+                populate_user_work_pool(user_id)
+                assert False, "Pool should not be scored from the stale embedding"
+            except EmbeddingError:
+                pass
+
+        # Once the API is back, the pool job rebuilds the embedding first
+        with patch('app.embeddings_engine.genai.Client', return_value=fake_client), \
+                patch('app.embeddings_engine.EmbeddingRecommendationEngine.populate_user_work_pool'):
+            assert populate_user_work_pool(user_id)
+            assert len(fake_client.requests) == 3
+            assert not user_embedding_is_stale(test_db.session.get(User, user_id))
+            result = save_user_preferences(user_id, edited)
+            assert not result['summary_changed'] and len(fake_client.requests) == 3
+            print("✓ Stale embedding rebuilt by the pool job")
+
+        print("✓ Incremental preference save test passed!")
+
+def test_rating_feedback_refines_user_embedding():
+    """Test that ratings nudge the user embedding locally and shift only available pool scores"""
+    print("Testing rating feedback...")
+
+    import numpy as np
+    from app.embedding_utils import decode_embedding
+    from app.feedback import apply_rating_feedback, rating_weight
+    from app.batch_scoring import BATCH_POOL_REASON
+    from app.embeddings_engine import EMBEDDING_SCORE_WEIGHT, HYBRID_POOL_REASON
+    from app.recommendations import BASIC_POOL_REASON
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        works = {work.title: work for work in Work.query.all()}
+        reasons = {'The Lottery': BATCH_POOL_REASON, 'Civil Disobedience': BASIC_POOL_REASON,
+                   'Sonnet 18': HYBRID_POOL_REASON}
+        for title, work in works.items():
+            test_db.session.add(UserWorkPool(
+                user_id=user_id, work_id=work.id, work_type=work.work_type, confidence_score=0.5,
+                added_reason=reasons.get(title)
+            ))
+        # Start from a vector far from every work so the updates are clearly measurable
+        test_db.session.get(User, user_id).embedding_vector = encode_embedding([0.0, 1.0] + [0.0] * 3070)
+        test_db.session.commit()
+
+        assert rating_weight(5) == 1.0 and rating_weight(1) == -1.0 and rating_weight(3) == 0
+        assert rating_weight(4, old_rating=4) == 0, "Re-rating with the same value is a no-op"
+
+        lottery, sonnet = works['The Lottery'], works['Sonnet 18']
+        target = decode_embedding(lottery.embedding_vector)
+        before = decode_embedding(test_db.session.get(User, user_id).embedding_vector)
+
+        with patch('app.embeddings_engine.genai.Client') as client:
+            rescored = apply_rating_feedback(user_id, lottery.id, 5)
+            test_db.session.commit()
+            assert not client.called, "Feedback must not call the embedding API"
+
+        test_db.session.expire_all()
+        after = decode_embedding(test_db.session.get(User, user_id).embedding_vector)
+        cosine = lambda a, b: float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+        print(f"✓ Similarity to liked work: {cosine(before, target):.4f} -> {cosine(after, target):.4f}")
+        assert cosine(after, target) > cosine(before, target)
+        assert rescored >= 1
+
+        # Scores move by the similarity change times its weight in each entry's score
+        unit = lambda v: v / np.linalg.norm(v)
+        similarity_change = lambda work: float(
+            unit(decode_embedding(work.embedding_vector)) @ (unit(after) - unit(before))
+        )
+        score = lambda work: UserWorkPool.query.filter_by(work_id=work.id).one().confidence_score
+        assert similarity_change(lottery) > 0
+        assert abs(score(lottery) - (0.5 + similarity_change(lottery))) < 1e-5, "Batch entries are pure similarity"
+        assert abs(score(sonnet) - (0.5 + EMBEDDING_SCORE_WEIGHT * similarity_change(sonnet))) < 1e-5
+        assert score(works['Civil Disobedience']) == 0.5, "Basic entries have no embedding component"
+
+        sonnet_score = score(sonnet)
+        apply_rating_feedback(user_id, sonnet.id, 1)
+        test_db.session.commit()
+        assert score(sonnet) < sonnet_score
+
+        print("✓ Rating feedback test passed!")
+
+def test_reduced_dimension_search_reranks_full_width():
+    """Test that the truncated first stage returns full-width similarities for the shortlist"""
+    print("Testing reduced-dimension search...")
+
+    import numpy as np
+    from app.embedding_index import get_work_embedding_cache
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+
+        with patch('app.embeddings_engine.genai.Client'):
+            exact = EmbeddingRecommendationEngine().find_similar_works(user_id, top_k=3)
+            app.config['EMBEDDING_SEARCH_DIM'] = 16
+            engine = EmbeddingRecommendationEngine()
+            reduced = engine.find_similar_works(user_id, top_k=3)
+
+        ids, matrix = get_work_embedding_cache().get_matrix(dimensions=16)
+        assert matrix.shape == (len(ids), 16)
+        assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0), "Truncated rows should be re-normalised"
+
+        print(f"✓ Reduced: {[(r['work'].title, round(r['similarity_score'], 4)) for r in reduced]}")
+        assert [r['work'].id for r in reduced] == [r['work'].id for r in exact]
+        assert np.allclose([r['similarity_score'] for r in reduced],
+                           [r['similarity_score'] for r in exact], atol=1e-5), \
+            "Shortlist should be rescored with full-width vectors"
+
+        print("✓ Reduced-dimension search test passed!")
+
+def test_quantized_first_stage_matches_exact():
+    """Test binary codes track cache updates and the reranked results match the exact path"""
+    print("Testing quantized first stage...")
+
+    import numpy as np
+    from app.embedding_index import get_work_embedding_cache
+    from app.quantization import pack_signs, hamming_distances
+
+    matrix = np.array([[0.6, -0.8, 0.0], [-0.6, 0.0, 0.8]], dtype=np.float32)
+    assert hamming_distances(pack_signs(matrix), np.array([1.0, -1.0, -1.0])).tolist() == [0, 2]
+    # Rows of whole 64-bit words are compared word-wise; same distances as bit by bit
+    rng = np.random.default_rng(0)
+    wide = rng.standard_normal((5, 128))
+    query = rng.standard_normal(128)
+    expected = [int(((row > 0) != (query > 0)).sum()) for row in wide]
+    assert hamming_distances(pack_signs(wide), query).tolist() == expected
+
+    app = create_test_app()
+    app.config['EMBEDDING_QUANTIZED_SEARCH'] = 'binary'
+
+    with app.app_context():
+        user_id = create_test_data(app)
+
+        with patch('app.embeddings_engine.genai.Client'):
+            engine = EmbeddingRecommendationEngine()
+            assert engine.quantized_search == 'binary'
+            quantized = engine.find_similar_works(user_id, top_k=3)
+            engine.quantized_search = None
+            exact = engine.find_similar_works(user_id, top_k=3)
+            print(f"✓ binary: {[r['work'].title for r in quantized]}")
+            assert [r['work'].id for r in quantized] == [r['work'].id for r in exact]
+            assert np.allclose([r['similarity_score'] for r in quantized],
+                               [r['similarity_score'] for r in exact])
+
+            app.config['EMBEDDING_QUANTIZED_SEARCH'] = 'int8'
+            assert EmbeddingRecommendationEngine().quantized_search is None, "Unsupported modes are ignored"
+
+        # Codes are rebuilt for rows written after the cache loaded
+        cache = get_work_embedding_cache()
+        work = Work.query.filter_by(work_type='essay').first()
+        work.embedding_vector = encode_embedding([-0.5] + [0.1] * 3071)
+        test_db.session.commit()
+        ids, approx = cache.score_quantized(np.array([-0.5] + [0.1] * 3071), 'essay')
+        _, exact_scores = cache.score(np.array([-0.5] + [0.1] * 3071), 'essay')
+        assert np.allclose(approx, exact_scores, atol=0.01)
+
+        print("✓ Quantized first stage test passed!")
+
+def test_memory_mapped_embedding_store():
+    """Test that the work cache maps the on-disk store, reconciles it and swaps to new versions"""
+    print("Testing memory-mapped embedding store...")
+
+    import numpy as np
+    from datetime import datetime, timedelta, timezone
+    from app.embedding_index import WorkEmbeddingCache, get_work_embedding_cache
+    from app.embedding_store import current_version, write_embedding_store
+
+    app = create_test_app()
+    store_dir = tempfile.mkdtemp()
+    app.config['EMBEDDING_STORE_DIR'] = store_dir
+
+    with app.app_context():
+        create_test_data(app)
+        # Essays were embedded long before the rest, so they predate the store's overlap window
+        work_table = Work.__table__
+        now = datetime.now(timezone.utc)
+        test_db.session.execute(work_table.update().values(embedding_updated_at=now - timedelta(hours=1)))
+        test_db.session.execute(work_table.update().where(work_table.c.work_type == 'essay').values(
+            embedding_updated_at=now - timedelta(days=1)
+        ))
+        test_db.session.commit()
+
+        def snapshot():
+            source = WorkEmbeddingCache()  # database-backed
+            return {wt: source.get_partition(wt)[:2] for wt in source.work_types()}, source.embeddings_as_of()
+
+        first = write_embedding_store(store_dir, *snapshot())
+        assert current_version(store_dir) == first
+
+        # Added after the version was written: loaded from the database on top of the store
+        new_work = Work(title='Ozymandias', author='Percy Bysshe Shelley', work_type='poem',
+                        embedding_vector=encode_embedding([0.3] + [0.1] * 3071))
+        test_db.session.add(new_work)
+        test_db.session.commit()
+
+        cache = get_work_embedding_cache()
+        ids, matrix, _ = cache.get_partition('essay')
+        assert isinstance(matrix, np.memmap), "Work matrix should be mapped from the store"
+        assert cache.store_version == first
+        assert new_work.id in cache.get_partition('poem')[0]
+
+        query = np.array([0.5] + [0.1] * 3071)
+        store_ids, store_scores = cache.score(query)
+        db_ids, db_scores = WorkEmbeddingCache().score(query)
+        order = np.argsort(store_ids)
+        assert np.array_equal(store_ids[order], np.sort(db_ids))
+        assert np.allclose(store_scores[order], db_scores[np.argsort(db_ids)])
+        print(f"✓ Loaded {len(store_ids)} works from store {first} plus the database")
+
+        # A new version is swapped in atomically and picked up by the running cache
+        second = write_embedding_store(store_dir, *snapshot())
+        cache.store_check_seconds = 0
+        cache.get_partition('poem')
+        assert cache.store_version == second
+        third = write_embedding_store(store_dir, *snapshot())
+        assert not os.path.exists(os.path.join(store_dir, first)), "Old versions should be pruned"
+        print(f"✓ Swapped {first} -> {second} -> {third}")
+
+        # Re-embedded after the version was written: the stored row is replaced from the database
+        essay = Work.query.filter_by(work_type='essay').first()
+        essay.embedding_vector = encode_embedding([0.0, 1.0] + [0.0] * 3070)
+        test_db.session.commit()
+        fresh = WorkEmbeddingCache(store_dir=store_dir)
+        ids, vectors = fresh.get_vectors([essay.id])
+        assert fresh.store_version == third
+        assert np.allclose(vectors[0][:2], [0.0, 1.0]), "Rewritten embedding should not come from the store"
+
+        print("✓ Memory-mapped embedding store test passed!")
+
+def test_llm_scores_are_cached_per_summary():
+    """Test that regenerating a pool with unchanged preferences makes no LLM calls"""
+    print("Testing persisted LLM score cache...")
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        works = Work.query.all()
+
+        with patch('app.embeddings_engine.genai.Client') as mock_client_class:
+            mock_client = Mock()
+            mock_client_class.return_value = mock_client
+            mock_client.models.generate_content.return_value = Mock(
+                text=json.dumps({str(work.id): 0.9 for work in works})
+            )
+
+            engine = EmbeddingRecommendationEngine()
+            engine.populate_user_work_pool(user_id)
+            first_calls = mock_client.models.generate_content.call_count
+            assert first_calls == 3, "One LLM call per work type on a cold cache"
+
+            engine.populate_user_work_pool(user_id)
+            print(f"✓ LLM calls: {first_calls} cold, "
+                  f"{mock_client.models.generate_content.call_count - first_calls} repeated")
+            assert mock_client.models.generate_content.call_count == first_calls, \
+                "Unchanged preferences should be scored from the cache"
+            assert all(entry.confidence_score > 0.6 for entry in UserWorkPool.query.filter_by(user_id=user_id))
+
+            # A failed call is not cached, and a new summary misses the cache
+            user = test_db.session.get(User, user_id)
+            user.preference_summary = 'Prefers gothic horror and dark short fiction.'
+            test_db.session.commit()
+            mock_client.models.generate_content.side_effect = Exception("API Error")
+            scores = engine._llm_score_candidates(user, works)
+            assert set(scores.values()) == {0.5}
+            mock_client.models.generate_content.side_effect = None
+            engine._llm_score_candidates(user, works)
+            assert mock_client.models.generate_content.call_count == first_calls + 2
+
+        print("✓ LLM score cache test passed!")
+
+def test_llm_scoring_recovers_partial_responses():
+    """Test structured LLM scoring: tolerant parsing and a follow-up call for missing works"""
+    print("Testing structured LLM scoring...")
+
+    from app.llm_scoring import parse_score_pairs
+
+    assert parse_score_pairs('[[1, 0.9], [2, 0.4]]') == {'1': 0.9, '2': 0.4}
+    assert parse_score_pairs('```json\n{"1": 0.9, "2": 1.7}\n```') == {'1': 0.9, '2': 1.0}
+    assert parse_score_pairs('[[1, 0.9], [2, 0.4], [3, 0.') == {'1': 0.9, '2': 0.4}, \
+        "Complete pairs before a truncation should be kept"
+    assert parse_score_pairs('not json') == {}
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        user = test_db.session.get(User, user_id)
+        works = Work.query.order_by(Work.id).all()
+
+        # First answer is cut off after two works; the follow-up gets the rest
+        responses = [
+            Mock(text=f'[[{works[0].id}, 0.9], [{works[1].id}, 0.8], [{works[2].id}, 0.'),
+            Mock(text=f'[[{works[2].id}, 0.7], [{works[3].id}, 0.2]]'),
+        ]
+
+        with patch('app.embeddings_engine.genai.Client') as mock_client_class:
+            mock_client = Mock()
+            mock_client_class.return_value = mock_client
+            mock_client.models.generate_content.side_effect = responses
+
+            engine = EmbeddingRecommendationEngine()
+            scores = engine._llm_score_candidates(user, works)
+
+        calls = mock_client.models.generate_content.call_args_list
+        print(f"✓ Scores after follow-up: {scores}")
+        assert scores == {str(works[0].id): 0.9, str(works[1].id): 0.8,
+                          str(works[2].id): 0.7, str(works[3].id): 0.2}
+        assert len(calls) == 2
+        assert calls[0][1]['config'].response_mime_type == 'application/json'
+        followup_prompt = calls[1][1]['contents']
+        assert works[3].title in followup_prompt and works[0].title not in followup_prompt, \
+            "Follow-up call should only include the works that were missing"
+
+        print("✓ Structured LLM scoring test passed!")
+
+def test_basic_pool_population_is_rerunnable():
+    """Test that the basic fallback pool can be regenerated without unique constraint errors"""
+    print("Testing basic pool population rerun...")
+
+    from app.recommendations import populate_user_work_pool
+
+    app = create_test_app()
+
+    with app.app_context():
+        create_test_data(app)
+        user = User(username='basic', email='basic@example.com', password_hash='dummy_hash',
+                    onboarding_completed=True)
+        test_db.session.add(user)
+        test_db.session.commit()
+
+        assert populate_user_work_pool(user.id)
+        first = UserWorkPool.query.filter_by(user_id=user.id).count()
+        assert populate_user_work_pool(user.id), "Second /generate-pool run should not fail"
+        assert UserWorkPool.query.filter_by(user_id=user.id).count() == first == Work.query.count()
+
+        print("✓ Basic pool rerun test passed!")
+
+def test_daily_fill_skips_concurrently_filled_slots():
+    """Test that filling a slot another request already filled is skipped instead of failing"""
+    print("Testing conflict-tolerant daily recommendation inserts...")
+
+    from datetime import date
+    from app.models import WorkRecommendation
+    from app.recommendations import _fill_daily_recommendations, get_daily_recommendations
+
+    app = create_test_app()
+
+    with app.app_context():
+        user_id = create_test_data(app)
+        for work in Work.query.all():
+            test_db.session.add(UserWorkPool(
+                user_id=user_id, work_id=work.id, work_type=work.work_type, confidence_score=0.7
+            ))
+        test_db.session.commit()
+        target = date(2025, 1, 1)
+
+        recs = get_daily_recommendations(user_id, target)
+        recommended = UserWorkPool.query.filter_by(status='recommended').count()
+
+        # A racing request that didn't see the rows yet (stale filled set)
+        created = _fill_daily_recommendations([user_id], target, set())
+        assert created == 0
+        assert WorkRecommendation.query.filter_by(user_id=user_id, date=target).count() == 3
+        assert UserWorkPool.query.filter_by(status='recommended').count() == recommended, \
+            "Pool entries of skipped slots should stay available"
+        assert get_daily_recommendations(user_id, target)['poem'].id == recs['poem'].id
+
+        print("✓ Conflict-tolerant daily fill test passed!")
+
+def test_precompute_survives_concurrent_daily_view():
+    """Test that a slot filled by /daily during the batch doesn't abort precompute"""
+    print("Testing precompute with a concurrent daily view...")
+
+    from datetime import date
+    from app import recommendations
+    from app.models import WorkRecommendation
+
+    app = create_test_app()
+
+    with app.app_context():
+        first_user = create_test_data(app)
+        second = User(username='second', email='second@example.com', password_hash='dummy_hash',
+                      onboarding_completed=True)
+        test_db.session.add(second)
+        test_db.session.commit()
+        for user_id in (first_user, second.id):
+            for work in Work.query.all():
+                test_db.session.add(UserWorkPool(
+                    user_id=user_id, work_id=work.id, work_type=work.work_type, confidence_score=0.7
+                ))
+        test_db.session.commit()
+        target = date(2025, 1, 1)
+        real_fill = recommendations._fill_daily_recommendations
+
+        def fill_after_daily_view(user_ids, target_date, filled, **kwargs):
+            # The first user opens /daily after the chunk's filled slots were read
+            real_fill([first_user], target_date, set())
+            return real_fill(user_ids, target_date, filled, **kwargs)
+
+        with patch('app.recommendations._fill_daily_recommendations', side_effect=fill_after_daily_view):
+            result = recommendations.precompute_daily_recommendations(target, chunk_size=10)
+
+        print(f"✓ Precompute result: {result}")
+        assert result == {'users': 2, 'created': 3}, "Only the second user's slots are left to create"
+        assert WorkRecommendation.query.filter_by(date=target).count() == 6
+
+        print("✓ Concurrent precompute test passed!")
+
 def run_all_tests():
     """Run all test functions"""
     print("Running embeddings engine tests...\n")
@@ -333,6 +1423,84 @@ def run_all_tests():
         test_hybrid_recommendations_no_embedding()
         print()
 
+        test_work_embedding_cache_updates_on_commit()
+        print()
+
+        test_work_embedding_cache_sees_other_process_writes()
+        print()
+
+        test_decode_embedding_rejects_malformed_blobs()
+        print()
+
+        test_top_k_indices()
+        print()
+
+        test_generate_work_embeddings_batched()
+        print()
+
+        test_embedding_cache_skips_repeat_requests()
+        print()
+
+        test_embedding_retry_and_explicit_failure()
+        print()
+
+        test_job_queue_dedup_and_retry()
+        print()
+
+        test_populate_pool_scores_types_concurrently()
+        print()
+
+        test_precompute_daily_recommendations_is_resumable()
+        print()
+
+        test_regenerate_all_user_pools()
+        print()
+
+        test_recommendation_queries_use_indexes()
+        print()
+
+        test_daily_recommendations_constant_queries()
+        print()
+
+        test_embedding_columns_are_deferred()
+        print()
+
+        test_session_principal_skips_user_query()
+        print()
+
+        test_reading_stats_summary_tracks_ratings()
+        print()
+
+        test_preference_edits_are_incremental()
+        print()
+
+        test_rating_feedback_refines_user_embedding()
+        print()
+
+        test_reduced_dimension_search_reranks_full_width()
+        print()
+
+        test_quantized_first_stage_matches_exact()
+        print()
+
+        test_memory_mapped_embedding_store()
+        print()
+
+        test_llm_scores_are_cached_per_summary()
+        print()
+
+        test_llm_scoring_recovers_partial_responses()
+        print()
+
+        test_basic_pool_population_is_rerunnable()
+        print()
+
+        test_daily_fill_skips_concurrently_filled_slots()
+        print()
+
+        test_precompute_survives_concurrent_daily_view()
+        print()
+
         print("🎉 All tests passed!")
 
     except Exception as e: